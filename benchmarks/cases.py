@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""The benchmark cases, grouped by the first component of their name"""
+import datetime
+import itertools
+import os
+import tempfile
+
+from pagseguro import (
+    PagSeguro,
+    PagSeguroCheckoutResponse,
+    PagSeguroCheckoutSession,
+    PagSeguroNotificationResponse,
+    PagSeguroPreApproval,
+    PagSeguroPreApprovalCancel,
+    PagSeguroPreApprovalNotificationResponse,
+    PagSeguroPreApprovalPayment,
+    PagSeguroPreApprovalSearch,
+    PagSeguroTransactionSearchResult,
+)
+from pagseguro.columnar import transaction_columns, write_transactions
+from pagseguro.config import Config
+from pagseguro.fakeserver import (EPOCH, FakePagSeguroAPI, FakePagSeguroServer,
+                                  fixed_latency)
+from pagseguro.reconcile import Reconciler
+from pagseguro.store import TransactionStore
+from pagseguro.utils import (is_valid_cnpj, is_valid_cpf, is_valid_email,
+                             parse_amount)
+
+from . import fixtures
+from .harness import Case
+
+TOKEN = "ABCDEFGHIJKLMNO"
+EMAIL = "seuemail@dominio.com"
+PAGE_SIZES = (1, 100, 10000)
+
+SENDER = {
+    "name": "Guybrush Treepwood",
+    "area_code": 11,
+    "phone": 5555555,
+    "email": "guybrush@monkeyisland.com",
+    "cpf": "482.268.465-28",
+}
+SHIPPING = {
+    "type": PagSeguro.SEDEX,
+    "street": "Av Brig Faria Lima",
+    "number": 1234,
+    "complement": "5 andar",
+    "district": "Jardim Paulistano",
+    "postal_code": "06650030",
+    "city": "Sao Paulo",
+    "state": "SP",
+    "country": "BRA",
+}
+ITEMS = [
+    {"id": "%04d" % i, "name": "Produto %d" % i, "amount": 35420, "quantity": 2}
+    for i in range(5)
+]
+CARD_PAYMENT = {
+    "amount": {"value": 177100, "currency": "BRL"},
+    "method": {
+        "type": "CREDIT_CARD",
+        "installments": 1,
+        "card": {"encrypted": "ENCRYPTED", "security_code": "123"},
+    },
+}
+
+
+class StreamingTransactionSearchResult(PagSeguroTransactionSearchResult):
+    engine = "iterparse"
+
+
+class StreamingPreApprovalSearch(PagSeguroPreApprovalSearch):
+    engine = "iterparse"
+
+
+def client(**config):
+    pg = PagSeguro(token=TOKEN, email=EMAIL, config=config)
+    pg.sender = SENDER
+    pg.shipping = SHIPPING
+    pg.items = ITEMS
+    pg.payment = CARD_PAYMENT
+    pg.reference = "REF1234"
+    pg.notification_url = "https://example.com/notification"
+    pg.redirect_url = "https://example.com/redirect"
+    return pg
+
+
+def checkout_cases():
+    def build_checkout_params():
+        pg = client()
+        return pg.build_checkout_params
+
+    def build_subscription():
+        pg = client()
+        pg.subscription = {
+            "plan_id": "PLAN_1",
+            "customer_id": "CUST_1",
+            "reference_id": "SUB_1",
+        }
+        return pg.build_subscription
+
+    def render_order():
+        template = client().checkout_template()
+        order = dict(
+            sender=SENDER, shipping=SHIPPING, items=ITEMS, payment=CARD_PAYMENT,
+            reference="REF1234",
+        )
+        return lambda: template.render(**order)
+
+    return [
+        Case("checkout.build_checkout_params", build_checkout_params),
+        Case("checkout.build_subscription", build_subscription),
+        Case("checkout.render_order", render_order),
+    ]
+
+
+def parse_case(name, parser, content, items=1):
+    config = Config.shared()
+    return Case(
+        "parse." + name, lambda: lambda: parser(content, config), items=items
+    )
+
+
+def parser_cases():
+    cases = [
+        parse_case("notification", PagSeguroNotificationResponse,
+                   fixtures.notification_xml()),
+        parse_case("pre_approval_notification",
+                   PagSeguroPreApprovalNotificationResponse,
+                   fixtures.pre_approval_notification_xml()),
+        parse_case("pre_approval_cancel", PagSeguroPreApprovalCancel,
+                   fixtures.cancel_xml()),
+        parse_case("checkout_session", PagSeguroCheckoutSession,
+                   fixtures.session_xml()),
+        parse_case("pre_approval_payment", PagSeguroPreApprovalPayment,
+                   fixtures.pre_approval_payment_xml()),
+        parse_case("pre_approval", PagSeguroPreApproval,
+                   fixtures.XML_HEADER + fixtures.pre_approval_xml()),
+        parse_case("checkout_response", PagSeguroCheckoutResponse,
+                   fixtures.order_json()),
+    ]
+    for size in PAGE_SIZES:
+        transactions = fixtures.transaction_search_xml(size)
+        pre_approvals = fixtures.pre_approval_search_xml(size)
+        cases.extend([
+            parse_case("transaction_search[%d]" % size,
+                       PagSeguroTransactionSearchResult, transactions, size),
+            parse_case("transaction_search_iterparse[%d]" % size,
+                       StreamingTransactionSearchResult, transactions, size),
+            parse_case("pre_approval_search[%d]" % size,
+                       PagSeguroPreApprovalSearch, pre_approvals, size),
+            parse_case("pre_approval_search_iterparse[%d]" % size,
+                       StreamingPreApprovalSearch, pre_approvals, size),
+        ])
+    return cases
+
+
+def validator_case(name, validator, values):
+    def setup():
+        cycle = itertools.cycle(values)
+        return lambda: validator(next(cycle))
+
+    return Case("validate." + name, setup)
+
+
+def validator_cases():
+    # 10k distinct values overflow the 4096 entries validation cache, the
+    # "cached" variants always hit it
+    return [
+        validator_case("cpf", is_valid_cpf, fixtures.cpfs(10000)),
+        validator_case("cpf_cached", is_valid_cpf, fixtures.cpfs(1)),
+        validator_case("cnpj", is_valid_cnpj, fixtures.cnpjs(10000)),
+        validator_case("cnpj_cached", is_valid_cnpj, fixtures.cnpjs(1)),
+        validator_case("email", is_valid_email, fixtures.emails(10000)),
+        validator_case("email_cached", is_valid_email, fixtures.emails(1)),
+    ]
+
+
+def config_cases():
+    return [
+        Case("config.Config", lambda: Config),
+        Case("config.Config_sandbox", lambda: lambda: Config(sandbox=True)),
+        Case("config.shared", lambda: Config.shared),
+        Case("config.PagSeguro", lambda: lambda: PagSeguro(token=TOKEN)),
+    ]
+
+
+def store_cases():
+    size = 10000
+    transactions = PagSeguroTransactionSearchResult(
+        fixtures.transaction_search_xml(size), Config.shared()
+    ).transactions
+
+    def filled():
+        store = TransactionStore()
+        store.upsert(transactions)
+        return store
+
+    def lookup(query):
+        def setup():
+            store = filled()
+            codes = itertools.cycle(fixtures.code(i) for i in range(0, size, 7))
+            return lambda: query(store, next(codes))
+
+        return setup
+
+    def upsert():
+        store = TransactionStore()
+        return lambda: store.upsert(transactions)
+
+    return [
+        Case("store.upsert[%d]" % size, upsert, items=size),
+        Case("store.get", lookup(lambda store, code: store.get(code))),
+        Case("store.contains", lookup(lambda store, code: code in store)),
+        Case("store.find_reference", lookup(
+            lambda store, code: store.find(reference="REF%d" % int(code[:8], 16))
+        )),
+    ]
+
+
+def reconcile_case(rows, memory_rows):
+    def setup():
+        orders = [
+            {"reference_id": "REF%d" % i, "amount": 10000 + i, "status": "3"}
+            for i in range(rows)
+        ]
+        transactions = [
+            {"code": fixtures.code(i), "reference": "REF%d" % i,
+             "grossAmount": "%d.%02d" % divmod(10000 + i + (i % 100 == 0), 100),
+             "status": "3"}
+            for i in range(rows // 100, rows + rows // 100)
+        ]
+
+        def run():
+            reconciler = Reconciler(memory_rows=memory_rows)
+            for _ in reconciler.run(iter(orders), iter(transactions)):
+                pass
+
+        return run
+
+    return Case(
+        "reconcile[%d,memory_rows=%d]" % (rows, memory_rows), setup, items=rows
+    )
+
+
+def reconcile_cases():
+    return [reconcile_case(100000, 1000000), reconcile_case(100000, 10000)]
+
+
+def columnar_cases():
+    size = 10000
+    transactions = PagSeguroTransactionSearchResult(
+        fixtures.transaction_search_xml(size), Config.shared()
+    ).transactions
+    fees = transaction_columns(transactions)["fee_amount"]
+
+    def write():
+        directory = tempfile.TemporaryDirectory(prefix="pagseguro-bench-")
+        path = os.path.join(directory.name, "transactions.parquet")
+
+        def run():
+            return write_transactions(transactions, path)
+
+        run.directory = directory
+        return run
+
+    return [
+        Case("columnar.columns[%d]" % size,
+             lambda: lambda: transaction_columns(transactions), items=size),
+        Case("columnar.fee_sum.dicts[%d]" % size, lambda: lambda: sum(
+            parse_amount(t["feeAmount"]) for t in transactions), items=size),
+        Case("columnar.fee_sum.columns[%d]" % size,
+             lambda: fees.sum, items=size),
+        Case("columnar.write[%d]" % size, write, items=size,
+             teardown=lambda run: run.directory.cleanup()),
+    ]
+
+
+def query_case(pages, per_page, max_workers):
+    """page fan-out, 10ms per request so workers overlap the waits"""
+
+    def setup():
+        api = FakePagSeguroAPI(
+            latency=fixed_latency(0.01), pages=pages, page_size=per_page
+        )
+        server = FakePagSeguroServer(api).start()
+        pg = PagSeguro(token=TOKEN, email=EMAIL, config=server.config())
+
+        def query():
+            return pg.query_transactions(*fixtures.SEARCH_RANGE,
+                                         max_workers=max_workers)
+
+        query.server = server
+        return query
+
+    return Case(
+        "query.transactions[%dx%d,workers=%d]" % (pages, per_page, max_workers),
+        setup,
+        items=pages * per_page,
+        teardown=lambda query: query.server.stop(),
+    )
+
+
+def backfill_case(days, window):
+    """a week of one transaction a minute, 10ms per request"""
+
+    def setup():
+        api = FakePagSeguroAPI(
+            latency=fixed_latency(0.01), per_hour=60, page_size=100
+        )
+        server = FakePagSeguroServer(api).start()
+        pg = PagSeguro(token=TOKEN, email=EMAIL, config=server.config())
+        final = EPOCH + datetime.timedelta(days=days)
+
+        def query():
+            return pg.query_transactions(EPOCH, final, window=window)
+
+        query.server = server
+        return query
+
+    return Case(
+        "query.backfill[%dd,window=%s]" % (days, window),
+        setup,
+        items=days * 24 * 60,
+        teardown=lambda query: query.server.stop(),
+    )
+
+
+def query_cases():
+    return [
+        query_case(10, 100, 1),
+        query_case(10, 100, 4),
+        backfill_case(7, None),
+        backfill_case(7, datetime.timedelta(days=1)),
+    ]
+
+
+def all_cases():
+    return (
+        checkout_cases()
+        + parser_cases()
+        + validator_cases()
+        + config_cases()
+        + store_cases()
+        + reconcile_cases()
+        + columnar_cases()
+        + query_cases()
+    )
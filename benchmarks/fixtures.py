@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Synthetic PagSeguro payloads for the benchmarks"""
+import datetime
+import json
+
+from pagseguro.fakeserver import (
+    XML_HEADER,
+    pre_approval_search_xml,
+    pre_approval_xml,
+    transaction_code as code,
+    transaction_search_xml,
+    transaction_xml,
+)
+from pagseguro.utils import CNPJ_WEIGHTS, CPF_WEIGHTS, DV_maker
+
+
+def notification_xml():
+    return XML_HEADER + transaction_xml()
+
+
+def pre_approval_notification_xml():
+    return XML_HEADER + transaction_xml()
+
+
+def cancel_xml():
+    return XML_HEADER + "<result><date>2011-11-23T13:40:23.000-02:00</date>" \
+        "<status>OK</status></result>"
+
+
+def session_xml():
+    return XML_HEADER + "<session><id>620f99e348c24f07877c927b353e49d3</id></session>"
+
+
+def pre_approval_payment_xml():
+    return (
+        XML_HEADER + "<result><transactionCode>%s</transactionCode>"
+        "<date>2011-11-23T13:40:23.000-02:00</date></result>" % code(0)
+    )
+
+
+def order_json(index=0):
+    return json.dumps(
+        {
+            "id": "ORDE_%08d" % index,
+            "reference_id": "REF%d" % index,
+            "created_at": "2011-02-05T15:46:12.000-02:00",
+            "customer": {"name": "Guybrush", "email": "guybrush@monkey.com"},
+            "items": [{"reference_id": "0001", "quantity": 2, "unit_amount": 35420}],
+            "charges": [{"id": "CHAR_1", "status": "PAID", "amount": {"value": 70840}}],
+            "links": [{"rel": "PAY", "href": "https://pay/%d" % index}],
+        }
+    ).encode("utf-8")
+
+
+def _document(body, weights):
+    digits = [int(d) for d in body]
+    dv1 = DV_maker(sum(w * d for w, d in zip(weights[0], digits)) % 11)
+    dv2 = DV_maker(sum(w * d for w, d in zip(weights[1], digits + [dv1])) % 11)
+    return body + str(dv1) + str(dv2)
+
+
+def cpfs(count):
+    """``count`` distinct valid CPFs"""
+    return [
+        _document("%09d" % (100000000 + i * 7919), CPF_WEIGHTS) for i in range(count)
+    ]
+
+
+def cnpjs(count):
+    """``count`` distinct valid CNPJs"""
+    return [
+        _document("%08d0001" % (10000000 + i * 7919), CNPJ_WEIGHTS)
+        for i in range(count)
+    ]
+
+
+def emails(count):
+    return ["user%d@dominio%d.com.br" % (i, i % 97) for i in range(count)]
+
+
+SEARCH_RANGE = (datetime.datetime(2011, 1, 1), datetime.datetime(2011, 2, 1))
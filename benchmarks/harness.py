@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""Minimal benchmark harness: timing, percentiles, peak memory, comparison"""
+import contextlib
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+
+class Case(object):
+    """One benchmark
+
+    ``setup`` returns the zero argument callable to time, ``teardown`` (if
+    any) receives it back once the case is done. ``items`` is how many
+    records a single call processes, used for the items/s throughput.
+    """
+
+    def __init__(self, name, setup, group=None, items=1, teardown=None):
+        self.name = name
+        self.setup = setup
+        self.group = group or name.split(".")[0]
+        self.items = items
+        self.teardown = teardown
+
+
+def percentile(sorted_samples, fraction):
+    """nearest rank percentile of already sorted samples"""
+    rank = int(math.ceil(fraction * len(sorted_samples)))
+    return sorted_samples[min(max(rank, 1), len(sorted_samples)) - 1]
+
+
+def calibrate(func, target=0.0002):
+    """calls per sample so that one sample takes at least ``target`` seconds"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - start >= target or number >= 10 ** 6:
+            return number
+        number *= 10
+
+
+def measure(func, min_time=0.5, min_rounds=5, max_rounds=10000):
+    """per call timings (seconds), one sample per round of ``number`` calls"""
+    func()  # warm up caches, imports and connections
+    number = calibrate(func)
+    samples = []
+    timer = time.perf_counter
+    deadline = timer() + min_time
+    while len(samples) < max_rounds:
+        start = timer()
+        for _ in range(number):
+            func()
+        samples.append((timer() - start) / number)
+        if len(samples) >= min_rounds and timer() >= deadline:
+            break
+    return samples, number
+
+
+def peak_memory(func):
+    """bytes allocated at the peak of a single call, as seen by tracemalloc"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        func()
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(case, min_time=0.5, min_rounds=5, memory=True):
+    func = case.setup()
+    try:
+        with open(os.devnull, "w") as devnull:
+            # keep the report readable if the code under test prints
+            with contextlib.redirect_stdout(devnull):
+                samples, number = measure(func, min_time, min_rounds)
+                peak = peak_memory(func) if memory else None
+    finally:
+        if case.teardown is not None:
+            case.teardown(func)
+
+    ordered = sorted(samples)
+    mean = statistics.mean(samples)
+    return {
+        "name": case.name,
+        "group": case.group,
+        "rounds": len(samples),
+        "number": number,
+        "items": case.items,
+        "mean": mean,
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "min": ordered[0],
+        "p50": percentile(ordered, 0.5),
+        "p90": percentile(ordered, 0.9),
+        "p99": percentile(ordered, 0.99),
+        "ops_per_sec": 1.0 / mean if mean else None,
+        "items_per_sec": case.items / mean if mean else None,
+        "peak_memory": peak,
+    }
+
+
+def metadata():
+    return {
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def save(path, results):
+    with open(path, "w") as f:
+        json.dump({"metadata": metadata(), "results": results}, f, indent=2)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, current, threshold=0.1, memory_slack=64 * 1024):
+    """rows comparing two runs by name
+
+    A case regresses when its median time grows by more than ``threshold``
+    (0.1 is 10%) or its peak memory by more than ``threshold`` and
+    ``memory_slack`` bytes.
+    """
+    previous = dict((r["name"], r) for r in baseline["results"])
+    rows = []
+    for result in current["results"]:
+        base = previous.get(result["name"])
+        if base is None:
+            continue
+        ratio = result["p50"] / base["p50"] if base["p50"] else 1.0
+        regressed = ratio > 1 + threshold
+        memory_ratio = None
+        if result.get("peak_memory") is not None and base.get("peak_memory"):
+            memory_ratio = result["peak_memory"] / float(base["peak_memory"])
+            growth = result["peak_memory"] - base["peak_memory"]
+            if memory_ratio > 1 + threshold and growth > memory_slack:
+                regressed = True
+        rows.append(
+            {
+                "name": result["name"],
+                "baseline": base["p50"],
+                "current": result["p50"],
+                "ratio": ratio,
+                "memory_ratio": memory_ratio,
+                "regressed": regressed,
+            }
+        )
+    return rows
+
+
+def format_time(seconds):
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return "%.2f %s" % (seconds / scale, unit)
+    return "%.0f ns" % (seconds / 1e-9)
+
+
+def format_bytes(size):
+    if size is None:
+        return "-"
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return "%.0f %s" % (size, unit)
+        size /= 1024.0
+    return "%.1f GiB" % size
+
+
+def report(results, out=None, header=True):
+    out = out or sys.stdout
+    if header:
+        line = "%-44s %10s %10s %10s %12s %10s" % (
+            "benchmark", "p50", "p90", "p99", "items/s", "peak mem"
+        )
+        out.write(line + "\n" + "-" * len(line) + "\n")
+    for r in results:
+        out.write(
+            "%-44s %10s %10s %10s %12s %10s\n"
+            % (
+                r["name"],
+                format_time(r["p50"]),
+                format_time(r["p90"]),
+                format_time(r["p99"]),
+                "%.0f" % r["items_per_sec"] if r["items_per_sec"] else "-",
+                format_bytes(r["peak_memory"]),
+            )
+        )
+
+
+def report_comparison(rows, out=None):
+    out = out or sys.stdout
+    header = "%-44s %10s %10s %8s %8s" % (
+        "benchmark",
+        "before",
+        "after",
+        "time",
+        "memory",
+    )
+    out.write(header + "\n" + "-" * len(header) + "\n")
+    for row in rows:
+        memory = "%.2fx" % row["memory_ratio"] if row["memory_ratio"] else "-"
+        out.write(
+            "%-44s %10s %10s %7.2fx %8s%s\n"
+            % (
+                row["name"],
+                format_time(row["baseline"]),
+                format_time(row["current"]),
+                row["ratio"],
+                memory,
+                "  REGRESSION" if row["regressed"] else "",
+            )
+        )
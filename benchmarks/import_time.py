@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Import time of the pagseguro package
+
+Runs ``python -X importtime -c "import <module>"`` in fresh interpreters and
+reports the median cumulative time of the package plus its slowest imports.
+
+    python benchmarks/import_time.py [-n RUNS] [--module pagseguro]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+HEAVY = ("requests", "xmltodict", "arrow", "numpy", "pyarrow")
+
+
+def import_times(module):
+    """{imported module: cumulative microseconds} for one cold import"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import %s" % module],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        if name == "site":
+            # everything before belongs to interpreter startup
+            times = {}
+        elif cumulative.strip().isdigit():
+            times[name] = int(cumulative)
+    return times
+
+
+def loaded_modules(module):
+    """the heavy dependencies present in sys.modules after the import"""
+    code = "import sys, %s; print(' '.join(m for m in %r if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-c", code % (module, HEAVY)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.split()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--runs", type=int, default=10)
+    parser.add_argument("--module", default="pagseguro")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    totals = [run.get(args.module, 0) for run in runs]
+    print(
+        "import %s: median %.1f ms, min %.1f ms (%d runs)"
+        % (
+            args.module,
+            statistics.median(totals) / 1000.0,
+            min(totals) / 1000.0,
+            args.runs,
+        )
+    )
+
+    slowest = sorted(runs[-1].items(), key=lambda item: -item[1])[: args.top]
+    for name, micros in slowest:
+        print("  %8.1f ms  %s" % (micros / 1000.0, name))
+    heavy = ", ".join(loaded_modules(args.module)) or "none"
+    print("heavy dependencies loaded: %s" % heavy)
+
+
+if __name__ == "__main__":
+    main()
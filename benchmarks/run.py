@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Run the pagseguro benchmarks
+
+    python -m benchmarks.run                      # everything
+    python -m benchmarks.run -k parse -k validate # only matching cases
+    python -m benchmarks.run --save before.json
+    python -m benchmarks.run --compare before.json --threshold 0.15
+
+With ``--compare`` the exit status is 1 when any case regressed.
+"""
+import argparse
+import fnmatch
+import sys
+
+from . import harness
+from .cases import all_cases
+
+
+def select(cases, patterns):
+    if not patterns:
+        return cases
+    return [
+        case
+        for case in cases
+        if any(
+            pattern in case.name or fnmatch.fnmatchcase(case.name, pattern)
+            for pattern in patterns
+        )
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="pagseguro benchmarks")
+    parser.add_argument("-k", dest="patterns", action="append", default=[],
+                        help="run cases whose name contains/matches this")
+    parser.add_argument("--list", action="store_true", help="list the cases")
+    parser.add_argument("--min-time", type=float, default=0.5,
+                        help="seconds spent timing each case")
+    parser.add_argument("--rounds", type=int, default=5,
+                        help="minimum samples per case")
+    parser.add_argument("--quick", action="store_true",
+                        help="short run, same as --min-time 0.05 --rounds 3")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the tracemalloc peak memory pass")
+    parser.add_argument("--save", metavar="FILE", help="write results as JSON")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="compare with a previous --save")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="allowed slowdown before flagging (0.1 = 10%%)")
+    args = parser.parse_args(argv)
+
+    cases = select(all_cases(), args.patterns)
+    if args.list:
+        for case in cases:
+            print(case.name)
+        return 0
+    if args.quick:
+        args.min_time, args.rounds = 0.05, 3
+
+    results = []
+    for case in cases:
+        result = harness.run_case(
+            case, args.min_time, args.rounds, not args.no_memory
+        )
+        # print as they come, long suites should not look stuck
+        harness.report([result], header=not results)
+        sys.stdout.flush()
+        results.append(result)
+    if args.save:
+        harness.save(args.save, results)
+
+    if args.compare:
+        rows = harness.compare(
+            harness.load(args.compare), {"results": results}, args.threshold
+        )
+        print("")
+        harness.report_comparison(rows)
+        if any(row["regressed"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,30 @@
 # coding: utf-8
 import logging
-import requests
-
-from .config import Config
-from .utils import is_valid_email, is_valid_cpf, is_valid_cnpj
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .cache import lookup_cache
+from .config import Config, FrozenConfig
+from .transport import get_transport
+from .exceptions import PagSeguroPageError, PagSeguroPaginationError
+from .messages import OrderRequest, SearchQuery, SubscriptionRequest
+from .codec import get_codec
+from .columnar import write_transactions
+from .metrics import endpoint_name, null_metrics, payload_size
+from .payload import CheckoutTemplate, build_subscription_payload
+from .reconcile import Reconciler
+from .shards import WindowPlanner, merge_records
+from .sync import PreApprovalSync, TransactionSync
+from .utils import (
+    is_valid_email,
+    is_valid_cpf,
+    is_valid_cnpj,
+    clean_params,
+    sender_tax_id,
+    first_result,
+    next_page,
+    remaining_pages,
+)
 from .parsers import (
     PagSeguroNotificationResponse,
     PagSeguroPreApprovalNotificationResponse,
@@ -11,6 +32,7 @@ from .parsers import (
     PagSeguroCheckoutSession,
     PagSeguroPreApprovalPayment,
     PagSeguroCheckoutResponse,
+    PagSeguroJSONResponse,
     PagSeguroTransactionSearchResult,
     PagSeguroPreApproval,
     PagSeguroPreApprovalSearch,
@@ -28,11 +50,14 @@ class PagSeguro(object):
 
     def __init__(self, token, public_key=None, email=None, data=None, config=None):
 
-        config = config or {}
-        if not type(config) == dict:
+        if isinstance(config, Config):
+            self._set_config(config)
+        elif type(config or {}) == dict:
+            # interned, so building a client does not rebuild its settings
+            self._set_config(Config.shared(**(config or {})))
+        else:
             raise Exception("Malformed config dict param")
 
-        self.config = Config(**config)
         self.headers = {
             "accept": "*/*",
             "Authorization": "Bearer %s" % token,
@@ -61,149 +86,124 @@ class PagSeguro(object):
         self.payment = {}
         self.holder = {}
         self.subscription = {}
+        self._checkout_template = None
 
     def build_checkout_params(self, **kwargs):
         """build a dict with params"""
+        template = self.checkout_template()
         params = kwargs or {}
-
-        if self.reference:
-            params["reference_id"] = self.reference
-        if self.sender:
-            params["customer"] = {}
-            customer = params["customer"]
-            customer["name"] = self.sender.get("name")
-            customer["email"] = is_valid_email(self.sender.get("email"))
-            customer["tax_id"] = (
-                is_valid_cnpj(self.sender.get("cnpj"))
-                if is_valid_cnpj(self.sender.get("cnpj"))
-                else is_valid_cpf(self.sender.get("cpf"))
+        params.update(template.static_fields)
+        params.update(
+            template.fill(
+                self.sender, self.shipping, self.items, self.payment, self._reference
             )
-            customer["phones"] = [
-                {
-                    "type": "MOBILE",
-                    "country": "55",
-                    "area": self.sender.get("area_code"),
-                    "number": self.sender.get("phone"),
-                }
-            ]
-
-        if self.config.USE_SHIPPING:
-            if self.shipping:
-                params["shipping"] = {"address": {}}
-                shipping = params["shipping"]["address"]
-                shipping["shippingType"] = self.shipping.get("type")
-
-                shipping["street"] = self.shipping.get("street")
-                shipping["number"] = self.shipping.get("number")
-                shipping["complement"] = self.shipping.get("complement", "")
-                shipping["locality"] = self.shipping.get("district")
-                shipping["city"] = self.shipping.get("city")
-                shipping["region_code"] = self.shipping.get("state")
-                shipping["country"] = self.shipping.get("country", "BRA")
-                shipping["postal_code"] = self.shipping.get("postal_code")
-
-        if self.extra_amount:
-            params["extraAmount"] = self.extra_amount
-
-        if self.redirect_url:
-            params["redirectURL"] = self.redirect_url
-
-        if self.notification_url:
-            params["notification_urls"] = [self.notification_url]
-
-        if self.abandon_url:
-            params["notifcation_urls"] = [self.abandon_url]
-
-        if self.items:
-            params["items"] = []
-
-        for i, item in enumerate(self.items, 1):
-            item_params = {}
-            item_params["reference_id"] = item.get("id")
-            item_params["name"] = item.get("name")
-            item_params["quantity"] = item.get("quantity")
-            item_params["unit_amount"] = item.get("amount")
-            params["items"].append(item_params)
-
-        if self.payment:
-            params["charges"] = []
-            charge = {}
-            charge["amount"] = self.payment.get("amount")
-            charge["payment_method"] = self.payment.get("method")
-            charge["recurring"] = self.payment.get("recurring", None)
-            params["charges"].append(charge)
-            if self.payment["method"] == "BOLETO":
-                charge["payment_method"]["holder"] = {}
-                charge["payment_method"]["holder"]["name"] = self.sender.get("name")
-                charge["payment_method"]["holder"]["tax_id"] = (
-                    is_valid_cnpj(self.sender.get("cnpj"))
-                    if is_valid_cnpj(self.sender.get("cnpj"))
-                    else is_valid_cpf(self.sender.get("cpf"))
-                )
-                charge["payment_method"]["holder"]["email"] = self.sender.get("email")
-                charge["payment_method"]["holder"]["address"] = params["shipping"][
-                    "address"
-                ]
+        )
 
-        print(self.payment)
         self.data.update(params)
         self.clean_none_params()
 
+    def checkout_template(self):
+        """CheckoutTemplate for the current settings, compiled once"""
+        key = (
+            self.config.USE_SHIPPING,
+            self.config.REFERENCE_PREFIX,
+            self.redirect_url,
+            self.notification_url,
+            self.abandon_url,
+            self.extra_amount,
+        )
+        if self._checkout_template is None or self._checkout_template[0] != key:
+            self._checkout_template = (key, CheckoutTemplate.from_client(self))
+        return self._checkout_template[1]
+
+    def sender_tax_id(self):
+        """validated sender CNPJ, falling back to the CPF"""
+        return sender_tax_id(self.sender)
+
     def build_subscription(self, **kwargs):
         """build a dict with params"""
         self.build_checkout_params(**kwargs)
+        plan, customer = self.resolve_subscription_lookups(self.subscription)
+        self._build_subscription_params(plan, customer, **kwargs)
+
+    def resolve_subscription_lookups(self, subscription):
+        """(plan, customer) referenced by reference_id in ``subscription``"""
+        plan = customer = None
+        if subscription.get("plan_reference_id", None):
+            plan = self.resolve_plan(subscription["plan_reference_id"])
+        if not subscription.get("customer_id", None) and (
+            subscription.get("customer_reference_id", None)
+            and subscription.get("search_by_reference_id", False)
+        ):
+            customer = self.resolve_subscriber(subscription["customer_reference_id"])
+        return plan, customer
+
+    def _lookup_key(self, kind):
+        url = self.config.PLAN_URL if kind == "plans" else self.config.SUBSCRIBER_URL
+        return (kind, url, self.token)
+
+    def _cached_lookup(self, kind, reference_id, fetch):
+        """first ``kind`` entry matching reference_id, kept in lookup_cache"""
+        ttl = self.config.LOOKUP_CACHE_TTL
+        key = self._lookup_key(kind) + (reference_id,)
+        if ttl:
+            result = lookup_cache.get(key)
+            if result is not None:
+                return result
+        result = first_result(fetch(reference_id=reference_id), kind)
+        if ttl and result is not None:
+            lookup_cache.set(key, result, ttl=ttl)
+        return result
 
-        params = None
-        params = kwargs or {}
-        if self.subscription.get("plan_reference_id", None):
-            response = self.get_plan(
-                reference_id=self.subscription["plan_reference_id"]
-            )
-            params["plan"] = {"id": response.get("plans", [])[0]["id"]}
+    def resolve_plan(self, reference_id):
+        """plan with the given reference_id, cached for LOOKUP_CACHE_TTL"""
+        return self._cached_lookup("plans", reference_id, self.get_plan)
+
+    def resolve_subscriber(self, reference_id):
+        """customer with the given reference_id, cached for LOOKUP_CACHE_TTL"""
+        return self._cached_lookup("customers", reference_id, self.get_subscriber)
+
+    def invalidate_lookups(self, kind):
+        """forget cached ``plans`` or ``customers`` of this account"""
+        lookup_cache.invalidate(self._lookup_key(kind))
+
+    def _build_subscription_params(self, plan=None, customer=None, **kwargs):
+        """build the subscription dict from already resolved plan/customer"""
+        self.data = build_subscription_payload(
+            self.data, self.subscription, plan, customer, **kwargs
+        )
+
+    def _set_config(self, config):
+        self.config = config
+        self.transport = self._get_transport()
+        self.codec = get_codec(config.JSON_CODEC)
+        self.metrics = config.METRICS or null_metrics
+
+    def replace_config(self, **kwargs):
+        """use the settings in ``kwargs`` from now on, keeping the others
+
+        Shared configs are never changed in place, the client switches to
+        the shared config with the new settings. Transport, codec and
+        metrics are rebuilt from it.
+        """
+        if isinstance(self.config, FrozenConfig):
+            config = self.config.replace(**kwargs)
         else:
-            params["plan"] = {"id": self.subscription["plan_id"]}
-
-        if self.subscription.get("customer_id", None):
-            params["customer"] = {"id": self.subscription["customer_id"]}
-        elif self.subscription.get(
-            "customer_reference_id", None
-        ) and self.subscription.get("search_by_reference_id", False):
-            response = self.get_subscriber(
-                reference_id=self.subscription["customer_reference_id"]
-            )
-            params["customer"] = response.get("customers", [])[0]
-        else:
-            billing_info = {
-                "card": self.data["charges"][0]["payment_method"]["card"],
-                "type": "CREDIT_CARD",
-            }
-            params["customer"] = self.data["customer"]
-            params["customer"]["reference_id"] = self.subscription.get(
-                "customer_reference_id", None
-            )
-            params["customer"]["billing_info"] = [billing_info]
-        params["payment_method"] = [
-            {
-                "type": "CREDIT_CARD",
-                "card": {
-                    "security_code": self.data["charges"][0]["payment_method"]["card"][
-                        "security_code"
-                    ],
-                },
-            }
-        ]
-
-        params["amount"] = self.data["charges"][0]["amount"]
-        params["best_invoice_date"] = self.subscription.get("best_invoice_date", {})
-
-        params["reference_id"] = self.subscription["reference_id"]
-
-        self.data = {}
-        self.data.update(params)
-        self.clean_none_params()
+            config = self.config
+            for key, value in kwargs.items():
+                config[key.upper()] = value
+        self._set_config(config)
+
+    def _get_transport(self):
+        return get_transport(
+            pool_connections=self.config.POOL_CONNECTIONS,
+            pool_maxsize=self.config.POOL_MAXSIZE,
+            host_pool_sizes=self.config.HOST_POOL_SIZES,
+            timeout=self.config.TIMEOUT,
+        )
 
     def clean_none_params(self):
-        self.data = {k: v for k, v in self.data.items() if v or isinstance(v, bool)}
+        self.data = clean_params(self.data)
 
     @property
     def reference_prefix(self):
@@ -211,7 +211,7 @@ class PagSeguro(object):
 
     @reference_prefix.setter
     def reference_prefix(self, value):
-        self.config.REFERENCE_PREFIX = (value or "") + "%s"
+        self.replace_config(REFERENCE_PREFIX=(value or "") + "%s")
 
     @property
     def reference(self):
@@ -225,39 +225,158 @@ class PagSeguro(object):
             value = value[len(self.reference_prefix) :]
         self._reference = value
 
+    def request(self, method, url, **kwargs):
+        """send through the transport, reporting to ``Config.METRICS``"""
+        if not self.metrics.enabled:
+            return self.transport.request(method, url, **kwargs)
+        endpoint = endpoint_name(self.config, url)
+        sent = payload_size(kwargs.get("data"))
+        start = time.perf_counter()
+        try:
+            response = self.transport.request(method, url, **kwargs)
+        except Exception:
+            self.metrics.request(
+                endpoint, method, None, time.perf_counter() - start, sent
+            )
+            raise
+        self.metrics.request(
+            endpoint,
+            method,
+            response.status_code,
+            time.perf_counter() - start,
+            sent,
+            payload_size(response.content),
+        )
+        return response
+
     def get(self, url, data=None, params=None):
         """do a get transaction"""
-        return requests.get(url, headers=self.headers)
+        return self.request("GET", url, params=params, headers=self.headers)
 
     def post(self, url, data=None):
         """do a post request"""
         if not data:
             data = self.data
-        return requests.post(url, json=data, headers=self.headers)
+        return self.request(
+            "POST", url, data=self.codec.dumps(data), headers=self.headers
+        )
 
     def put(self, url, data=None):
         """do a put request"""
         if not data:
             data = self.data
-        return requests.put(url, json=data, headers=self.headers)
+        return self.request(
+            "PUT", url, data=self.codec.dumps(data), headers=self.headers
+        )
+
+    def delete(self, url):
+        """do a delete request"""
+        return self.request("DELETE", url, headers=self.headers)
 
     def checkout(self, transparent=False, **kwargs):
-        """create a pagseguro checkout"""
+        """create a pagseguro checkout
+
+        Returns a PagSeguroJSONResponse wrapping the HTTP response, unlike
+        ``send_order`` which decodes the order into a
+        PagSeguroCheckoutResponse.
+        """
         self.build_checkout_params(**kwargs)
         response = self.post(url=self.config.ORDER_URL)
 
-        return response
+        return self.json_response(response)
+
+    def json_response(self, response):
+        """PagSeguroJSONResponse decoded with this client's codec"""
+        return PagSeguroJSONResponse(response, self.config)
+
+    def create_orders(self, orders, max_concurrency=None):
+        """create many orders at once
+
+        ``orders`` are OrderRequests, or dicts with the
+        ``build_checkout_params`` inputs (``sender``, ``shipping``, ``items``,
+        ``payment``, ``reference`` and any extra top level params). Each
+        payload is rendered independently from this client's
+        CheckoutTemplate, without touching its state, and posted by up to
+        ``max_concurrency`` threads (defaults to ``Config.ORDER_MAX_WORKERS``)
+        over the shared connection pool. Returns a PagSeguroCheckoutResponse,
+        or the exception raised, for each order in input order.
+        """
+        template = self.checkout_template()
+        max_concurrency = max_concurrency or self.config.ORDER_MAX_WORKERS
+
+        def create(order):
+            try:
+                response = self.request(
+                    "POST",
+                    self.config.ORDER_URL,
+                    data=self.render_order(order, template),
+                    headers=self.headers,
+                )
+                return PagSeguroCheckoutResponse(response.content, self.config)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            return list(pool.map(create, orders))
+
+    def render_order(self, order, template=None):
+        """JSON body for an OrderRequest (or an order dict)"""
+        template = template or self.checkout_template()
+        if isinstance(order, OrderRequest):
+            order = order.as_kwargs()
+        return template.render(**order)
+
+    def send_order(self, order):
+        """create the order described by an OrderRequest
+
+        Unlike ``checkout`` this reads no per-request state from the client,
+        so a single PagSeguro can be shared by every thread.
+        """
+        response = self.request(
+            "POST",
+            self.config.ORDER_URL,
+            data=self.render_order(order),
+            headers=self.headers,
+        )
+        return PagSeguroCheckoutResponse(response.content, self.config)
+
+    def search_transactions(self, query, max_workers=None):
+        """``query_transactions`` for a SearchQuery"""
+        return self.query_transactions(*query, max_workers=max_workers)
+
+    def search_pre_approvals(self, query, max_workers=None):
+        """``query_pre_approvals`` for a SearchQuery"""
+        return self.query_pre_approvals(*query, max_workers=max_workers)
+
+    def subscription_payload(self, request, plan=None, customer=None):
+        """subscription dict for a SubscriptionRequest and its lookups"""
+        order = self.checkout_template().build(**request.order.as_kwargs())
+        return build_subscription_payload(
+            order, request.subscription, plan, customer
+        )
+
+    def send_subscription(self, request):
+        """create the subscription described by a SubscriptionRequest"""
+        plan, customer = self.resolve_subscription_lookups(request.subscription)
+        response = self.request(
+            "POST",
+            self.config.SUBSCRIPTION_URL,
+            data=self.codec.dumps(self.subscription_payload(request, plan, customer)),
+            headers=self.headers,
+        )
+        return self.json_response(response)
 
     def check_notification(self, code):
         """check a notification by its code"""
         params = {"email": self.email, "token": self.token}
-        response = requests.get(url=self.config.NOTIFICATION_URL % code, params=params)
-        print(response)
+        response = self.request(
+            "GET", self.config.url("NOTIFICATION_URL", code), params=params
+        )
         return PagSeguroNotificationResponse(response.content, self.config)
 
     def check_pre_approval_notification(self, code):
         """check a notification by its code"""
-        response = self.get(url=self.config.PRE_APPROVAL_NOTIFICATION_URL % code)
+        response = self.get(url=self.config.url("PRE_APPROVAL_NOTIFICATION_URL", code))
         return PagSeguroPreApprovalNotificationResponse(response.content, self.config)
 
     def pre_approval_ask_payment(self, **kwargs):
@@ -268,85 +387,302 @@ class PagSeguro(object):
 
     def pre_approval_cancel(self, code):
         """cancel a subscribe"""
-        response = self.get(url=self.config.PRE_APPROVAL_CANCEL_URL % code)
+        response = self.get(url=self.config.url("PRE_APPROVAL_CANCEL_URL", code))
         return PagSeguroPreApprovalCancel(response.content, self.config)
 
     def check_transaction(self, code):
         """check a transaction by its code"""
-        response = self.get(url=self.config.TRANSACTION_URL % code)
+        response = self.get(url=self.config.url("TRANSACTION_URL", code))
         return PagSeguroNotificationResponse(response.content, self.config)
 
-    def query_transactions(self, initial_date, final_date, page=None, max_results=None):
-        """query transaction by date range"""
-        last_page = False
-        results = []
-        while last_page is False:
-            search_result = self._consume_query_transactions(
-                initial_date, final_date, page, max_results
-            )
-            results.extend(search_result.transactions)
-            if (
-                search_result.current_page is None
-                or search_result.total_pages is None
-                or search_result.current_page == search_result.total_pages
-            ):
-                last_page = True
-            else:
-                page = search_result.current_page + 1
-
-        return results
+    def query_transactions(
+        self,
+        initial_date,
+        final_date,
+        page=None,
+        max_results=None,
+        max_workers=None,
+        window=None,
+    ):
+        """query transaction by date range
+
+        Once the first page reports ``totalPages`` the remaining pages are
+        fetched concurrently by up to ``max_workers`` threads (defaults to
+        ``Config.QUERY_MAX_WORKERS``) and returned in page order.
+
+        With a ``window`` (a timedelta, defaults to ``Config.QUERY_WINDOW``)
+        the range is searched as concurrent date windows instead, deduped
+        by code and sorted by date, see pagseguro.shards.
+        """
+        return self._query(
+            self._consume_query_transactions,
+            "transactions",
+            initial_date,
+            final_date,
+            page,
+            max_results,
+            max_workers,
+            window,
+        )
 
     def _consume_query_transactions(
         self, initial_date, final_date, page=None, max_results=None
     ):
-        querystring = {
-            "initialDate": initial_date.strftime("%Y-%m-%dT%H:%M"),
-            "finalDate": final_date.strftime("%Y-%m-%dT%H:%M"),
-            "page": page,
-            "maxPageResults": max_results,
-        }
-        self.data.update(querystring)
-        self.clean_none_params()
-        response = self.get(url=self.config.QUERY_TRANSACTION_URL)
+        querystring = self._search_params(initial_date, final_date, page, max_results)
+        response = self.get(url=self.config.QUERY_TRANSACTION_URL, params=querystring)
         return PagSeguroTransactionSearchResult(response.content, self.config)
 
     def query_pre_approvals(
-        self, initial_date, final_date, page=None, max_results=None
+        self,
+        initial_date,
+        final_date,
+        page=None,
+        max_results=None,
+        max_workers=None,
+        window=None,
     ):
-        """query pre-approvals by date range"""
-        last_page = False
-        results = []
-        while last_page is False:
-            search_result = self._consume_query_pre_approvals(
-                initial_date, final_date, page, max_results
-            )
-            results.extend(search_result.pre_approvals)
-            if (
-                search_result.current_page is None
-                or search_result.total_pages is None
-                or search_result.current_page == search_result.total_pages
-            ):
-                last_page = True
-            else:
-                page = search_result.current_page + 1
-
-        return results
+        """query pre-approvals by date range, see query_transactions"""
+        return self._query(
+            self._consume_query_pre_approvals,
+            "pre_approvals",
+            initial_date,
+            final_date,
+            page,
+            max_results,
+            max_workers,
+            window,
+        )
 
     def _consume_query_pre_approvals(
         self, initial_date, final_date, page=None, max_results=None
     ):
+        querystring = self._search_params(initial_date, final_date, page, max_results)
+        response = self.get(url=self.config.QUERY_PRE_APPROVAL_URL, params=querystring)
+        return PagSeguroPreApprovalSearch(response.content, self.config)
+
+    def iter_transactions(
+        self, initial_date, final_date, page=None, max_results=None, prefetch=False
+    ):
+        """yield transactions page by page
+
+        Only the current page (plus the next one when ``prefetch`` is set,
+        fetched in a background thread) is held in memory.
+        """
+        return self._iter_pages(
+            self._consume_query_transactions,
+            "transactions",
+            initial_date,
+            final_date,
+            page,
+            max_results,
+            prefetch,
+        )
+
+    def iter_pre_approvals(
+        self, initial_date, final_date, page=None, max_results=None, prefetch=False
+    ):
+        """yield pre-approvals page by page"""
+        return self._iter_pages(
+            self._consume_query_pre_approvals,
+            "pre_approvals",
+            initial_date,
+            final_date,
+            page,
+            max_results,
+            prefetch,
+        )
+
+    def sync_transactions(self, store, start=None, **kwargs):
+        """TransactionSync yielding the transactions changed since last run
+
+        ``store`` keeps the checkpoint between runs, a path or any object
+        with ``load``/``save`` (see pagseguro.sync).
+        """
+        return TransactionSync(self, store, start, **kwargs)
+
+    def sync_pre_approvals(self, store, start=None, **kwargs):
+        """PreApprovalSync, see sync_transactions"""
+        return PreApprovalSync(self, store, start, **kwargs)
+
+    def reconcile(self, orders, initial_date, final_date, **options):
+        """Discrepancies between ``orders`` and the range's transactions
+
+        ``options`` go to pagseguro.reconcile.Reconciler. Transactions are
+        streamed page by page, orders spill to disk when too many.
+        """
+        reconciler = Reconciler(self.config, **options)
+        transactions = self.iter_transactions(initial_date, final_date, prefetch=True)
+        return reconciler.run(orders, transactions)
+
+    def export_transactions(self, initial_date, final_date, path, **kwargs):
+        """write the range's transactions as typed columns, see columnar
+
+        Parquet when pyarrow is installed, a NumPy ``.npz`` otherwise.
+        Returns the path written.
+        """
+        transactions = self.iter_transactions(initial_date, final_date, prefetch=True)
+        return write_transactions(transactions, path, **kwargs)
+
+    @staticmethod
+    def _search_params(initial_date, final_date, page=None, max_results=None):
         querystring = {
             "initialDate": initial_date.strftime("%Y-%m-%dT%H:%M"),
             "finalDate": final_date.strftime("%Y-%m-%dT%H:%M"),
             "page": page,
             "maxPageResults": max_results,
         }
+        return {k: v for k, v in querystring.items() if v is not None}
+
+    def _query(
+        self,
+        consume,
+        attr,
+        initial_date,
+        final_date,
+        page,
+        max_results,
+        max_workers,
+        window,
+    ):
+        if window is None:
+            window = self.config.QUERY_WINDOW
+        if window is None or page is not None:
+            return self._query_pages(
+                consume, attr, initial_date, final_date, page, max_results, max_workers
+            )
+        return self._query_windows(
+            consume, attr, initial_date, final_date, max_results, max_workers, window
+        )
 
-        self.data.update(querystring)
-        self.clean_none_params()
+    def _query_windows(
+        self, consume, attr, initial_date, final_date, max_results, max_workers, window
+    ):
+        """search concurrent date windows sized by a WindowPlanner"""
+        planner = WindowPlanner(
+            initial_date, final_date, window, self.config.QUERY_WINDOW_PAGES
+        )
+        if max_workers is None:
+            max_workers = self.config.QUERY_MAX_WORKERS
+        max_workers = max(max_workers, 1)
+        pages = {}
+        failures = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = {}
+
+            def submit(start, end, page):
+                future = pool.submit(consume, start, end, page, max_results)
+                pending[future] = (start, end, page)
+
+            def fill():
+                # pages of windows already started go first, new windows
+                # only take idle workers so they are sized with fresh data
+                while len(pending) < max_workers:
+                    window = planner.next_window()
+                    if window is None:
+                        return
+                    submit(window[0], window[1], 1)
+
+            fill()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start, end, page = pending.pop(future)
+                    try:
+                        search_result = future.result()
+                    except Exception as e:
+                        failures[(start, page)] = e
+                        continue
+                    if search_result.errors:
+                        failures[(start, page)] = PagSeguroPageError(
+                            page, search_result.errors
+                        )
+                        continue
+                    pages[(start, page)] = getattr(search_result, attr)
+                    if page == 1:
+                        planner.observe(start, end, search_result.total_pages)
+                        for later in remaining_pages(search_result):
+                            submit(start, end, later)
+                fill()
+
+        results = merge_records(pages[key] for key in sorted(pages))
+        if failures:
+            raise PagSeguroPaginationError(results, failures)
+        return results
 
-        response = self.get(url=self.config.QUERY_PRE_APPROVAL_URL)
-        return PagSeguroPreApprovalSearch(response.content, self.config)
+    def _query_pages(
+        self, consume, attr, initial_date, final_date, page, max_results, max_workers
+    ):
+        """fetch the first page, then fan out over the remaining ones"""
+        search_result = consume(initial_date, final_date, page, max_results)
+        results = list(getattr(search_result, attr))
+        pages = remaining_pages(search_result)
+        if not pages:
+            return results
+
+        if max_workers is None:
+            max_workers = self.config.QUERY_MAX_WORKERS
+
+        def fetch(page):
+            try:
+                search_result = consume(initial_date, final_date, page, max_results)
+            except Exception as e:
+                return page, None, e
+            if search_result.errors:
+                return page, None, PagSeguroPageError(page, search_result.errors)
+            return page, getattr(search_result, attr), None
+
+        if max_workers > 1:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(pages))) as pool:
+                fetched = list(pool.map(fetch, pages))
+        else:
+            fetched = [fetch(page) for page in pages]
+
+        failures = {}
+        for page, page_results, error in fetched:
+            if error is not None:
+                failures[page] = error
+            else:
+                results.extend(page_results)
+
+        if failures:
+            raise PagSeguroPaginationError(results, failures)
+        return results
+
+    def _iter_pages(
+        self, consume, attr, initial_date, final_date, page, max_results, prefetch
+    ):
+        pool = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        upcoming = None
+        try:
+            search_result = consume(initial_date, final_date, page, max_results)
+            while search_result is not None:
+                if search_result.errors:
+                    raise PagSeguroPageError(page, search_result.errors)
+                page = next_page(search_result)
+                if page is not None and pool is not None:
+                    upcoming = pool.submit(
+                        consume, initial_date, final_date, page, max_results
+                    )
+                records = getattr(search_result, attr)
+                search_result = None
+                for record in records:
+                    yield record
+                del records
+
+                if page is None:
+                    search_result = None
+                elif upcoming is not None:
+                    search_result, upcoming = upcoming.result(), None
+                else:
+                    search_result = consume(
+                        initial_date, final_date, page, max_results
+                    )
+        finally:
+            if upcoming is not None:
+                upcoming.cancel()
+            if pool is not None:
+                pool.shutdown(wait=False)
 
     def query_pre_approvals_by_code(self, code):
         """query pre-approvals by code"""
@@ -370,42 +706,46 @@ class PagSeguro(object):
 
         url = self.config.SUBSCRIBER_URL + "/%s/billing_info" % customer_id
         response = self.put(url=url, data=[data])
-        return response
+        return self.json_response(response)
 
     def create_subscriber(self, **kwargs):
         self.build_checkout_params(**kwargs)
         response = self.post(url=self.config.SUBSCRIBER_URL)
-        return response
+        self.invalidate_lookups("customers")
+        return self.json_response(response)
 
     def get_subscriber(self, pag_id=None, reference_id=None):
         url = self.config.SUBSCRIBER_URL
         if reference_id:
             url += "?reference_id=%s" % reference_id
         response = self.get(url=url)
-        return response
+        return self.json_response(response)
 
     def delete_subscriber(self, code):
         response = self.delete(url=self.config.SUBSCRIBER_URL + code)
-        return response
+        self.invalidate_lookups("customers")
+        return self.json_response(response)
 
     def create_plan(self, plan):
         response = self.post(url=self.config.PLAN_URL, data=plan)
-        return response
+        self.invalidate_lookups("plans")
+        return self.json_response(response)
 
     def get_plan(self, plan_id=None, reference_id=None):
         url = self.config.PLAN_URL
         if reference_id:
             url = self.config.PLAN_URL + "?reference_id=%s" % reference_id
-        response = requests.get(url, headers=self.headers)
-        return response
+        response = self.get(url=url)
+        return self.json_response(response)
 
     def delete_plan(self, code):
         response = self.delete(url=self.config.PLAN_URL + code)
-        return response
+        self.invalidate_lookups("plans")
+        return self.json_response(response)
 
     def list_plans(self):
         response = self.get(url=self.config.PLAN_URL)
-        return response
+        return self.json_response(response)
 
     def create_subscription(self, signature=None):
         if signature:
@@ -413,21 +753,21 @@ class PagSeguro(object):
         else:
             self.build_subscription()
         response = self.post(url=self.config.SUBSCRIPTION_URL)
-        return response
+        return self.json_response(response)
 
     def get_subscription(self, pag_id=None, reference_id=None):
         url = self.config.SUBSCRIPTION_URL
         if reference_id:
             url += "?reference_id=%s" % reference_id
         response = self.get(url=url)
-        return response
+        return self.json_response(response)
 
     def update_subscription(self, subscription_code, data):
         url = self.config.SUBSCRIPTION_URL + "/%s" % subscription_code
         response = self.put(url=url, data=data)
-        return response
+        return self.json_response(response)
 
     def payment_retry(self, subscription_code):
         url = self.config.SUBSCRIPTION_URL + "/%s/retry" % subscription_code
         response = self.put(url=url)
-        return response
+        return self.json_response(response)
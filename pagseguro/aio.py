@@ -0,0 +1,657 @@
+# coding: utf-8
+"""asyncio flavour of the PagSeguro client, requires ``aiohttp``"""
+import asyncio
+import threading
+import time
+import weakref
+
+from . import PagSeguro
+from .cache import lookup_cache
+from .codec import loads
+from .columnar import TransactionWriter
+from .exceptions import PagSeguroPageError, PagSeguroPaginationError
+from .metrics import endpoint_name, payload_size
+from .reconcile import Reconciler
+from .shards import WindowPlanner, merge_records
+from .sync import AsyncPreApprovalSync, AsyncTransactionSync
+from .utils import first_result, next_page, remaining_pages
+from .parsers import (
+    PagSeguroCheckoutResponse,
+    PagSeguroNotificationResponse,
+    PagSeguroPreApprovalNotificationResponse,
+    PagSeguroPreApprovalCancel,
+    PagSeguroPreApprovalPayment,
+    PagSeguroTransactionSearchResult,
+    PagSeguroPreApproval,
+    PagSeguroPreApprovalSearch,
+)
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+class AsyncResponse(object):
+    """fully read HTTP response, mirrors the bits of requests.Response we use"""
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return loads(self.content)
+
+    def __repr__(self):
+        return "<AsyncResponse [%s]>" % self.status_code
+
+
+class AsyncTransport(object):
+    """Pooled keep-alive aiohttp transport
+
+    aiohttp sessions are bound to the event loop they were created in, so
+    one ``ClientSession`` is kept per running loop and shared by every
+    ``AsyncPagSeguro`` using the same pool settings.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, timeout=None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self._sessions = weakref.WeakKeyDictionary()
+
+    def session(self):
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_connections * self.pool_maxsize,
+                limit_per_host=self.pool_maxsize,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._sessions[loop] = session
+        return session
+
+    async def request(
+        self, method, url, params=None, json=None, data=None, headers=None
+    ):
+        if params:
+            params = {k: str(v) for k, v in params.items() if v is not None}
+        async with self.session().request(
+            method, url, params=params, json=json, data=data, headers=headers
+        ) as response:
+            content = await response.read()
+            return AsyncResponse(response.status, response.headers, content)
+
+    async def close(self):
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+
+def get_async_transport(pool_connections=10, pool_maxsize=10, timeout=None):
+    """return the process wide async transport for the given pool settings"""
+    key = (pool_connections, pool_maxsize, timeout)
+    with _transports_lock:
+        transport = _transports.get(key)
+        if transport is None:
+            transport = AsyncTransport(pool_connections, pool_maxsize, timeout)
+            _transports[key] = transport
+    return transport
+
+
+async def close_async_transports():
+    """close the sessions opened by the running event loop"""
+    for transport in list(_transports.values()):
+        await transport.close()
+
+
+class AsyncPagSeguro(PagSeguro):
+    """PagSeguro client whose network methods are coroutines
+
+    Payload building and response parsing are shared with ``PagSeguro``,
+    only the I/O is awaited.
+    """
+
+    def _get_transport(self):
+        return get_async_transport(
+            pool_connections=self.config.POOL_CONNECTIONS,
+            pool_maxsize=self.config.POOL_MAXSIZE,
+            timeout=self.config.TIMEOUT,
+        )
+
+    async def request(self, method, url, **kwargs):
+        """send through the transport, reporting to ``Config.METRICS``"""
+        if not self.metrics.enabled:
+            return await self.transport.request(method, url, **kwargs)
+        endpoint = endpoint_name(self.config, url)
+        sent = payload_size(kwargs.get("data"))
+        start = time.perf_counter()
+        try:
+            response = await self.transport.request(method, url, **kwargs)
+        except Exception:
+            self.metrics.request(
+                endpoint, method, None, time.perf_counter() - start, sent
+            )
+            raise
+        self.metrics.request(
+            endpoint,
+            method,
+            response.status_code,
+            time.perf_counter() - start,
+            sent,
+            payload_size(response.content),
+        )
+        return response
+
+    async def get(self, url, data=None, params=None):
+        """do a get transaction"""
+        return await self.request(
+            "GET", url, params=params, headers=self.headers
+        )
+
+    async def post(self, url, data=None):
+        """do a post request"""
+        if not data:
+            data = self.data
+        return await self.request(
+            "POST", url, data=self.codec.dumps(data), headers=self.headers
+        )
+
+    async def put(self, url, data=None):
+        """do a put request"""
+        if not data:
+            data = self.data
+        return await self.request(
+            "PUT", url, data=self.codec.dumps(data), headers=self.headers
+        )
+
+    async def delete(self, url):
+        """do a delete request"""
+        return await self.request("DELETE", url, headers=self.headers)
+
+    async def build_subscription(self, **kwargs):
+        """build a dict with params"""
+        self.build_checkout_params(**kwargs)
+        plan, customer = await self.resolve_subscription_lookups(self.subscription)
+        self._build_subscription_params(plan, customer, **kwargs)
+
+    async def resolve_subscription_lookups(self, subscription):
+        plan = customer = None
+        if subscription.get("plan_reference_id", None):
+            plan = await self.resolve_plan(subscription["plan_reference_id"])
+        if not subscription.get("customer_id", None) and (
+            subscription.get("customer_reference_id", None)
+            and subscription.get("search_by_reference_id", False)
+        ):
+            customer = await self.resolve_subscriber(
+                subscription["customer_reference_id"]
+            )
+        return plan, customer
+
+    async def _cached_lookup(self, kind, reference_id, fetch):
+        ttl = self.config.LOOKUP_CACHE_TTL
+        key = self._lookup_key(kind) + (reference_id,)
+        if ttl:
+            result = lookup_cache.get(key)
+            if result is not None:
+                return result
+        result = first_result(await fetch(reference_id=reference_id), kind)
+        if ttl and result is not None:
+            lookup_cache.set(key, result, ttl=ttl)
+        return result
+
+    async def resolve_plan(self, reference_id):
+        return await self._cached_lookup("plans", reference_id, self.get_plan)
+
+    async def resolve_subscriber(self, reference_id):
+        return await self._cached_lookup(
+            "customers", reference_id, self.get_subscriber
+        )
+
+    async def checkout(self, transparent=False, **kwargs):
+        """create a pagseguro checkout, see PagSeguro.checkout"""
+        self.build_checkout_params(**kwargs)
+        return self.json_response(await self.post(url=self.config.ORDER_URL))
+
+    async def create_orders(self, orders, max_concurrency=None):
+        """create many orders at once, see PagSeguro.create_orders"""
+        template = self.checkout_template()
+        semaphore = asyncio.Semaphore(
+            max_concurrency or self.config.ORDER_MAX_WORKERS
+        )
+
+        async def create(order):
+            async with semaphore:
+                try:
+                    response = await self.request(
+                        "POST",
+                        self.config.ORDER_URL,
+                        data=self.render_order(order, template),
+                        headers=self.headers,
+                    )
+                    return PagSeguroCheckoutResponse(response.content, self.config)
+                except Exception as e:
+                    return e
+
+        return await asyncio.gather(*[create(order) for order in orders])
+
+    async def send_order(self, order):
+        """create the order described by an OrderRequest"""
+        response = await self.request(
+            "POST",
+            self.config.ORDER_URL,
+            data=self.render_order(order),
+            headers=self.headers,
+        )
+        return PagSeguroCheckoutResponse(response.content, self.config)
+
+    async def send_subscription(self, request):
+        """create the subscription described by a SubscriptionRequest"""
+        plan, customer = await self.resolve_subscription_lookups(request.subscription)
+        response = await self.request(
+            "POST",
+            self.config.SUBSCRIPTION_URL,
+            data=self.codec.dumps(self.subscription_payload(request, plan, customer)),
+            headers=self.headers,
+        )
+        return self.json_response(response)
+
+    async def check_notification(self, code):
+        """check a notification by its code"""
+        params = {"email": self.email, "token": self.token}
+        response = await self.request(
+            "GET", self.config.url("NOTIFICATION_URL", code), params=params
+        )
+        return PagSeguroNotificationResponse(response.content, self.config)
+
+    async def check_pre_approval_notification(self, code):
+        """check a notification by its code"""
+        response = await self.get(
+            url=self.config.url("PRE_APPROVAL_NOTIFICATION_URL", code)
+        )
+        return PagSeguroPreApprovalNotificationResponse(response.content, self.config)
+
+    async def pre_approval_ask_payment(self, **kwargs):
+        """ask form a subscribe payment"""
+        self.build_pre_approval_payment_params(**kwargs)
+        response = await self.post(url=self.config.PRE_APPROVAL_PAYMENT_URL)
+        return PagSeguroPreApprovalPayment(response.content, self.config)
+
+    async def pre_approval_cancel(self, code):
+        """cancel a subscribe"""
+        response = await self.get(url=self.config.url("PRE_APPROVAL_CANCEL_URL", code))
+        return PagSeguroPreApprovalCancel(response.content, self.config)
+
+    async def check_transaction(self, code):
+        """check a transaction by its code"""
+        response = await self.get(url=self.config.url("TRANSACTION_URL", code))
+        return PagSeguroNotificationResponse(response.content, self.config)
+
+    async def query_transactions(
+        self,
+        initial_date,
+        final_date,
+        page=None,
+        max_results=None,
+        max_workers=None,
+        window=None,
+    ):
+        """query transaction by date range, see PagSeguro.query_transactions"""
+        return await self._query(
+            self._consume_query_transactions,
+            "transactions",
+            initial_date,
+            final_date,
+            page,
+            max_results,
+            max_workers,
+            window,
+        )
+
+    async def _consume_query_transactions(
+        self, initial_date, final_date, page=None, max_results=None
+    ):
+        querystring = self._search_params(initial_date, final_date, page, max_results)
+        response = await self.get(
+            url=self.config.QUERY_TRANSACTION_URL, params=querystring
+        )
+        return PagSeguroTransactionSearchResult(response.content, self.config)
+
+    async def query_pre_approvals(
+        self,
+        initial_date,
+        final_date,
+        page=None,
+        max_results=None,
+        max_workers=None,
+        window=None,
+    ):
+        """query pre-approvals by date range, see PagSeguro.query_pre_approvals"""
+        return await self._query(
+            self._consume_query_pre_approvals,
+            "pre_approvals",
+            initial_date,
+            final_date,
+            page,
+            max_results,
+            max_workers,
+            window,
+        )
+
+    async def _consume_query_pre_approvals(
+        self, initial_date, final_date, page=None, max_results=None
+    ):
+        querystring = self._search_params(initial_date, final_date, page, max_results)
+        response = await self.get(
+            url=self.config.QUERY_PRE_APPROVAL_URL, params=querystring
+        )
+        return PagSeguroPreApprovalSearch(response.content, self.config)
+
+    async def iter_transactions(
+        self, initial_date, final_date, page=None, max_results=None, prefetch=False
+    ):
+        """yield transactions page by page"""
+        async for record in self._iter_pages(
+            self._consume_query_transactions,
+            "transactions",
+            initial_date,
+            final_date,
+            page,
+            max_results,
+            prefetch,
+        ):
+            yield record
+
+    async def iter_pre_approvals(
+        self, initial_date, final_date, page=None, max_results=None, prefetch=False
+    ):
+        """yield pre-approvals page by page"""
+        async for record in self._iter_pages(
+            self._consume_query_pre_approvals,
+            "pre_approvals",
+            initial_date,
+            final_date,
+            page,
+            max_results,
+            prefetch,
+        ):
+            yield record
+
+    def sync_transactions(self, store, start=None, **kwargs):
+        """AsyncTransactionSync, iterate it with ``async for``"""
+        return AsyncTransactionSync(self, store, start, **kwargs)
+
+    def sync_pre_approvals(self, store, start=None, **kwargs):
+        """AsyncPreApprovalSync, iterate it with ``async for``"""
+        return AsyncPreApprovalSync(self, store, start, **kwargs)
+
+    async def reconcile(self, orders, initial_date, final_date, **options):
+        """yield the Discrepancies, see PagSeguro.reconcile
+
+        Transactions are read with ``async for`` and fed to the Reconciler
+        in batches, so orders still spill to disk when too many.
+        """
+        reconciler = Reconciler(self.config, **options)
+        reconciler.begin(orders)
+        try:
+            batch = []
+            async for transaction in self.iter_transactions(
+                initial_date, final_date, prefetch=True
+            ):
+                batch.append(transaction)
+                if len(batch) >= reconciler.buffer_rows:
+                    for discrepancy in reconciler.feed(batch):
+                        yield discrepancy
+                    batch = []
+            for discrepancy in reconciler.feed(batch):
+                yield discrepancy
+            for discrepancy in reconciler.end():
+                yield discrepancy
+        finally:
+            reconciler.close()
+
+    async def export_transactions(self, initial_date, final_date, path, **kwargs):
+        """write the range's transactions as typed columns, see columnar
+
+        Parquet when pyarrow is installed, a NumPy ``.npz`` otherwise.
+        Returns the path written.
+        """
+        with TransactionWriter(path, **kwargs) as writer:
+            async for transaction in self.iter_transactions(
+                initial_date, final_date, prefetch=True
+            ):
+                writer.write((transaction,))
+        return writer.path
+
+    async def _iter_pages(
+        self, consume, attr, initial_date, final_date, page, max_results, prefetch
+    ):
+        upcoming = None
+        try:
+            search_result = await consume(initial_date, final_date, page, max_results)
+            while search_result is not None:
+                if search_result.errors:
+                    raise PagSeguroPageError(page, search_result.errors)
+                page = next_page(search_result)
+                if page is not None and prefetch:
+                    upcoming = asyncio.ensure_future(
+                        consume(initial_date, final_date, page, max_results)
+                    )
+                records = getattr(search_result, attr)
+                search_result = None
+                for record in records:
+                    yield record
+                del records
+
+                if page is None:
+                    search_result = None
+                elif upcoming is not None:
+                    search_result, upcoming = await upcoming, None
+                else:
+                    search_result = await consume(
+                        initial_date, final_date, page, max_results
+                    )
+        finally:
+            if upcoming is not None:
+                upcoming.cancel()
+
+    async def _query(
+        self,
+        consume,
+        attr,
+        initial_date,
+        final_date,
+        page,
+        max_results,
+        max_workers,
+        window,
+    ):
+        if window is None:
+            window = self.config.QUERY_WINDOW
+        if window is None or page is not None:
+            return await self._query_pages(
+                consume, attr, initial_date, final_date, page, max_results, max_workers
+            )
+        return await self._query_windows(
+            consume, attr, initial_date, final_date, max_results, max_workers, window
+        )
+
+    async def _query_windows(
+        self, consume, attr, initial_date, final_date, max_results, max_workers, window
+    ):
+        """search concurrent date windows, see PagSeguro._query_windows"""
+        planner = WindowPlanner(
+            initial_date, final_date, window, self.config.QUERY_WINDOW_PAGES
+        )
+        max_workers = max(max_workers or self.config.QUERY_MAX_WORKERS, 1)
+        pages = {}
+        failures = {}
+        pending = {}
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def fetch(start, end, page):
+            async with semaphore:
+                return await consume(start, end, page, max_results)
+
+        def submit(start, end, page):
+            task = asyncio.ensure_future(fetch(start, end, page))
+            pending[task] = (start, end, page)
+
+        def fill():
+            while len(pending) < max_workers:
+                window = planner.next_window()
+                if window is None:
+                    return
+                submit(window[0], window[1], 1)
+
+        fill()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    start, end, page = pending.pop(task)
+                    try:
+                        search_result = task.result()
+                    except Exception as e:
+                        failures[(start, page)] = e
+                        continue
+                    if search_result.errors:
+                        failures[(start, page)] = PagSeguroPageError(
+                            page, search_result.errors
+                        )
+                        continue
+                    pages[(start, page)] = getattr(search_result, attr)
+                    if page == 1:
+                        planner.observe(start, end, search_result.total_pages)
+                        for later in remaining_pages(search_result):
+                            submit(start, end, later)
+                fill()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        results = merge_records(pages[key] for key in sorted(pages))
+        if failures:
+            raise PagSeguroPaginationError(results, failures)
+        return results
+
+    async def _query_pages(
+        self, consume, attr, initial_date, final_date, page, max_results, max_workers
+    ):
+        """fetch the first page, then fan out over the remaining ones"""
+        search_result = await consume(initial_date, final_date, page, max_results)
+        results = list(getattr(search_result, attr))
+        pages = remaining_pages(search_result)
+        if not pages:
+            return results
+
+        semaphore = asyncio.Semaphore(max_workers or self.config.QUERY_MAX_WORKERS)
+
+        async def fetch(page):
+            async with semaphore:
+                try:
+                    search_result = await consume(
+                        initial_date, final_date, page, max_results
+                    )
+                except Exception as e:
+                    return page, None, e
+            if search_result.errors:
+                return page, None, PagSeguroPageError(page, search_result.errors)
+            return page, getattr(search_result, attr), None
+
+        failures = {}
+        for page, page_results, error in await asyncio.gather(
+            *[fetch(page) for page in pages]
+        ):
+            if error is not None:
+                failures[page] = error
+            else:
+                results.extend(page_results)
+
+        if failures:
+            raise PagSeguroPaginationError(results, failures)
+        return results
+
+    async def query_pre_approvals_by_code(self, code):
+        """query pre-approvals by code"""
+        response = await self.get(
+            url="%s/%s" % (self.config.QUERY_PRE_APPROVAL_URL, code)
+        )
+        return PagSeguroPreApproval(response.content, self.config)
+
+    async def update_subscriber_billing(self, customer_id, billing=None):
+        data = billing or self.payment["method"]
+        url = self.config.SUBSCRIBER_URL + "/%s/billing_info" % customer_id
+        return self.json_response(await self.put(url=url, data=[data]))
+
+    async def create_subscriber(self, **kwargs):
+        self.build_checkout_params(**kwargs)
+        response = await self.post(url=self.config.SUBSCRIBER_URL)
+        self.invalidate_lookups("customers")
+        return self.json_response(response)
+
+    async def get_subscriber(self, pag_id=None, reference_id=None):
+        url = self.config.SUBSCRIBER_URL
+        if reference_id:
+            url += "?reference_id=%s" % reference_id
+        return self.json_response(await self.get(url=url))
+
+    async def delete_subscriber(self, code):
+        response = await self.delete(url=self.config.SUBSCRIBER_URL + code)
+        self.invalidate_lookups("customers")
+        return self.json_response(response)
+
+    async def create_plan(self, plan):
+        response = await self.post(url=self.config.PLAN_URL, data=plan)
+        self.invalidate_lookups("plans")
+        return self.json_response(response)
+
+    async def get_plan(self, plan_id=None, reference_id=None):
+        url = self.config.PLAN_URL
+        if reference_id:
+            url = self.config.PLAN_URL + "?reference_id=%s" % reference_id
+        return self.json_response(await self.get(url=url))
+
+    async def delete_plan(self, code):
+        response = await self.delete(url=self.config.PLAN_URL + code)
+        self.invalidate_lookups("plans")
+        return self.json_response(response)
+
+    async def list_plans(self):
+        return self.json_response(await self.get(url=self.config.PLAN_URL))
+
+    async def create_subscription(self, signature=None):
+        if signature:
+            self.data = signature
+        else:
+            await self.build_subscription()
+        return self.json_response(await self.post(url=self.config.SUBSCRIPTION_URL))
+
+    async def get_subscription(self, pag_id=None, reference_id=None):
+        url = self.config.SUBSCRIPTION_URL
+        if reference_id:
+            url += "?reference_id=%s" % reference_id
+        return self.json_response(await self.get(url=url))
+
+    async def update_subscription(self, subscription_code, data):
+        url = self.config.SUBSCRIPTION_URL + "/%s" % subscription_code
+        return self.json_response(await self.put(url=url, data=data))
+
+    async def payment_retry(self, subscription_code):
+        url = self.config.SUBSCRIPTION_URL + "/%s/retry" % subscription_code
+        return self.json_response(await self.put(url=url))
@@ -0,0 +1,86 @@
+# coding: utf-8
+"""Pluggable JSON codec for request bodies and JSON responses
+
+``get_codec()`` picks the fastest installed library (orjson, then ujson,
+then the stdlib json module) the first time it is needed. Every codec
+encodes to compact UTF-8 bytes and decodes from bytes or str.
+"""
+import threading
+
+CODECS = ("orjson", "ujson", "json")
+
+_codecs = {}
+_codecs_lock = threading.RLock()
+
+
+class JSONCodec(object):
+    def __init__(self, name, dumps, loads):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self):
+        return "<JSONCodec %s>" % self.name
+
+
+def _orjson_codec():
+    import orjson
+
+    return JSONCodec("orjson", orjson.dumps, orjson.loads)
+
+
+def _ujson_codec():
+    import ujson
+
+    def dumps(data):
+        return ujson.dumps(data, ensure_ascii=False).encode("utf-8")
+
+    return JSONCodec("ujson", dumps, ujson.loads)
+
+
+def _json_codec():
+    import json
+
+    def dumps(data):
+        return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+    return JSONCodec("json", dumps, json.loads)
+
+
+_factories = {"orjson": _orjson_codec, "ujson": _ujson_codec, "json": _json_codec}
+
+
+def get_codec(name=None):
+    """the codec called ``name``, or the fastest installed one
+
+    ``name`` may also be a JSONCodec (returned as is). An unknown or
+    missing library raises ImportError/ValueError.
+    """
+    if isinstance(name, JSONCodec):
+        return name
+    codec = _codecs.get(name)
+    if codec is not None:
+        return codec
+    with _codecs_lock:
+        if name is None:
+            for candidate in CODECS:
+                try:
+                    codec = get_codec(candidate)
+                except ImportError:
+                    continue
+                break
+        elif name in _factories:
+            codec = _factories[name]()
+        else:
+            raise ValueError("unknown JSON codec %r" % name)
+        _codecs[name] = codec
+    return codec
+
+
+def dumps(data, codec=None):
+    """compact JSON bytes"""
+    return get_codec(codec).dumps(data)
+
+
+def loads(content, codec=None):
+    return get_codec(codec).loads(content)
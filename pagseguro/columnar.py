@@ -0,0 +1,343 @@
+# coding: utf-8
+"""Typed columns for transaction search results, requires NumPy
+
+``transaction_columns`` turns transactions (the dicts of
+``query_transactions``, ``Transaction`` records or whole search result
+pages) into NumPy arrays: amounts as int64 cents, dates as UTC
+``datetime64[us]`` and status/type/payment method as int8 codes, so
+aggregates are vectorized::
+
+    columns = transaction_columns(pg.iter_transactions(start, end))
+    columns["fee_amount"].sum()
+
+``transaction_table`` builds the same columns as a ``pyarrow.Table`` and
+``write_transactions`` streams them to Parquet, or to a NumPy ``.npz``
+when pyarrow is not installed.
+"""
+from collections.abc import Mapping
+from datetime import datetime, timedelta, timezone
+
+from .utils import parse_amount, parse_date
+
+# name, PagSeguro key, Transaction attribute, kind
+COLUMNS = (
+    ("code", "code", "code", "string"),
+    ("reference", "reference", "reference", "string"),
+    ("date", "date", "date", "timestamp"),
+    ("last_event_date", "lastEventDate", "last_event_date", "timestamp"),
+    ("escrow_end_date", "escrowEndDate", "escrow_end_date", "timestamp"),
+    ("type", "type", "type", "category"),
+    ("status", "status", "status", "category"),
+    ("payment_method", "paymentMethod", "payment_method", "category"),
+    ("gross_amount", "grossAmount", "gross_amount_cents", "cents"),
+    ("discount_amount", "discountAmount", "discount_amount_cents", "cents"),
+    ("fee_amount", "feeAmount", "fee_amount_cents", "cents"),
+    ("net_amount", "netAmount", "net_amount_cents", "cents"),
+    ("extra_amount", "extraAmount", "extra_amount_cents", "cents"),
+    ("installment_count", "installmentCount", "installment_count", "count"),
+    ("item_count", "itemCount", "item_count", "count"),
+)
+
+STATUS_NAMES = {
+    1: "waiting_payment",
+    2: "in_analysis",
+    3: "paid",
+    4: "available",
+    5: "in_dispute",
+    6: "returned",
+    7: "cancelled",
+    8: "debited",
+    9: "temporary_retention",
+}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+# 2011-02-05T15:46:12.000-02:00, parsed vectorized when every byte is in place
+TIMESTAMP_SIZE = 29
+TIMESTAMP_LAYOUT = {4: "-", 7: "-", 10: "T", 13: ":", 16: ":", 19: ".", 26: ":"}
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError(
+            "pagseguro.columnar requires numpy, pip install pagseguro[numpy]"
+        )
+    return numpy
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _rows(transactions):
+    """transactions, with search result pages flattened"""
+    for item in transactions:
+        if hasattr(item, "transactions") and not isinstance(item, Mapping):
+            for transaction in item.transactions:
+                yield transaction
+        else:
+            yield item
+
+
+def _payment_method(value):
+    return value.get("type") if isinstance(value, dict) else value
+
+
+def _values(rows):
+    """(raw values per column, True when every row is a PagSeguro dict)
+
+    Dicts hold the wire strings, ``Transaction`` records decoded values.
+    """
+    rows = list(rows)
+    values = {}
+    if not any(hasattr(row, "fields_by_attr") for row in rows):
+        for name, key, _, _ in COLUMNS:
+            values[name] = [row.get(key) for row in rows]
+        values["payment_method"] = [
+            _payment_method(value) for value in values["payment_method"]
+        ]
+        return values, True
+    for name, key, attr, _ in COLUMNS:
+        values[name] = [
+            getattr(row, attr) if hasattr(row, "fields_by_attr") else row.get(key)
+            for row in rows
+        ]
+    values["payment_method"] = [
+        _payment_method(value) for value in values["payment_method"]
+    ]
+    return values, False
+
+
+def _epoch_us(value):
+    if isinstance(value, str):
+        value = parse_date(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - EPOCH) // MICROSECOND
+
+
+def _timestamps(numpy, values):
+    column = numpy.full(len(values), numpy.datetime64("NaT"), dtype="datetime64[us]")
+    fixed = [
+        i
+        for i, value in enumerate(values)
+        if isinstance(value, str) and len(value) == TIMESTAMP_SIZE
+    ]
+    parsed = numpy.zeros(len(values), dtype=bool)
+    if fixed:
+        strings = numpy.array([values[i] for i in fixed], dtype="U%d" % TIMESTAMP_SIZE)
+        chars = strings.view(numpy.uint32).reshape(-1, TIMESTAMP_SIZE)
+        ok = (chars[:, 23] == ord("-")) | (chars[:, 23] == ord("+"))
+        for position, char in TIMESTAMP_LAYOUT.items():
+            ok &= chars[:, position] == ord(char)
+        indexes = numpy.array(fixed)[ok]
+        if len(indexes):
+            digits = chars[ok].astype(numpy.int64) - ord("0")
+            offset = (digits[:, 24] * 10 + digits[:, 25]) * 60
+            offset += digits[:, 27] * 10 + digits[:, 28]
+            offset = numpy.where(chars[ok, 23] == ord("-"), -offset, offset)
+            try:
+                local = strings[ok].astype("U23").astype("datetime64[us]")
+            except ValueError:
+                pass
+            else:
+                column[indexes] = local - offset.astype("timedelta64[m]")
+                parsed[indexes] = True
+    for i in numpy.flatnonzero(~parsed):
+        value = values[i]
+        if value is not None and value != "":
+            column[i] = numpy.datetime64(_epoch_us(value), "us")
+    return column
+
+
+def _cents(numpy, values, wire):
+    if wire:
+        try:
+            amounts = numpy.array(values, dtype=numpy.float64)
+        except ValueError:
+            pass
+        else:
+            # two decimal places, exact below 2 ** 53 cents
+            missing = numpy.isnan(amounts)
+            amounts[missing] = 0
+            return numpy.rint(amounts * 100).astype(numpy.int64), missing
+    column = numpy.zeros(len(values), dtype=numpy.int64)
+    missing = numpy.zeros(len(values), dtype=bool)
+    for i, value in enumerate(values):
+        if isinstance(value, str) and value:
+            column[i] = parse_amount(value)
+        elif isinstance(value, int):
+            column[i] = value
+        else:
+            missing[i] = True
+    return column, missing
+
+
+def _codes(numpy, values, dtype, wire):
+    if wire:
+        try:
+            return numpy.array(values, dtype=dtype)
+        except (TypeError, ValueError):
+            pass
+    return numpy.array(
+        [-1 if value is None or value == "" else int(value) for value in values],
+        dtype=dtype,
+    )
+
+
+def _columns(numpy, values, wire):
+    """(columns, masks of missing values) from ``_values``"""
+    columns = {}
+    missing = {}
+    for name, _, _, kind in COLUMNS:
+        raw = values[name]
+        if kind == "string":
+            columns[name] = numpy.array(raw, dtype=object)
+            missing[name] = numpy.array([v is None for v in raw], dtype=bool)
+        elif kind == "timestamp":
+            columns[name] = _timestamps(numpy, raw)
+            missing[name] = numpy.isnat(columns[name])
+        elif kind == "cents":
+            columns[name], missing[name] = _cents(numpy, raw, wire)
+        else:
+            dtype = numpy.int8 if kind == "category" else numpy.int32
+            columns[name] = _codes(numpy, raw, dtype, wire)
+            missing[name] = columns[name] == -1
+    return columns, missing
+
+
+def transaction_columns(transactions):
+    """dict of NumPy arrays, one per column of COLUMNS
+
+    Missing amounts are 0, missing dates NaT and missing codes/counts -1.
+    """
+    numpy = _numpy()
+    columns, _ = _columns(numpy, *_values(_rows(transactions)))
+    return columns
+
+
+def _record_batch(pyarrow, numpy, rows):
+    columns, missing = _columns(numpy, *_values(rows))
+    arrays = []
+    for name, _, _, kind in COLUMNS:
+        mask = missing[name] if missing[name].any() else None
+        if kind == "string":
+            array = pyarrow.array(columns[name], type=pyarrow.string(), mask=mask)
+        elif kind == "timestamp":
+            array = pyarrow.array(
+                columns[name].astype(numpy.int64),
+                type=pyarrow.timestamp("us", tz="UTC"),
+                mask=mask,
+            )
+        elif kind == "category":
+            array = pyarrow.array(columns[name], mask=mask).dictionary_encode()
+        else:
+            array = pyarrow.array(columns[name], mask=mask)
+        arrays.append(array)
+    return pyarrow.RecordBatch.from_arrays(
+        arrays, names=[name for name, _, _, _ in COLUMNS]
+    )
+
+
+def transaction_table(transactions):
+    """pyarrow.Table of the columns, with nulls and dictionary-encoded codes"""
+    pyarrow = _pyarrow()
+    if pyarrow is None:
+        raise ImportError("transaction_table requires pyarrow")
+    return pyarrow.Table.from_batches(
+        [_record_batch(pyarrow, _numpy(), list(_rows(transactions)))]
+    )
+
+
+class TransactionWriter(object):
+    """Parquet file with pyarrow, ``.npz`` otherwise, written incrementally
+
+    ``write`` transactions in as many calls as needed (e.g. batches read
+    with ``async for``), then ``close`` returns the path written. Parquet
+    is written ``batch_size`` transactions at a time, so memory stays
+    bounded for long searches. As a context manager it closes on success
+    and only releases the file on errors.
+    """
+
+    batch_size = 100000
+
+    def __init__(self, path, batch_size=None):
+        self.numpy = _numpy()
+        self.pyarrow = _pyarrow()
+        if batch_size is not None:
+            self.batch_size = batch_size
+        if self.pyarrow is None and not path.endswith(".npz"):
+            path += ".npz"
+        self.path = path
+        self._rows = []
+        self._parts = []
+        self._writer = None
+
+    def write(self, transactions):
+        for row in _rows(transactions):
+            self._rows.append(row)
+            if len(self._rows) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        rows, self._rows = self._rows, []
+        if self.pyarrow is None:
+            self._parts.append(transaction_columns(rows))
+            return
+        batch = _record_batch(self.pyarrow, self.numpy, rows)
+        if self._writer is None:
+            import pyarrow.parquet
+
+            self._writer = pyarrow.parquet.ParquetWriter(self.path, batch.schema)
+        self._writer.write_batch(batch)
+
+    def close(self):
+        """write what is buffered, returns the path written"""
+        if self._rows or (self._writer is None and not self._parts):
+            self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            return self.path
+
+        numpy = self.numpy
+        columns = dict(
+            (name, numpy.concatenate([part[name] for part in self._parts]))
+            for name, _, _, _ in COLUMNS
+        )
+        self._parts = []
+        # npz cannot hold objects safely, strings become fixed width unicode
+        # with "" for None
+        for name, column in columns.items():
+            if column.dtype == object:
+                columns[name] = numpy.array(
+                    ["" if value is None else value for value in column], dtype=str
+                )
+        numpy.savez(self.path, **columns)
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def write_transactions(transactions, path, batch_size=100000):
+    """Parquet file with pyarrow (``path`` as given), ``.npz`` otherwise
+
+    See TransactionWriter. Returns the path written.
+    """
+    with TransactionWriter(path, batch_size) as writer:
+        writer.write(transactions)
+    return writer.path
@@ -1,70 +1,187 @@
 # -*- coding: utf-8 -*-
+import threading
+import weakref
+from functools import lru_cache
+from types import MappingProxyType
+
+
+@lru_cache(maxsize=None)
+def _default_settings(sandbox=False):
+    """default settings for production or sandbox, built once per process"""
+    base_url = "https://api.pagseguro.com"
+    payment_host = "https://api.pagseguro.com"
+    notification_host = "https://ws.pagseguro.uol.com.br"
+    subscription_host = "https://api.assinaturas.pagseguro.com"
+    if sandbox:
+        base_url = "https://sandbox.api.pagseguro.com"
+        payment_host = "https://sandbox.api.pagseguro.com"
+        subscription_host = "https://sandbox.api.assinaturas.pagseguro.com"
+
+    # prefixes/suffixes
+    version = "/v3/"
+    checkout_suffix = "{}checkout".format(version)
+    session_checkout_suffix = "{}sessions/".format(version)
+    notification_suffix = "{}transactions/notifications/%s".format("/v3/")
+    pre_approval_notification_suffix = "{}pre-approvals/" "notifications/%s".format(
+        version
+    )
+    transaction_suffix = "{}transactions/%s".format(version)
+    query_transaction_suffix = "{}transactions".format(version)
+    ctype = "application/x-www-form-urlencoded; charset=UTF-8"
+
+    # default config settings
+    defaults = dict(
+        ORDER_URL="{}/{}".format(base_url, "orders"),
+        PLAN_URL="{}/{}".format(subscription_host, "plans"),
+        SUBSCRIBER_URL="{}/{}".format(subscription_host, "customers"),
+        SUBSCRIPTION_URL="{}/{}".format(subscription_host, "subscriptions"),
+        PRE_APPROVAL_PAYMENT_URL="{}{}pre-approvals/payment".format(
+            base_url, version
+        ),
+        PRE_APPROVAL_CANCEL_URL="{}{}pre-approvals/cancel/%s".format(
+            base_url, version
+        ),
+        SESSION_CHECKOUT_URL="{}{}".format(base_url, session_checkout_suffix),
+        TRANSPARENT_CHECKOUT_URL="{}{}".format(base_url, query_transaction_suffix),
+        CHECKOUT_URL="{}{}".format(base_url, checkout_suffix),
+        NOTIFICATION_URL="{}{}".format(notification_host, notification_suffix),
+        PRE_APPROVAL_NOTIFICATION_URL="{}{}".format(
+            base_url, pre_approval_notification_suffix
+        ),
+        TRANSACTION_URL="{}{}".format(base_url, transaction_suffix),
+        QUERY_TRANSACTION_URL="{}{}".format(base_url, query_transaction_suffix),
+        QUERY_PRE_APPROVAL_URL="{}{}pre-approvals".format(base_url, version),
+        CURRENCY="BRL",
+        HEADERS={"Content-Type": ctype},
+        PAYMENT_URL="{}{}/payment.html?code=%s".format(
+            payment_host, checkout_suffix
+        ),
+        DATETIME_FORMAT="%Y-%m-%dT%H:%M:%S",
+        REFERENCE_PREFIX="%s",
+        USE_SHIPPING=True,
+        POOL_CONNECTIONS=10,
+        POOL_MAXSIZE=10,
+        HOST_POOL_SIZES={},
+        TIMEOUT=None,
+        QUERY_MAX_WORKERS=4,
+        QUERY_WINDOW=None,
+        QUERY_WINDOW_PAGES=10,
+        ORDER_MAX_WORKERS=8,
+        LOOKUP_CACHE_TTL=300,
+        JSON_CODEC=None,
+        METRICS=None,
+        TRANSACTION_STORE=None,
+        LAZY_PARSING=False,
+    )
+    return defaults
+
+
+def freeze(value):
+    """hashable version of a setting value, used to intern configs"""
+    if isinstance(value, (dict, MappingProxyType)):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return frozenset(freeze(v) for v in value)
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
 class Config(dict):
     def __init__(self, **kwargs):
         sandbox = kwargs.pop("sandbox", False)
-
-        base_url = "https://api.pagseguro.com"
-        payment_host = "https://api.pagseguro.com"
-        notification_host = "https://ws.pagseguro.uol.com.br"
-        subscription_host = "https://api.assinaturas.pagseguro.com"
-        if sandbox:
-            base_url = "https://sandbox.api.pagseguro.com"
-            payment_host = "https://sandbox.api.pagseguro.com"
-            subscription_host = "https://sandbox.api.assinaturas.pagseguro.com"
-
-        # prefixes/suffixes
-        version = "/v3/"
-        checkout_suffix = "{}checkout".format(version)
-        session_checkout_suffix = "{}sessions/".format(version)
-        notification_suffix = "{}transactions/notifications/%s".format("/v3/")
-        pre_approval_notification_suffix = "{}pre-approvals/" "notifications/%s".format(
-            version
-        )
-        transaction_suffix = "{}transactions/%s".format(version)
-        query_transaction_suffix = "{}transactions".format(version)
-        ctype = "application/x-www-form-urlencoded; charset=UTF-8"
-
-        # default config settings
-        defaults = dict(
-            ORDER_URL="{}/{}".format(base_url, "orders"),
-            PLAN_URL="{}/{}".format(subscription_host, "plans"),
-            SUBSCRIBER_URL="{}/{}".format(subscription_host, "customers"),
-            SUBSCRIPTION_URL="{}/{}".format(subscription_host, "subscriptions"),
-            PRE_APPROVAL_PAYMENT_URL="{}{}pre-approvals/payment".format(
-                base_url, version
-            ),
-            PRE_APPROVAL_CANCEL_URL="{}{}pre-approvals/cancel/%s".format(
-                base_url, version
-            ),
-            SESSION_CHECKOUT_URL="{}{}".format(base_url, session_checkout_suffix),
-            TRANSPARENT_CHECKOUT_URL="{}{}".format(base_url, query_transaction_suffix),
-            CHECKOUT_URL="{}{}".format(base_url, checkout_suffix),
-            NOTIFICATION_URL="{}{}".format(notification_host, notification_suffix),
-            PRE_APPROVAL_NOTIFICATION_URL="{}{}".format(
-                base_url, pre_approval_notification_suffix
-            ),
-            TRANSACTION_URL="{}{}".format(base_url, transaction_suffix),
-            QUERY_TRANSACTION_URL="{}{}".format(base_url, query_transaction_suffix),
-            QUERY_PRE_APPROVAL_URL="{}{}pre-approvals".format(base_url, version),
-            CURRENCY="BRL",
-            HEADERS={"Content-Type": ctype},
-            PAYMENT_URL="{}{}/payment.html?code=%s".format(
-                payment_host, checkout_suffix
-            ),
-            DATETIME_FORMAT="%Y-%m-%dT%H:%M:%S",
-            REFERENCE_PREFIX="%s",
-            USE_SHIPPING=True,
-        )
+        defaults = _default_settings(bool(sandbox))
 
         kwargs = {key.upper(): val for key, val in kwargs.items()}
-        keys = defaults.keys()
-        for key in keys:
+        for key, default in defaults.items():
             # only add override keys to properties
-            value = kwargs.pop(key, defaults[key])
-            setattr(self, key, value)
+            if isinstance(default, dict):
+                default = dict(default)
+            value = kwargs.pop(key, default)
+            object.__setattr__(self, key, value)
 
     def __getitem__(self, key):
         return getattr(self, key)
 
     def __setitem__(self, key, value):
         return setattr(self, key, value)
+
+    def url(self, key, *args):
+        """the ``key`` endpoint, with ``args`` filled in its ``%s`` slots"""
+        url = getattr(self, key)
+        return url % args if args else url
+
+    @classmethod
+    def shared(cls, **kwargs):
+        """the interned FrozenConfig for these settings, see FrozenConfig
+
+        Settings that cannot be hashed (e.g. a METRICS dataclass) cannot be
+        interned, they get a Config of their own instead.
+        """
+        try:
+            return FrozenConfig.get(**kwargs)
+        except TypeError:
+            return Config(**kwargs)
+
+
+class FrozenConfig(Config):
+    """Immutable Config, interned per sandbox flag and overrides
+
+    Built by ``Config.shared`` and shared by every client using the same
+    settings, so creating a PagSeguro costs a dict lookup. Configs with
+    overrides are only interned while something uses them, the plain
+    production and sandbox ones live for the whole process. ``%s``
+    endpoints are split once so ``url`` only concatenates. Dict settings
+    (HEADERS, HOST_POOL_SIZES...) are read-only mappings.
+    """
+
+    _instances = weakref.WeakValueDictionary()
+    _defaults = {}
+    _lock = threading.Lock()
+
+    def __init__(self, **kwargs):
+        super(FrozenConfig, self).__init__(**kwargs)
+        templates = {}
+        for key, value in list(vars(self).items()):
+            if isinstance(value, dict):
+                object.__setattr__(self, key, MappingProxyType(dict(value)))
+            elif key.endswith("_URL") and isinstance(value, str) and "%s" in value:
+                templates[key] = value.split("%s")
+        object.__setattr__(self, "_templates", templates)
+        object.__setattr__(self, "_kwargs", kwargs)
+
+    @classmethod
+    def get(cls, **kwargs):
+        key = freeze(kwargs)
+        config = cls._instances.get(key)
+        if config is None:
+            with cls._lock:
+                config = cls._instances.get(key)
+                if config is None:
+                    config = cls._instances[key] = cls(**kwargs)
+                    if set(kwargs) <= {"sandbox"}:
+                        cls._defaults[key] = config
+        return config
+
+    def url(self, key, *args):
+        parts = self._templates.get(key)
+        if parts is None or len(parts) != len(args) + 1:
+            return super(FrozenConfig, self).url(key, *args)
+        url = parts[0]
+        for arg, part in zip(args, parts[1:]):
+            url += str(arg) + part
+        return url
+
+    def replace(self, **kwargs):
+        """the shared config with ``kwargs`` overriding these settings"""
+        settings = dict(self._kwargs)
+        settings.update(kwargs)
+        return self.shared(**settings)
+
+    def __setattr__(self, key, value):
+        raise TypeError("FrozenConfig is immutable, use replace()")
+
+    __setitem__ = __setattr__
+
+    def __delattr__(self, key):
+        raise TypeError("FrozenConfig is immutable, use replace()")
@@ -3,3 +3,29 @@
 
 class PagSeguroValidationError(Exception):
     pass
+
+
+class PagSeguroPageError(Exception):
+    """a search page came back with PagSeguro errors"""
+
+    def __init__(self, page, errors):
+        self.page = page
+        self.errors = errors
+        super(PagSeguroPageError, self).__init__(
+            "page %s failed: %s" % (page, errors)
+        )
+
+
+class PagSeguroPaginationError(Exception):
+    """some pages of a search failed
+
+    ``results`` keeps everything fetched from the pages that succeeded, in
+    page order, and ``failures`` maps each failed page to its exception.
+    """
+
+    def __init__(self, results, failures):
+        self.results = results
+        self.failures = failures
+        super(PagSeguroPaginationError, self).__init__(
+            "%s page(s) failed: %s" % (len(failures), sorted(failures))
+        )
@@ -0,0 +1,717 @@
+# coding: utf-8
+"""Local stand-in for the PagSeguro API, for load tests and benchmarks
+
+``FakePagSeguroAPI`` answers the endpoints of ``Config`` (orders,
+transaction searches and notifications, pre-approvals, plans, customers and
+subscriptions) from memory, with configurable latency, error rate, rate
+limiting and synthetic search page counts. It is served either by
+``FakePagSeguroServer`` (threads, stdlib only) or ``AsyncFakePagSeguroServer``
+(aiohttp)::
+
+    with FakePagSeguroServer(FakePagSeguroAPI(pages=10)) as server:
+        pg = PagSeguro(token="token", config=server.config())
+        pg.query_transactions(initial_date, final_date)
+
+or from a shell, ``python -m pagseguro.fakeserver --port 8080 --help``.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit, urlunsplit
+
+from .config import _default_settings
+from .utils import format_date
+
+EPOCH = datetime.datetime(2011, 1, 1)
+SEARCH_FORMAT = "%Y-%m-%dT%H:%M"
+XML_HEADER = '<?xml version="1.0" encoding="ISO-8859-1"?>\n'
+XML_TYPE = "application/xml;charset=ISO-8859-1"
+JSON_TYPE = "application/json"
+
+TRANSACTION = """<transaction>
+<date>%(date)s</date>
+<lastEventDate>2011-02-15T17:39:14.000-03:00</lastEventDate>
+<code>%(code)s</code>
+<reference>REF%(index)d</reference>
+<type>1</type>
+<status>%(status)d</status>
+<paymentMethod><type>1</type></paymentMethod>
+<grossAmount>%(amount)d.00</grossAmount>
+<discountAmount>0.00</discountAmount>
+<feeAmount>0.00</feeAmount>
+<netAmount>%(amount)d.00</netAmount>
+<extraAmount>0.00</extraAmount>
+</transaction>"""
+
+PRE_APPROVAL = """<preApproval>
+<name>Assinatura %(index)d</name>
+<code>%(code)s</code>
+<date>2011-11-23T13:40:23.000-02:00</date>
+<tracker>538C53</tracker>
+<status>ACTIVE</status>
+<reference>REF%(index)d</reference>
+<lastEventDate>2011-11-25T20:04:23.000-02:00</lastEventDate>
+<charge>auto</charge>
+</preApproval>"""
+
+
+def transaction_code(index):
+    return "%08X-81B3-4419-9A75-BCC6FB495EF1" % index
+
+
+def pre_approval_code(index):
+    return "%08XE9EDF3DD4023F87B71DE349" % index
+
+
+def transaction_xml(index=0, code=None, date="2011-02-05T15:46:12.000-02:00"):
+    return TRANSACTION % {
+        "date": date,
+        "code": code or transaction_code(index),
+        "index": index,
+        "status": 3 + index % 2,
+        "amount": 100 + index,
+    }
+
+
+def pre_approval_xml(index=0, code=None):
+    return PRE_APPROVAL % {"code": code or pre_approval_code(index), "index": index}
+
+
+def search_xml(root, wrapper, records, page=1, total_pages=1):
+    return (
+        XML_HEADER + "<%s>"
+        "<date>2011-02-16T20:14:35.000-02:00</date>"
+        "<currentPage>%d</currentPage>"
+        "<resultsInThisPage>%d</resultsInThisPage>"
+        "<totalPages>%d</totalPages>"
+        "<%s>%s</%s>"
+        "</%s>"
+        % (root, page, len(records), total_pages, wrapper, "".join(records),
+           wrapper, root)
+    )
+
+
+def transaction_search_xml(count, page=1, total_pages=1, offset=0):
+    records = [transaction_xml(offset + i) for i in range(count)]
+    return search_xml(
+        "transactionSearchResult", "transactions", records, page, total_pages
+    )
+
+
+def pre_approval_search_xml(count, page=1, total_pages=1, offset=0):
+    records = [pre_approval_xml(offset + i) for i in range(count)]
+    return search_xml(
+        "preApprovalSearchResult", "preApprovals", records, page, total_pages
+    )
+
+
+# Latency distributions, called with the API random generator, in seconds
+
+
+def fixed_latency(seconds):
+    return lambda rng: seconds
+
+
+def uniform_latency(low, high):
+    return lambda rng: rng.uniform(low, high)
+
+
+def exponential_latency(mean):
+    return lambda rng: rng.expovariate(1.0 / mean)
+
+
+def lognormal_latency(median, sigma=0.5):
+    """long tailed, ``median`` seconds at p50"""
+    mu = math.log(median)
+    return lambda rng: rng.lognormvariate(mu, sigma)
+
+
+LATENCIES = {
+    "fixed": fixed_latency,
+    "uniform": uniform_latency,
+    "exponential": exponential_latency,
+    "lognormal": lognormal_latency,
+}
+
+
+def parse_latency(spec):
+    """``lognormal:0.02,0.5`` -> lognormal_latency(0.02, 0.5)"""
+    name, _, args = spec.partition(":")
+    if name not in LATENCIES:
+        raise ValueError("unknown latency distribution %r" % name)
+    return LATENCIES[name](*[float(arg) for arg in args.split(",") if arg])
+
+
+class TokenBucket(object):
+    """allows ``rate`` requests per second with bursts of ``burst``"""
+
+    def __init__(self, rate, burst=None, timer=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self.tokens = self.capacity
+        self.timer = timer
+        self.updated = timer()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """0 when allowed, otherwise the seconds until the next token"""
+        with self._lock:
+            now = self.timer()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class Response(object):
+    __slots__ = ("status", "body", "content_type", "headers", "delay")
+
+    def __init__(self, status, body, content_type=JSON_TYPE, headers=None):
+        self.status = status
+        if not isinstance(body, bytes):
+            if content_type == JSON_TYPE:
+                body = json.dumps(body).encode("utf-8")
+            else:
+                body = body.encode("iso-8859-1")
+        self.body = body
+        self.content_type = content_type
+        self.headers = headers or {}
+        self.delay = 0
+
+    def with_header(self, name, value):
+        self.headers[name] = value
+        return self
+
+
+def xml_response(body, status=200):
+    return Response(status, body, XML_TYPE)
+
+
+def json_response(data, status=200):
+    return Response(status, data, JSON_TYPE)
+
+
+class FakePagSeguroAPI(object):
+    """In-memory PagSeguro API
+
+    ``latency`` is one of the ``*_latency`` distributions (or any callable
+    taking a ``random.Random``), ``error_rate`` the fraction of requests
+    answered with a 500 and ``rate_limit`` the requests per second allowed
+    before answering 429 with a Retry-After header. Searches return
+    ``pages`` pages of ``page_size`` records unless the request sets
+    ``maxPageResults``. With ``per_hour`` set, transaction searches honour
+    their dates instead: transaction ``i`` happened ``i / per_hour`` hours
+    after ``EPOCH`` and a search returns the ones inside its minutes.
+    """
+
+    def __init__(
+        self,
+        latency=None,
+        error_rate=0.0,
+        rate_limit=None,
+        rate_limit_burst=None,
+        pages=1,
+        page_size=50,
+        seed=None,
+        per_hour=None,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(rate_limit, rate_limit_burst) if rate_limit else None
+        self.pages = pages
+        self.page_size = page_size
+        self.per_hour = per_hour
+        self.random = random.Random(seed)
+        self.stats = Counter()
+        self.plans = {}
+        self.customers = {}
+        self.subscriptions = {}
+        self.orders = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.routes = [
+            (method, re.compile(pattern + "$"), getattr(self, handler))
+            for method, pattern, handler in self.ROUTES
+        ]
+
+    ROUTES = (
+        ("POST", r"/orders", "create_order"),
+        ("GET", r"/orders/(?P<code>[^/]+)", "get_order"),
+        ("GET", r"/v3/transactions/notifications/(?P<code>[^/]+)", "notification"),
+        ("GET", r"/v3/pre-approvals/notifications/(?P<code>[^/]+)", "notification"),
+        ("GET", r"/v3/pre-approvals/cancel/(?P<code>[^/]+)", "cancel_pre_approval"),
+        ("POST", r"/v3/pre-approvals/payment", "pre_approval_payment"),
+        ("GET", r"/v3/pre-approvals", "search_pre_approvals"),
+        ("GET", r"/v3/pre-approvals/(?P<code>[^/]+)", "get_pre_approval"),
+        ("GET", r"/v3/transactions", "search_transactions"),
+        ("POST", r"/v3/transactions", "create_transaction"),
+        ("GET", r"/v3/transactions/(?P<code>[^/]+)", "get_transaction"),
+        ("POST", r"/v3/sessions/?", "create_session"),
+        ("POST", r"/v3/checkout", "create_checkout"),
+        # the client appends ids to PLAN_URL/SUBSCRIBER_URL without a slash
+        ("POST", r"/plans", "create_plan"),
+        ("GET", r"/plans", "list_plans"),
+        ("GET", r"/plans/?(?P<code>[^/]+)", "get_plan"),
+        ("DELETE", r"/plans/?(?P<code>[^/]+)", "delete_plan"),
+        ("POST", r"/customers", "create_customer"),
+        ("GET", r"/customers", "list_customers"),
+        ("GET", r"/customers/?(?P<code>[^/]+)", "get_customer"),
+        ("DELETE", r"/customers/?(?P<code>[^/]+)", "delete_customer"),
+        ("PUT", r"/customers/(?P<code>[^/]+)/billing_info", "update_billing"),
+        ("POST", r"/subscriptions", "create_subscription"),
+        ("GET", r"/subscriptions", "list_subscriptions"),
+        ("GET", r"/subscriptions/(?P<code>[^/]+)", "get_subscription"),
+        ("PUT", r"/subscriptions/(?P<code>[^/]+)", "update_subscription"),
+        ("PUT", r"/subscriptions/(?P<code>[^/]+)/retry", "retry_subscription"),
+    )
+
+    def handle(self, method, target, body=b""):
+        """the Response to ``method`` ``target`` (path plus query string)"""
+        response = self._handle(method, target, body)
+        if self.latency is not None:
+            response.delay = max(self.latency(self.random), 0)
+        with self._lock:
+            self.stats[response.status] += 1
+        return response
+
+    def _handle(self, method, target, body):
+        url = urlsplit(target)
+        query = dict((k, v[-1]) for k, v in parse_qs(url.query).items())
+        if self.bucket is not None:
+            wait = self.bucket.take()
+            if wait:
+                return json_response(
+                    {"error_messages": [{"code": "TOO_MANY_REQUESTS"}]},
+                    429,
+                ).with_header("Retry-After", "%d" % max(1, math.ceil(wait)))
+        if self.error_rate and self.random.random() < self.error_rate:
+            return self.error(url.path)
+
+        for route_method, pattern, handler in self.routes:
+            if route_method != method:
+                continue
+            match = pattern.match(url.path)
+            if match is not None:
+                data = None
+                if body:
+                    try:
+                        data = json.loads(body.decode("utf-8"))
+                    except ValueError:
+                        data = None
+                return handler(query=query, data=data, **match.groupdict())
+        return json_response({"error_messages": [{"code": "NOT_FOUND"}]}, 404)
+
+    def error(self, path):
+        if path.startswith("/v3/"):
+            return xml_response(
+                XML_HEADER + "<errors><error><code>500</code>"
+                "<message>internal error</message></error></errors>",
+                500,
+            )
+        return json_response(
+            {"error_messages": [{"code": "INTERNAL_ERROR"}]}, 500
+        )
+
+    def new_id(self, prefix):
+        return "%s_%08d" % (prefix, next(self._ids))
+
+    # orders and checkout
+
+    def create_order(self, query, data):
+        data = dict(data or {})
+        data["id"] = self.new_id("ORDE")
+        data["links"] = [
+            {"rel": "PAY", "href": "https://pagseguro.fake/pay/%s" % data["id"]}
+        ]
+        with self._lock:
+            self.orders[data["id"]] = data
+        return json_response(data, 201)
+
+    def get_order(self, query, data, code):
+        order = self.orders.get(code)
+        if order is None:
+            return json_response({"error_messages": [{"code": "NOT_FOUND"}]}, 404)
+        return json_response(order)
+
+    def create_checkout(self, query, data):
+        return xml_response(
+            XML_HEADER + "<checkout><code>%s</code>"
+            "<date>2011-02-05T15:46:12.000-02:00</date></checkout>"
+            % self.new_id("CHECKOUT")
+        )
+
+    def create_session(self, query, data):
+        return xml_response(
+            XML_HEADER + "<session><id>%s</id></session>" % self.new_id("SESSION")
+        )
+
+    def create_transaction(self, query, data):
+        return xml_response(XML_HEADER + transaction_xml(next(self._ids)))
+
+    # transactions and pre-approvals
+
+    def notification(self, query, data, code):
+        return xml_response(XML_HEADER + transaction_xml(0, code))
+
+    def get_transaction(self, query, data, code):
+        return xml_response(XML_HEADER + transaction_xml(0, code))
+
+    def get_pre_approval(self, query, data, code):
+        return xml_response(XML_HEADER + pre_approval_xml(0, code))
+
+    def cancel_pre_approval(self, query, data, code):
+        return xml_response(
+            XML_HEADER + "<result><date>2011-11-23T13:40:23.000-02:00</date>"
+            "<status>OK</status></result>"
+        )
+
+    def pre_approval_payment(self, query, data):
+        return xml_response(
+            XML_HEADER + "<result><transactionCode>%s</transactionCode>"
+            "<date>2011-11-23T13:40:23.000-02:00</date></result>"
+            % transaction_code(next(self._ids))
+        )
+
+    def _page(self, query):
+        page = int(query.get("page") or 1)
+        size = int(query.get("maxPageResults") or self.page_size)
+        return page, size
+
+    def _dated_indexes(self, query):
+        """transactions of the ``per_hour`` timeline inside the searched minutes"""
+        step = 3600.0 / self.per_hour
+        initial = datetime.datetime.strptime(query["initialDate"], SEARCH_FORMAT)
+        final = datetime.datetime.strptime(query["finalDate"], SEARCH_FORMAT)
+        final += datetime.timedelta(minutes=1)
+        first = max(0, math.ceil((initial - EPOCH).total_seconds() / step))
+        last = max(first, math.ceil((final - EPOCH).total_seconds() / step))
+        return range(first, last), step
+
+    def search_dated_transactions(self, query):
+        page, size = self._page(query)
+        indexes, step = self._dated_indexes(query)
+        total_pages = max(1, math.ceil(len(indexes) / float(size)))
+        records = [
+            transaction_xml(
+                i, date=format_date(EPOCH + datetime.timedelta(seconds=i * step))
+            )
+            for i in indexes[(page - 1) * size : page * size]
+        ]
+        return xml_response(
+            search_xml(
+                "transactionSearchResult", "transactions", records, page, total_pages
+            )
+        )
+
+    def search_transactions(self, query, data):
+        if self.per_hour:
+            return self.search_dated_transactions(query)
+        page, size = self._page(query)
+        if page > self.pages:
+            size = 0
+        return xml_response(
+            transaction_search_xml(size, page, self.pages, (page - 1) * size)
+        )
+
+    def search_pre_approvals(self, query, data):
+        page, size = self._page(query)
+        if page > self.pages:
+            size = 0
+        return xml_response(
+            pre_approval_search_xml(size, page, self.pages, (page - 1) * size)
+        )
+
+    # plans, customers and subscriptions
+
+    def _create(self, store, prefix, data):
+        data = dict(data or {})
+        data["id"] = self.new_id(prefix)
+        with self._lock:
+            store[data["id"]] = data
+        return json_response(data, 201)
+
+    def _list(self, store, key, query):
+        with self._lock:
+            items = list(store.values())
+        reference_id = query.get("reference_id")
+        if reference_id:
+            items = [i for i in items if i.get("reference_id") == reference_id]
+        return json_response({key: items})
+
+    def _get(self, store, code):
+        item = store.get(code)
+        if item is None:
+            return json_response({"error_messages": [{"code": "NOT_FOUND"}]}, 404)
+        return json_response(item)
+
+    def _delete(self, store, code):
+        with self._lock:
+            item = store.pop(code, None)
+        if item is None:
+            return json_response({"error_messages": [{"code": "NOT_FOUND"}]}, 404)
+        return Response(204, b"")
+
+    def create_plan(self, query, data):
+        return self._create(self.plans, "PLAN", data)
+
+    def list_plans(self, query, data):
+        return self._list(self.plans, "plans", query)
+
+    def get_plan(self, query, data, code):
+        return self._get(self.plans, code)
+
+    def delete_plan(self, query, data, code):
+        return self._delete(self.plans, code)
+
+    def create_customer(self, query, data):
+        return self._create(self.customers, "CUST", data)
+
+    def list_customers(self, query, data):
+        return self._list(self.customers, "customers", query)
+
+    def get_customer(self, query, data, code):
+        return self._get(self.customers, code)
+
+    def delete_customer(self, query, data, code):
+        return self._delete(self.customers, code)
+
+    def update_billing(self, query, data, code):
+        with self._lock:
+            customer = self.customers.get(code)
+            if customer is not None:
+                customer["billing_info"] = data
+        if customer is None:
+            return json_response({"error_messages": [{"code": "NOT_FOUND"}]}, 404)
+        return json_response(customer)
+
+    def create_subscription(self, query, data):
+        return self._create(self.subscriptions, "SUBS", data)
+
+    def list_subscriptions(self, query, data):
+        return self._list(self.subscriptions, "subscriptions", query)
+
+    def get_subscription(self, query, data, code):
+        return self._get(self.subscriptions, code)
+
+    def update_subscription(self, query, data, code):
+        with self._lock:
+            subscription = self.subscriptions.get(code)
+            if subscription is not None:
+                subscription.update(data or {})
+        if subscription is None:
+            return json_response({"error_messages": [{"code": "NOT_FOUND"}]}, 404)
+        return json_response(subscription)
+
+    def retry_subscription(self, query, data, code):
+        return self._get(self.subscriptions, code)
+
+
+def server_config(base_url, sandbox=False):
+    """Config overrides pointing every endpoint at ``base_url``"""
+    base = urlsplit(base_url)
+    config = {}
+    for key, value in _default_settings(sandbox).items():
+        if key.endswith("_URL"):
+            url = urlsplit(value)
+            config[key] = urlunsplit(
+                (base.scheme, base.netloc, url.path, url.query, url.fragment)
+            )
+    return config
+
+
+class FakePagSeguroServer(object):
+    """FakePagSeguroAPI served by a thread per connection"""
+
+    def __init__(self, api=None, host="127.0.0.1", port=0):
+        self.api = api or FakePagSeguroAPI()
+        api = self.api
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # one write per response, avoids Nagle/delayed ACK stalls
+            wbufsize = 1 << 16
+            disable_nagle_algorithm = True
+
+            def respond(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                response = api.handle(self.command, self.path, body)
+                if response.delay:
+                    time.sleep(response.delay)
+                self.send_response(response.status)
+                self.send_header("Content-Type", response.content_type)
+                self.send_header("Content-Length", str(len(response.body)))
+                for name, value in response.headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(response.body)
+
+            do_GET = do_POST = do_PUT = do_DELETE = respond
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    def config(self, **overrides):
+        """PagSeguro ``config`` dict pointing at this server"""
+        config = server_config(self.url)
+        config.update(overrides)
+        return config
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, kwargs={"poll_interval": 0.05}
+        )
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class AsyncFakePagSeguroServer(object):
+    """FakePagSeguroAPI served by aiohttp on the running event loop"""
+
+    def __init__(self, api=None, host="127.0.0.1", port=0):
+        self.api = api or FakePagSeguroAPI()
+        self.host = host
+        self.port = port
+        self.runner = None
+
+    async def handle(self, request):
+        import asyncio
+        from aiohttp import web
+
+        body = await request.read()
+        response = self.api.handle(request.method, request.path_qs, body)
+        if response.delay:
+            await asyncio.sleep(response.delay)
+        return web.Response(
+            status=response.status,
+            body=response.body,
+            headers=dict(response.headers, **{"Content-Type": response.content_type}),
+        )
+
+    @property
+    def url(self):
+        return "http://%s:%d" % (self.host, self.port)
+
+    def config(self, **overrides):
+        config = server_config(self.url)
+        config.update(overrides)
+        return config
+
+    async def start(self):
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="fake PagSeguro API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=parse_latency, default=None,
+                        help="e.g. fixed:0.05, uniform:0.01,0.1, "
+                        "exponential:0.03 or lognormal:0.02,0.5 (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=None,
+                        help="requests per second before answering 429")
+    parser.add_argument("--pages", type=int, default=1,
+                        help="total pages of every search")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--per-hour", type=float, default=None,
+                        help="transactions per hour, makes searches honour "
+                        "their dates")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="serve with aiohttp instead of threads")
+    args = parser.parse_args(argv)
+
+    api = FakePagSeguroAPI(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        pages=args.pages,
+        page_size=args.page_size,
+        seed=args.seed,
+        per_hour=args.per_hour,
+    )
+    if args.use_async:
+        import asyncio
+
+        async def serve():
+            server = await AsyncFakePagSeguroServer(api, args.host, args.port).start()
+            print("fake PagSeguro listening on %s" % server.url)
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await server.stop()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+        return
+
+    server = FakePagSeguroServer(api, args.host, args.port)
+    print("fake PagSeguro listening on %s" % server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
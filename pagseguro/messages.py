@@ -0,0 +1,102 @@
+# coding: utf-8
+from collections import namedtuple
+
+
+class OrderRequest(
+    namedtuple(
+        "OrderRequest", "sender shipping items payment reference params"
+    )
+):
+    """Immutable checkout order, see PagSeguro.send_order
+
+    ``sender``, ``shipping``, ``items`` and ``payment`` take the same dicts
+    as the PagSeguro attributes of the same name, ``params`` any extra top
+    level params.
+    """
+
+    __slots__ = ()
+
+    def __new__(
+        cls,
+        sender=None,
+        shipping=None,
+        items=(),
+        payment=None,
+        reference="",
+        params=None,
+    ):
+        return super(OrderRequest, cls).__new__(
+            cls, sender, shipping, tuple(items or ()), payment, reference, params
+        )
+
+    def as_kwargs(self):
+        """the CheckoutTemplate.build/render arguments"""
+        kwargs = dict(self.params or {})
+        kwargs.update(
+            sender=self.sender,
+            shipping=self.shipping,
+            items=self.items,
+            payment=self.payment,
+            reference=self.reference,
+        )
+        return kwargs
+
+
+class SearchQuery(
+    namedtuple("SearchQuery", "initial_date final_date page max_results")
+):
+    """Immutable date range search, see PagSeguro.search_transactions"""
+
+    __slots__ = ()
+
+    def __new__(cls, initial_date, final_date, page=None, max_results=None):
+        return super(SearchQuery, cls).__new__(
+            cls, initial_date, final_date, page, max_results
+        )
+
+
+class SubscriptionRequest(
+    namedtuple(
+        "SubscriptionRequest",
+        "order reference_id plan_id plan_reference_id customer_id "
+        "customer_reference_id search_by_reference_id best_invoice_date",
+    )
+):
+    """Immutable subscription, see PagSeguro.send_subscription
+
+    ``order`` is the OrderRequest holding the customer and card charge.
+    """
+
+    __slots__ = ()
+
+    def __new__(
+        cls,
+        order,
+        reference_id,
+        plan_id=None,
+        plan_reference_id=None,
+        customer_id=None,
+        customer_reference_id=None,
+        search_by_reference_id=False,
+        best_invoice_date=None,
+    ):
+        return super(SubscriptionRequest, cls).__new__(
+            cls,
+            order,
+            reference_id,
+            plan_id,
+            plan_reference_id,
+            customer_id,
+            customer_reference_id,
+            search_by_reference_id,
+            best_invoice_date,
+        )
+
+    @property
+    def subscription(self):
+        """the equivalent of the PagSeguro.subscription dict"""
+        subscription = self._asdict()
+        del subscription["order"]
+        if subscription["best_invoice_date"] is None:
+            del subscription["best_invoice_date"]
+        return subscription
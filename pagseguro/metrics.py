@@ -0,0 +1,262 @@
+# coding: utf-8
+"""Request and parse instrumentation
+
+Clients report to the ``Config.METRICS`` object. The default ``Metrics``
+does nothing and has ``enabled = False``, which the client checks before
+timing anything, so disabled metrics cost a single attribute lookup.
+Subclass ``Metrics`` to forward to your own system, or use
+``PrometheusMetrics`` for latency histograms, status counters, payload
+sizes and parse times in the Prometheus text format.
+"""
+import bisect
+import threading
+import time
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+PARSE_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+
+class Metrics(object):
+    """no-op metrics, the interface every recorder implements"""
+
+    enabled = False
+
+    def request(self, endpoint, method, status, seconds, sent=0, received=0):
+        """a finished HTTP request, ``status`` is None when it raised"""
+
+    def parse(self, parser, seconds, size=0):
+        """a response body of ``size`` bytes decoded by ``parser``"""
+
+
+null_metrics = Metrics()
+
+
+def endpoint_prefixes(config):
+    """(url prefix, endpoint name) pairs, longest prefix first
+
+    ``TRANSACTION_URL`` becomes ``transaction``, the part before its first
+    ``%s`` the prefix it is recognised by.
+    """
+    prefixes = []
+    for key, value in vars(config).items():
+        if key.endswith("_URL") and isinstance(value, str):
+            name = key[: -len("_URL")].lower()
+            prefixes.append((value.split("%s")[0].split("?")[0], name))
+    # QUERY_TRANSACTION_URL and TRANSPARENT_CHECKOUT_URL share their url,
+    # ties go to the first name alphabetically
+    prefixes.sort(key=lambda item: (-len(item[0]), item[1]))
+    return prefixes
+
+
+# id(config) -> (config, prefixes), the config is kept so its id is not reused
+_prefixes = {}
+_prefixes_lock = threading.Lock()
+
+
+def endpoint_name(config, url):
+    """endpoint label of ``url``, ``transaction`` for TRANSACTION_URL etc"""
+    cached = _prefixes.get(id(config))
+    if cached is None or cached[0] is not config:
+        with _prefixes_lock:
+            if len(_prefixes) >= 64:
+                _prefixes.clear()
+            cached = _prefixes[id(config)] = (config, endpoint_prefixes(config))
+    for prefix, name in cached[1]:
+        if url.startswith(prefix):
+            return name
+    return "other"
+
+
+def payload_size(data):
+    if data is None:
+        return 0
+    if isinstance(data, str):
+        return len(data.encode("utf-8"))
+    try:
+        return len(data)
+    except TypeError:
+        return 0
+
+
+def timed_parse(metrics, parser, parse, content):
+    """``parse(content)``, reporting its duration to ``metrics``"""
+    start = time.perf_counter()
+    try:
+        return parse(content)
+    finally:
+        metrics.parse(parser, time.perf_counter() - start, payload_size(content))
+
+
+class Histogram(object):
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+
+def format_labels(labels):
+    return ",".join(
+        '%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in labels
+    )
+
+
+def format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class PrometheusMetrics(Metrics):
+    """Aggregates in memory and renders the Prometheus text format"""
+
+    enabled = True
+    prefix = "pagseguro"
+
+    HELP = {
+        "request_duration_seconds": ("histogram", "HTTP request latency"),
+        "request_size_bytes": ("histogram", "HTTP request body size"),
+        "response_size_bytes": ("histogram", "HTTP response body size"),
+        "requests_total": ("counter", "HTTP requests by status"),
+        "request_errors_total": ("counter", "HTTP requests that raised"),
+        "parse_duration_seconds": ("histogram", "response decoding time"),
+    }
+
+    def __init__(
+        self,
+        latency_buckets=LATENCY_BUCKETS,
+        size_buckets=SIZE_BUCKETS,
+        parse_buckets=PARSE_BUCKETS,
+    ):
+        self.latency_buckets = tuple(latency_buckets)
+        self.size_buckets = tuple(size_buckets)
+        self.parse_buckets = tuple(parse_buckets)
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def _observe(self, name, labels, buckets, value):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def _inc(self, name, labels):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + 1
+
+    def request(self, endpoint, method, status, seconds, sent=0, received=0):
+        labels = (("endpoint", endpoint), ("method", method))
+        with self._lock:
+            self._observe(
+                "request_duration_seconds", labels, self.latency_buckets, seconds
+            )
+            if status is None:
+                self._inc("request_errors_total", labels)
+                return
+            self._inc("requests_total", labels + (("status", status),))
+            self._observe("request_size_bytes", labels, self.size_buckets, sent)
+            self._observe("response_size_bytes", labels, self.size_buckets, received)
+
+    def parse(self, parser, seconds, size=0):
+        with self._lock:
+            self._observe(
+                "parse_duration_seconds",
+                (("parser", parser),),
+                self.parse_buckets,
+                seconds,
+            )
+
+    def count(self, name, **labels):
+        """current value of a counter, summed over the labels not given"""
+        with self._lock:
+            return sum(
+                value
+                for (key, key_labels), value in self.counters.items()
+                if key == name and set(labels.items()) <= set(key_labels)
+            )
+
+    def histogram(self, name, **labels):
+        """the Histogram for exactly these labels, or None"""
+        with self._lock:
+            return self.histograms.get((name, tuple(labels.items())))
+
+    def render(self):
+        """all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+            histograms = [
+                (key, list(h.cumulative()), h.sum, h.count) for key, h in histograms
+            ]
+        seen = set()
+        for (name, labels), value in counters:
+            self._header(lines, seen, name)
+            lines.append(
+                "%s_%s{%s} %d" % (self.prefix, name, format_labels(labels), value)
+            )
+        for (name, labels), buckets, total, count in histograms:
+            self._header(lines, seen, name)
+            metric = "%s_%s" % (self.prefix, name)
+            for bound, cumulative in buckets:
+                lines.append(
+                    "%s_bucket{%s} %d"
+                    % (
+                        metric,
+                        format_labels(labels + (("le", format_bound(bound)),)),
+                        cumulative,
+                    )
+                )
+            lines.append("%s_sum{%s} %r" % (metric, format_labels(labels), total))
+            lines.append("%s_count{%s} %d" % (metric, format_labels(labels), count))
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines, seen, name):
+        if name in seen:
+            return
+        seen.add(name)
+        kind, text = self.HELP.get(name, ("untyped", name))
+        lines.append("# HELP %s_%s %s" % (self.prefix, name, text))
+        lines.append("# TYPE %s_%s %s" % (self.prefix, name, kind))
+
+    def serve(self, port=9100, host="127.0.0.1"):
+        """expose ``render()`` on http://host:port/metrics from a thread"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
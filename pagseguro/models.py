@@ -0,0 +1,275 @@
+# coding: utf-8
+"""Slotted record types for parsed PagSeguro responses
+
+Records keep decoded values (integer cents, datetimes, ints) in
+``__slots__`` and still behave as a read-only mapping keyed by the original
+PagSeguro field names, returning values in the wire format, so code written
+against the plain dicts keeps working.
+"""
+from collections.abc import Mapping
+from decimal import Decimal
+
+from .utils import parse_date, format_date, parse_amount, format_amount
+
+
+class Field(object):
+    __slots__ = ("attr", "key", "decode", "encode")
+
+    def __init__(self, attr, key, decode=None, encode=None):
+        self.attr = attr
+        self.key = key
+        self.decode = decode
+        self.encode = encode
+
+
+def date_field(attr, key):
+    return Field(attr, key, parse_date, format_date)
+
+
+def amount_field(attr, key):
+    return Field(attr, key, parse_amount, format_amount)
+
+
+def int_field(attr, key):
+    return Field(attr, key, int, str)
+
+
+class RecordField(Field):
+    """a nested record, decoded lazily itself when its parent is lazy"""
+
+    __slots__ = ("record_class",)
+
+    def __init__(self, attr, key, record_class):
+        super(RecordField, self).__init__(attr, key, record_class.from_dict)
+        self.record_class = record_class
+
+
+def record_field(attr, key, record_class):
+    return RecordField(attr, key, record_class)
+
+
+def field_slots(fields):
+    return tuple(field.attr for field in fields) + ("extra", "raw")
+
+
+def amount_property(attr):
+    """Decimal view over an integer cents attribute"""
+
+    def getter(self):
+        cents = getattr(self, attr)
+        if cents is None:
+            return None
+        return Decimal(cents).scaleb(-2)
+
+    return property(getter)
+
+
+class Record(Mapping):
+    """base class, subclasses declare ``fields`` and matching ``__slots__``
+
+    Keys not declared as fields are kept untouched in ``extra``. Lazy
+    records keep the parsed dict in ``raw`` and decode each field on first
+    access, caching it in its slot.
+    """
+
+    __slots__ = ()
+    fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super(Record, cls).__init_subclass__(**kwargs)
+        cls.fields_by_key = dict((field.key, field) for field in cls.fields)
+        cls.fields_by_attr = dict((field.attr, field) for field in cls.fields)
+
+    def __init__(self, **values):
+        for field in self.fields:
+            setattr(self, field.attr, values.pop(field.attr, None))
+        self.extra = values or None
+        self.raw = None
+
+    @classmethod
+    def from_dict(cls, data, lazy=False):
+        """decode a parsed (xmltodict/json) dict into a record"""
+        record = cls.__new__(cls)
+        if lazy:
+            record.raw = data
+            return record
+        record.raw = None
+        extra = None
+        fields_by_key = cls.fields_by_key
+        for key, value in data.items():
+            field = fields_by_key.get(key)
+            if field is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+                continue
+            if value is not None and field.decode is not None:
+                value = field.decode(value)
+            setattr(record, field.attr, value)
+        for field in cls.fields:
+            if not hasattr(record, field.attr):
+                setattr(record, field.attr, None)
+        record.extra = extra
+        return record
+
+    def __getattr__(self, name):
+        # only reached for slots not filled yet, i.e. fields of lazy records
+        if name == "raw":
+            raise AttributeError(name)
+        raw = self.raw
+        if raw is None:
+            raise AttributeError(name)
+        if name == "extra":
+            value = dict(
+                (k, v) for k, v in raw.items() if k not in self.fields_by_key
+            ) or None
+        else:
+            field = self.fields_by_attr.get(name)
+            if field is None:
+                raise AttributeError(name)
+            value = raw.get(field.key)
+            if value is not None and isinstance(field, RecordField):
+                value = field.record_class.from_dict(value, lazy=True)
+            elif value is not None and field.decode is not None:
+                value = field.decode(value)
+        setattr(self, name, value)
+        return value
+
+    def to_dict(self):
+        """plain dict in the wire format, nested records included"""
+        return dict(
+            (key, value.to_dict() if isinstance(value, Record) else value)
+            for key, value in self.items()
+        )
+
+    def __getitem__(self, key):
+        if self.raw is not None:
+            value = self.raw[key]
+            if value is None:
+                raise KeyError(key)
+            return value
+        field = self.fields_by_key.get(key)
+        if field is None:
+            if self.extra is None:
+                raise KeyError(key)
+            return self.extra[key]
+        value = getattr(self, field.attr)
+        if value is None:
+            raise KeyError(key)
+        if field.encode is not None:
+            value = field.encode(value)
+        return value
+
+    def __iter__(self):
+        if self.raw is not None:
+            for key, value in self.raw.items():
+                if value is not None:
+                    yield key
+            return
+        for field in self.fields:
+            if getattr(self, field.attr) is not None:
+                yield field.key
+        if self.extra:
+            for key in self.extra:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return "<%s %s>" % (
+            self.__class__.__name__,
+            " ".join(
+                "%s=%r" % (field.attr, getattr(self, field.attr))
+                for field in self.fields
+                if getattr(self, field.attr) is not None
+            ),
+        )
+
+
+class Sender(Record):
+    fields = (
+        Field("name", "name"),
+        Field("email", "email"),
+        Field("phone", "phone"),
+        Field("documents", "documents"),
+        Field("address", "address"),
+    )
+    __slots__ = field_slots(fields)
+
+
+class Transaction(Record):
+    fields = (
+        date_field("date", "date"),
+        date_field("last_event_date", "lastEventDate"),
+        Field("code", "code"),
+        Field("reference", "reference"),
+        int_field("type", "type"),
+        int_field("status", "status"),
+        Field("cancellation_source", "cancellationSource"),
+        Field("payment_method", "paymentMethod"),
+        amount_field("gross_amount_cents", "grossAmount"),
+        amount_field("discount_amount_cents", "discountAmount"),
+        amount_field("fee_amount_cents", "feeAmount"),
+        amount_field("net_amount_cents", "netAmount"),
+        amount_field("extra_amount_cents", "extraAmount"),
+        date_field("escrow_end_date", "escrowEndDate"),
+        int_field("installment_count", "installmentCount"),
+        int_field("item_count", "itemCount"),
+        Field("line_items", "items"),
+        record_field("sender", "sender", Sender),
+        Field("shipping", "shipping"),
+    )
+    __slots__ = field_slots(fields)
+
+    gross_amount = amount_property("gross_amount_cents")
+    discount_amount = amount_property("discount_amount_cents")
+    fee_amount = amount_property("fee_amount_cents")
+    net_amount = amount_property("net_amount_cents")
+    extra_amount = amount_property("extra_amount_cents")
+
+
+class PreApproval(Record):
+    fields = (
+        Field("name", "name"),
+        Field("code", "code"),
+        date_field("date", "date"),
+        Field("tracker", "tracker"),
+        Field("status", "status"),
+        Field("reference", "reference"),
+        date_field("last_event_date", "lastEventDate"),
+        Field("charge", "charge"),
+        record_field("sender", "sender", Sender),
+    )
+    __slots__ = field_slots(fields)
+
+
+class Charge(Record):
+    """a charge of a v4 order (``charges`` in the orders JSON)"""
+
+    fields = (
+        Field("id", "id"),
+        Field("reference_id", "reference_id"),
+        Field("status", "status"),
+        date_field("created_at", "created_at"),
+        date_field("paid_at", "paid_at"),
+        Field("description", "description"),
+        Field("amount", "amount"),
+        Field("payment_response", "payment_response"),
+        Field("payment_method", "payment_method"),
+        Field("links", "links"),
+    )
+    __slots__ = field_slots(fields)
+
+    @property
+    def amount_cents(self):
+        """amounts are already sent as integer cents by the v4 API"""
+        if not self.amount:
+            return None
+        return int(self.amount["value"])
+
+    @property
+    def currency(self):
+        if not self.amount:
+            return None
+        return self.amount.get("currency")
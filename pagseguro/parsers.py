@@ -1,27 +1,166 @@
 # -*- coding: utf-8 -*-
 import logging
+from xml.etree import ElementTree
 
+from .codec import get_codec
+from .metrics import timed_parse
+from .models import PreApproval, Transaction
 from .utils import parse_date
 from .config import Config
 
-import xmltodict
 
 logger = logging.getLogger()
 
+XML_ENCODING = "iso-8859-1"
+
+
+class XMLDictBuilder(object):
+    """ElementTree parser target producing xmltodict shaped dicts
+
+    Elements matching ``item_path`` (a tuple of tags from the root) are
+    handed to ``item_callback`` as soon as they are closed and never attached
+    to the resulting tree, so only one of them is alive at a time.
+    """
+
+    def __init__(self, item_path=None, item_callback=None):
+        self.item_path = tuple(item_path) if item_path else None
+        self.item_callback = item_callback
+        self.path = []
+        self.stack = []
+        self.item = None
+        self.chunks = []
+        self.root = None
+
+    def start(self, tag, attrib):
+        self.path.append(tag)
+        self.stack.append((self.item, self.chunks))
+        self.item = dict(("@" + k, v) for k, v in attrib.items()) or None
+        self.chunks = []
+
+    def data(self, text):
+        self.chunks.append(text)
+
+    def end(self, tag):
+        text = "".join(self.chunks).strip() or None
+        item = self.item
+        if item is None:
+            item = text
+        elif text is not None:
+            item["#text"] = text
+
+        is_record = tuple(self.path) == self.item_path
+        self.path.pop()
+        self.item, self.chunks = self.stack.pop()
+        if is_record:
+            self.item_callback(item)
+        elif not self.path:
+            self.root = {tag: item}
+        else:
+            self.add_child(tag, item)
+
+    def add_child(self, key, value):
+        if self.item is None:
+            self.item = {}
+        if key not in self.item:
+            self.item[key] = value
+        elif isinstance(self.item[key], list):
+            self.item[key].append(value)
+        else:
+            self.item[key] = [self.item[key], value]
+
+    def close(self):
+        return self.root or {}
+
+
+def iterparse_xml(
+    xml, item_path=None, item_callback=None, encoding=XML_ENCODING, chunk_size=65536
+):
+    """incrementally parse ``xml`` (str, bytes or file-like) into dicts
+
+    Produces the same structure as ``xmltodict.parse`` except for the
+    elements at ``item_path``, which are streamed to ``item_callback``.
+    """
+    target = XMLDictBuilder(item_path, item_callback)
+    parser = ElementTree.XMLParser(target=target, encoding=encoding)
+    if hasattr(xml, "read"):
+        chunk = xml.read(chunk_size)
+        while chunk:
+            parser.feed(chunk)
+            chunk = xml.read(chunk_size)
+    else:
+        if isinstance(xml, str):
+            xml = xml.encode(encoding)
+        for start in range(0, len(xml), chunk_size):
+            parser.feed(xml[start : start + chunk_size])
+    return parser.close()
+
+
+class lazy_field(object):
+    """decode ``raw_fields[key]`` on first access and cache it on the instance
+
+    Being a non-data descriptor, a value set eagerly on the instance wins.
+    """
+
+    def __init__(self, key, decode):
+        self.key = key
+        self.decode = decode
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = instance.__dict__.get("raw_fields", {}).get(self.key)
+        if value is not None:
+            value = self.decode(value)
+        instance.__dict__[self.name] = value
+        return value
+
 
 class XMLParser(object):
-    def __init__(self, xml, config=None):
+    # "xmltodict" builds the whole document tree, "iterparse" streams the
+    # elements at ``record_path`` to ``add_record`` one at a time
+    engine = "xmltodict"
+    record_path = None
+    records_attr = None
+    # a pagseguro.models.Record subclass to decode records into, None keeps
+    # the parsed dicts (or attributes, for single responses)
+    record_class = None
+    record = None
+    # keep raw values and decode dates/records on first access, also turned
+    # on by ``lazy=True`` or ``Config.LAZY_PARSING``
+    lazy = False
+    # record class decoded into in lazy mode when record_class is None
+    lazy_record_class = None
+
+    def __init__(self, xml, config=None, lazy=None):
         self.xml = xml
         self.errors = None
         if config is None:
             config = Config()
         self.config = config
-        self.parse_xml(xml)
-        logger.debug(self.__dict__)
+        if lazy is None:
+            lazy = self.lazy or config.LAZY_PARSING
+        self.lazy = lazy
+        if lazy and self.record_class is None:
+            self.record_class = self.lazy_record_class
+        metrics = config.METRICS
+        if metrics is not None and metrics.enabled:
+            timed_parse(metrics, type(self).__name__, self.parse_xml, xml)
+        else:
+            self.parse_xml(xml)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(self.__dict__)
 
     def parse_xml(self, xml):
+        if self.engine != "iterparse":
+            import xmltodict
         try:
-            parsed = xmltodict.parse(xml, encoding="iso-8859-1")
+            if self.engine == "iterparse":
+                parsed = iterparse_xml(xml, self.record_path, self.add_record)
+            else:
+                parsed = xmltodict.parse(xml, encoding=XML_ENCODING)
         except Exception as e:
             logger.debug('Cannot parse the returned xml "%s" -> "%s"', xml, e)
             parsed = {}
@@ -31,8 +170,52 @@ class XMLParser(object):
 
         return parsed
 
+    def __getattr__(self, name):
+        record = self.record
+        if record is not None:
+            # typed fields (gross_amount_cents, status as int...) first, then
+            # the wire keys; Mapping methods such as items never shadow a key
+            if name in record.fields_by_attr or isinstance(
+                getattr(type(record), name, None), property
+            ):
+                return getattr(record, name)
+            try:
+                return record[name]
+            except KeyError:
+                pass
+        raise AttributeError(name)
+
+    def save_transactions(self, transactions):
+        """upsert into ``Config.TRANSACTION_STORE`` when one is set"""
+        store = self.config.TRANSACTION_STORE
+        if store is not None and transactions:
+            store.upsert(transactions)
+
+    def add_record(self, record):
+        if self.record_class is not None:
+            record = self.record_class.from_dict(record, lazy=self.lazy)
+        getattr(self, self.records_attr).append(record)
+
+    def to_records(self, items):
+        if self.record_class is None:
+            return items
+        return [self.record_class.from_dict(item, lazy=self.lazy) for item in items]
+
+    def set_fields(self, data):
+        if self.record_class is not None:
+            self.record = self.record_class.from_dict(data, lazy=self.lazy)
+            return
+        for k, v in data.items():
+            setattr(self, k, v)
+
+    @property
+    def streaming(self):
+        return self.engine == "iterparse" and self.record_path is not None
+
 
 class PagSeguroNotificationResponse(XMLParser):
+    lazy_record_class = Transaction
+
     def __getitem__(self, key):
         getattr(self, key, None)
 
@@ -41,8 +224,9 @@ class PagSeguroNotificationResponse(XMLParser):
         if self.errors:
             return
         transaction = parsed.get("transaction", {})
-        for k, v in transaction.items():
-            setattr(self, k, v)
+        self.set_fields(transaction)
+        if transaction.get("code"):
+            self.save_transactions([transaction])
 
 
 class PagSeguroPreApprovalNotificationResponse(XMLParser):
@@ -54,8 +238,7 @@ class PagSeguroPreApprovalNotificationResponse(XMLParser):
         if self.errors:
             return
         transaction = parsed.get("transaction", {})
-        for k, v in transaction.items():
-            setattr(self, k, v)
+        self.set_fields(transaction)
 
 
 class PagSeguroPreApprovalCancel(XMLParser):
@@ -67,14 +250,13 @@ class PagSeguroPreApprovalCancel(XMLParser):
         if self.errors:
             return
         transaction = parsed.get("transaction", {})
-        for k, v in transaction.items():
-            setattr(self, k, v)
+        self.set_fields(transaction)
 
 
 class PagSeguroCheckoutSession(XMLParser):
-    def __init__(self, xml, config=None):
+    def __init__(self, xml, config=None, lazy=None):
         self.session_id = None
-        super(PagSeguroCheckoutSession, self).__init__(xml, config)
+        super(PagSeguroCheckoutSession, self).__init__(xml, config, lazy)
 
     def parse_xml(self, xml):
         parsed = super(PagSeguroCheckoutSession, self).parse_xml(xml)
@@ -85,9 +267,11 @@ class PagSeguroCheckoutSession(XMLParser):
 
 
 class PagSeguroPreApprovalPayment(XMLParser):
-    def __init__(self, xml, config=None):
+    date = lazy_field("date", parse_date)
+
+    def __init__(self, xml, config=None, lazy=None):
         self.code = None
-        super(PagSeguroPreApprovalPayment, self).__init__(xml, config)
+        super(PagSeguroPreApprovalPayment, self).__init__(xml, config, lazy)
 
     def parse_xml(self, xml):
         parsed = super(PagSeguroPreApprovalPayment, self).parse_xml(xml)
@@ -95,11 +279,82 @@ class PagSeguroPreApprovalPayment(XMLParser):
             return
         result = parsed.get("result", {})
         self.code = result.get("transactionCode")
-        self.date = parse_date(result.get("date"))
+        if self.lazy:
+            self.raw_fields = result
+        else:
+            self.date = parse_date(result.get("date"))
+
+
+class PagSeguroJSONResponse(object):
+    """JSON response of the order, plan, subscriber and subscription endpoints
+
+    Returned by ``checkout`` and the plan/subscriber/subscription calls,
+    which used to return the HTTP response itself: ``json()``, ``ok``,
+    ``status_code`` and anything else read from the wrapped response keep
+    working. The body is decoded once, with the ``Config.JSON_CODEC``
+    codec, on first access. ``send_order`` and ``create_orders`` return a
+    PagSeguroCheckoutResponse instead, with the order already decoded into
+    attributes; ``PagSeguroCheckoutResponse(response.json())`` gives the
+    same for a ``checkout`` response.
+    """
+
+    def __init__(self, response, config=None):
+        self.response = response
+        self.status_code = response.status_code
+        self.content = response.content
+        self.codec = get_codec(config.JSON_CODEC if config is not None else None)
+        self.metrics = config.METRICS if config is not None else None
+        self._data = None
+
+    def json(self):
+        if self._data is None:
+            metrics = self.metrics
+            if metrics is not None and metrics.enabled:
+                self._data = timed_parse(
+                    metrics, type(self).__name__, self.codec.loads, self.content
+                )
+            else:
+                self._data = self.codec.loads(self.content)
+        return self._data
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def errors(self):
+        try:
+            data = self.json()
+        except ValueError:
+            return None
+        if isinstance(data, dict):
+            return data.get("error_messages", None)
+        return None
+
+    def get(self, key, default=None):
+        return self.json().get(key, default)
+
+    def __getitem__(self, key):
+        return self.json()[key]
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__["response"], name)
+
+    def __repr__(self):
+        return "<PagSeguroJSONResponse [%s]>" % self.status_code
 
 
 class PagSeguroCheckoutResponse:
     def __init__(self, response, config=None):
+        if isinstance(response, (bytes, str)):
+            codec = get_codec(config.JSON_CODEC if config is not None else None)
+            metrics = config.METRICS if config is not None else None
+            if metrics is not None and metrics.enabled:
+                response = timed_parse(
+                    metrics, type(self).__name__, codec.loads, response
+                )
+            else:
+                response = codec.loads(response)
         self.id = None
         self.date = None
         self.payment_url = None
@@ -131,18 +386,26 @@ class PagSeguroTransactionSearchResult(XMLParser):
     results_in_page = None
     transactions = []
 
+    record_path = ("transactionSearchResult", "transactions", "transaction")
+    records_attr = "transactions"
+    lazy_record_class = Transaction
+
     def __getitem__(self, key):
         getattr(self, key, None)
 
     def parse_xml(self, xml):
+        if self.streaming:
+            self.transactions = []
         parsed = super(PagSeguroTransactionSearchResult, self).parse_xml(xml)
         if self.errors:
             return
         search_result = parsed.get("transactionSearchResult", {})
-        self.transactions = search_result.get("transactions", {})
-        self.transactions = self.transactions.get("transaction", [])
-        if not isinstance(self.transactions, list):
-            self.transactions = [self.transactions]
+        if not self.streaming:
+            self.transactions = search_result.get("transactions", {})
+            self.transactions = self.transactions.get("transaction", [])
+            if not isinstance(self.transactions, list):
+                self.transactions = [self.transactions]
+            self.transactions = self.to_records(self.transactions)
         self.current_page = search_result.get("currentPage", None)
         if self.current_page is not None:
             self.current_page = int(self.current_page)
@@ -152,9 +415,11 @@ class PagSeguroTransactionSearchResult(XMLParser):
         self.total_pages = search_result.get("totalPages", None)
         if self.total_pages is not None:
             self.total_pages = int(self.total_pages)
+        self.save_transactions(self.transactions)
 
 
 class PagSeguroPreApproval(XMLParser):
+    date = lazy_field("date", parse_date)
 
     def __getitem__(self, key):
         getattr(self, key, None)
@@ -166,7 +431,10 @@ class PagSeguroPreApproval(XMLParser):
         result = parsed.get("preApproval", {})
         self.name = result.get("name", None)
         self.code = result.get("code", None)
-        self.date = parse_date(result.get("date"))
+        if self.lazy:
+            self.raw_fields = result
+        else:
+            self.date = parse_date(result.get("date"))
         self.tracker = result.get("tracker", None)
         self.status = result.get("status", None)
         self.reference = result.get("reference", None)
@@ -182,18 +450,26 @@ class PagSeguroPreApprovalSearch(XMLParser):
     results_in_page = None
     pre_approvals = []
 
+    record_path = ("preApprovalSearchResult", "preApprovals", "preApproval")
+    records_attr = "pre_approvals"
+    lazy_record_class = PreApproval
+
     def __getitem__(self, key):
         getattr(self, key, None)
 
     def parse_xml(self, xml):
+        if self.streaming:
+            self.pre_approvals = []
         parsed = super(PagSeguroPreApprovalSearch, self).parse_xml(xml)
         if self.errors:
             return
         search_result = parsed.get("preApprovalSearchResult", {})
-        self.pre_approvals = search_result.get("preApprovals", {})
-        self.pre_approvals = self.pre_approvals.get("preApproval", [])
-        if not isinstance(self.pre_approvals, list):
-            self.pre_approvals = [self.pre_approvals]
+        if not self.streaming:
+            self.pre_approvals = search_result.get("preApprovals", {})
+            self.pre_approvals = self.pre_approvals.get("preApproval", [])
+            if not isinstance(self.pre_approvals, list):
+                self.pre_approvals = [self.pre_approvals]
+            self.pre_approvals = self.to_records(self.pre_approvals)
         self.current_page = search_result.get("currentPage", None)
         if self.current_page is not None:
             self.current_page = int(self.current_page)
@@ -0,0 +1,218 @@
+# coding: utf-8
+from .codec import get_codec
+from .config import Config
+from .exceptions import PagSeguroValidationError
+from .utils import is_valid_email, sender_tax_id, clean_params
+
+
+def payment_method_type(method):
+    if isinstance(method, dict):
+        return method.get("type")
+    return method
+
+
+class CheckoutTemplate(object):
+    """Precompiled checkout payload for one merchant configuration
+
+    Everything that does not change between orders (config flags, the
+    reference prefix, redirect/notification urls, extra amount and any base
+    ``data``) is computed, cleaned and serialized once. ``build`` and
+    ``render`` then only fill the per-order customer, shipping, items and
+    charges.
+    """
+
+    def __init__(
+        self,
+        config=None,
+        redirect_url=None,
+        notification_url=None,
+        abandon_url=None,
+        extra_amount=None,
+        data=None,
+    ):
+        if config is None:
+            config = Config()
+        self.use_shipping = config.USE_SHIPPING
+        self.reference_prefix = config.REFERENCE_PREFIX or "%s"
+        self.dumps = get_codec(config.JSON_CODEC).dumps
+
+        static_fields = {}
+        if extra_amount:
+            static_fields["extraAmount"] = extra_amount
+        if redirect_url:
+            static_fields["redirectURL"] = redirect_url
+        if notification_url:
+            static_fields["notification_urls"] = [notification_url]
+        if abandon_url:
+            static_fields["notifcation_urls"] = [abandon_url]
+        self.static_fields = static_fields
+
+        self.base_data = dict(data or {})
+        base = dict(self.base_data)
+        base.update(static_fields)
+        self.base = clean_params(base)
+        self.base_json = self.dumps(self.base)
+
+    @classmethod
+    def from_client(cls, pagseguro, data=None):
+        """compile the static settings of a PagSeguro instance"""
+        return cls(
+            pagseguro.config,
+            redirect_url=pagseguro.redirect_url,
+            notification_url=pagseguro.notification_url,
+            abandon_url=pagseguro.abandon_url,
+            extra_amount=pagseguro.extra_amount,
+            data=data,
+        )
+
+    def fill(self, sender=None, shipping=None, items=None, payment=None, reference=""):
+        """per-order params, not cleaned"""
+        params = {}
+        reference = self.reference_prefix % (reference if reference is not None else "")
+        if reference:
+            params["reference_id"] = reference
+
+        if sender:
+            params["customer"] = {
+                "name": sender.get("name"),
+                "email": is_valid_email(sender.get("email")),
+                "tax_id": sender_tax_id(sender),
+                "phones": [
+                    {
+                        "type": "MOBILE",
+                        "country": "55",
+                        "area": sender.get("area_code"),
+                        "number": sender.get("phone"),
+                    }
+                ],
+            }
+
+        if self.use_shipping and shipping:
+            params["shipping"] = {
+                "address": {
+                    "shippingType": shipping.get("type"),
+                    "street": shipping.get("street"),
+                    "number": shipping.get("number"),
+                    "complement": shipping.get("complement", ""),
+                    "locality": shipping.get("district"),
+                    "city": shipping.get("city"),
+                    "region_code": shipping.get("state"),
+                    "country": shipping.get("country", "BRA"),
+                    "postal_code": shipping.get("postal_code"),
+                }
+            }
+
+        if items:
+            params["items"] = [
+                {
+                    "reference_id": item.get("id"),
+                    "name": item.get("name"),
+                    "quantity": item.get("quantity"),
+                    "unit_amount": item.get("amount"),
+                }
+                for item in items
+            ]
+
+        if payment:
+            method = payment.get("method")
+            if payment_method_type(method) == "BOLETO":
+                method = dict(method) if isinstance(method, dict) else {"type": method}
+                method["holder"] = {
+                    "name": (sender or {}).get("name"),
+                    "tax_id": sender_tax_id(sender or {}),
+                    "email": (sender or {}).get("email"),
+                    "address": params.get("shipping", {}).get("address"),
+                }
+            params["charges"] = [
+                {
+                    "amount": payment.get("amount"),
+                    "payment_method": method,
+                    "recurring": payment.get("recurring", None),
+                }
+            ]
+        return params
+
+    def build(
+        self,
+        sender=None,
+        shipping=None,
+        items=None,
+        payment=None,
+        reference="",
+        **kwargs,
+    ):
+        """the full, cleaned order dict"""
+        if kwargs:
+            params = dict(self.base_data)
+            params.update(kwargs)
+            params.update(self.static_fields)
+        else:
+            params = dict(self.base)
+        params.update(self.fill(sender, shipping, items, payment, reference))
+        return clean_params(params)
+
+    def render(
+        self,
+        sender=None,
+        shipping=None,
+        items=None,
+        payment=None,
+        reference="",
+        **kwargs,
+    ):
+        """the full order serialized to JSON bytes"""
+        order = clean_params(self.fill(sender, shipping, items, payment, reference))
+        if kwargs or not self.base or any(key in self.base for key in order):
+            return self.dumps(
+                self.build(sender, shipping, items, payment, reference, **kwargs)
+            )
+        if not order:
+            return self.base_json
+        # splice the per-order object with the pre-serialized static one
+        return self.dumps(order)[:-1] + b"," + self.base_json[1:]
+
+
+def build_subscription_payload(order, subscription, plan=None, customer=None, **kwargs):
+    """subscription params from a built checkout ``order`` dict
+
+    ``plan`` and ``customer`` are the already resolved lookups for
+    ``plan_reference_id`` and ``customer_reference_id``, if any. A lookup
+    that found nothing raises PagSeguroValidationError.
+    """
+    params = dict(kwargs)
+    if plan is not None:
+        params["plan"] = {"id": plan["id"]}
+    elif subscription.get("plan_reference_id", None):
+        raise PagSeguroValidationError(
+            u"Plano com reference_id %r não encontrado"
+            % subscription["plan_reference_id"]
+        )
+    else:
+        params["plan"] = {"id": subscription["plan_id"]}
+
+    card = order["charges"][0]["payment_method"]["card"]
+    if subscription.get("customer_id", None):
+        params["customer"] = {"id": subscription["customer_id"]}
+    elif customer is not None:
+        params["customer"] = customer
+    elif subscription.get("customer_reference_id", None) and subscription.get(
+        "search_by_reference_id", False
+    ):
+        raise PagSeguroValidationError(
+            u"Assinante com reference_id %r não encontrado"
+            % subscription["customer_reference_id"]
+        )
+    else:
+        params["customer"] = dict(order["customer"])
+        params["customer"]["reference_id"] = subscription.get(
+            "customer_reference_id", None
+        )
+        params["customer"]["billing_info"] = [{"card": card, "type": "CREDIT_CARD"}]
+    params["payment_method"] = [
+        {"type": "CREDIT_CARD", "card": {"security_code": card["security_code"]}}
+    ]
+
+    params["amount"] = order["charges"][0]["amount"]
+    params["best_invoice_date"] = subscription.get("best_invoice_date", {})
+    params["reference_id"] = subscription["reference_id"]
+    return clean_params(params)
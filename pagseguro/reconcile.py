@@ -0,0 +1,361 @@
+# coding: utf-8
+"""Reconcile local orders against PagSeguro transactions
+
+``Reconciler.run`` hash-joins an iterable of local orders (dicts, tuples
+from a DB cursor...) with an iterable of transactions (e.g.
+``pg.iter_transactions``) on the order reference and yields a
+``Discrepancy`` for each order without transaction (``missing``),
+transaction without order (``extra``), and pair whose amount (``amount``)
+or status (``status``) differ::
+
+    reconciler = Reconciler(pg.config, order_reference=0, order_amount=1,
+                            order_status=2, status_map={3: "paid"})
+    cursor.execute("SELECT reference, total_cents, status FROM orders")
+    for discrepancy in reconciler.run(cursor, pg.iter_transactions(start, end)):
+        report(discrepancy)
+
+Orders are hashed in memory up to ``memory_rows``. Past that both sides
+are partitioned by reference into temporary files and joined a partition
+at a time, so tens of millions of rows need bounded memory.
+"""
+import itertools
+import os
+import pickle
+import tempfile
+from collections import Counter, namedtuple
+from collections.abc import Mapping
+from decimal import Decimal
+from operator import itemgetter
+
+from .config import Config
+from .utils import parse_amount
+
+
+class Discrepancy(
+    namedtuple("Discrepancy", "kind reference order transaction expected actual")
+):
+    """one reconciliation finding
+
+    ``kind`` is ``missing``, ``extra``, ``amount`` or ``status``. For the
+    last two ``expected`` holds the order value and ``actual`` the
+    transaction value.
+    """
+
+    __slots__ = ()
+
+    def __new__(
+        cls, kind, reference, order=None, transaction=None, expected=None, actual=None
+    ):
+        return super(Discrepancy, cls).__new__(
+            cls, kind, reference, order, transaction, expected, actual
+        )
+
+
+def getter(spec):
+    """row accessor for a key/index (``itemgetter``), a callable or None"""
+    if spec is None or callable(spec):
+        return spec
+    return itemgetter(spec)
+
+
+def cents(value):
+    """integer cents of an int (already cents), Decimal, float or str amount"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, (Decimal, float)):
+        value = str(value)
+    return parse_amount(value)
+
+
+def transaction_fields(transaction):
+    """(reference, amount in cents, status) of a transaction dict or record"""
+    amount = getattr(transaction, "gross_amount_cents", None)
+    status = getattr(transaction, "status", None)
+    if isinstance(transaction, Mapping):
+        if amount is None:
+            amount = cents(transaction.get("grossAmount"))
+        if status is None:
+            status = transaction.get("status")
+    if status is not None and status != "":
+        status = int(status)
+    return transaction.get("reference"), amount, status
+
+
+def _dump(rows, path):
+    with open(path, "ab") as f:
+        pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+        for row in rows:
+            pickler.dump(row)
+            # the memo would keep every row alive
+            pickler.clear_memo()
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        unpickler = pickle.Unpickler(f)
+        while True:
+            try:
+                yield unpickler.load()
+            except EOFError:
+                return
+
+
+class Reconciler(object):
+    """Hash join of local orders and PagSeguro transactions, see module doc
+
+    ``order_reference``, ``order_amount`` and ``order_status`` pick the
+    order fields: a dict key, a tuple index or a callable. Amounts are
+    integer cents (or Decimal/str reais). ``status_map`` translates the
+    PagSeguro status codes to the local ones before comparing, statuses
+    are not compared when ``order_status`` is False. Transaction references
+    have ``Config.REFERENCE_PREFIX`` removed, rows without reference never
+    match.
+    """
+
+    order_reference = "reference_id"
+    order_amount = "amount"
+    order_status = "status"
+    # orders held in memory before spilling to disk, and partitions per pass
+    memory_rows = 1000000
+    partitions = 64
+    max_depth = 3
+    # rows buffered per partition file write
+    buffer_rows = 1024
+
+    def __init__(
+        self,
+        config=None,
+        order_reference=None,
+        order_amount=None,
+        order_status=None,
+        status_map=None,
+        memory_rows=None,
+        tmpdir=None,
+    ):
+        if config is None:
+            config = Config()
+        prefix = config.REFERENCE_PREFIX or "%s"
+        self.prefix, _, self.suffix = prefix.partition("%s")
+        if order_reference is None:
+            order_reference = self.order_reference
+        if order_amount is None:
+            order_amount = self.order_amount
+        if order_status is None:
+            order_status = self.order_status
+        self.reference = getter(order_reference)
+        self.amount = getter(order_amount)
+        self.status = getter(order_status) if order_status is not False else None
+        self.status_map = status_map
+        if memory_rows is not None:
+            self.memory_rows = memory_rows
+        self.tmpdir = tmpdir
+        self.counts = Counter()
+        self._table = None
+        self._tmp = None
+
+    def strip_reference(self, reference):
+        """local reference of a PagSeguro one (without REFERENCE_PREFIX)"""
+        if reference is None:
+            return None
+        reference = str(reference)
+        if self.prefix and reference.startswith(self.prefix):
+            reference = reference[len(self.prefix) :]
+        if self.suffix and reference.endswith(self.suffix):
+            reference = reference[: -len(self.suffix)]
+        return reference
+
+    def _orders(self, orders):
+        for order in orders:
+            reference = self.reference(order)
+            status = self.status(order) if self.status is not None else None
+            self.counts["orders"] += 1
+            yield (
+                str(reference) if reference is not None else None,
+                cents(self.amount(order)),
+                status,
+                order,
+            )
+
+    def _transactions(self, transactions):
+        for transaction in transactions:
+            reference, amount, status = transaction_fields(transaction)
+            if self.status_map is not None:
+                status = self.status_map.get(status, status)
+            self.counts["transactions"] += 1
+            yield self.strip_reference(reference), amount, status, transaction
+
+    def run(self, orders, transactions):
+        """yield the Discrepancies, filling ``counts`` as it goes"""
+        self.begin(orders)
+        try:
+            for discrepancy in self.feed(transactions):
+                yield discrepancy
+            for discrepancy in self.end():
+                yield discrepancy
+        finally:
+            self.close()
+
+    def begin(self, orders):
+        """hash (or partition to disk) ``orders``, the first step of ``run``
+
+        ``feed`` the transactions in as many batches as needed, then
+        ``end`` yields what is left, e.g. for transactions read with
+        ``async for``.
+        """
+        self.close()
+        self.counts = Counter()
+        orders = self._orders(orders)
+        self._table, read = self._build(orders, self.memory_rows)
+        if self._table is None:
+            self.counts["spilled"] = 1
+            self._tmp = tempfile.TemporaryDirectory(
+                prefix="pagseguro-reconcile-", dir=self.tmpdir
+            )
+            orders = itertools.chain(read, orders)
+            del read
+            self._partition(orders, self._tmp.name, "orders", 0)
+
+    def feed(self, transactions):
+        """yield the Discrepancies found so far for ``transactions``"""
+        transactions = self._transactions(transactions)
+        if self._table is not None:
+            for discrepancy in self._probe(self._table, transactions):
+                yield discrepancy
+        else:
+            self._partition(transactions, self._tmp.name, "transactions", 0)
+
+    def end(self):
+        """yield the remaining Discrepancies, orders without transaction..."""
+        try:
+            if self._table is not None:
+                for discrepancy in self._missing(self._table):
+                    yield discrepancy
+            else:
+                for discrepancy in self._join(self._tmp.name, 0):
+                    yield discrepancy
+        finally:
+            self.close()
+
+    def close(self):
+        """drop the state of an unfinished run and its temporary files"""
+        self._table = None
+        if self._tmp is not None:
+            self._tmp.cleanup()
+            self._tmp = None
+
+    def _build(self, orders, limit):
+        """(hash table, None), or (None, rows read) once past ``limit`` rows"""
+        table = {}
+        rows = 0
+        for row in orders:
+            table.setdefault(row[0], []).append([row, False])
+            rows += 1
+            if rows > limit:
+                return None, [
+                    entry[0] for entries in table.values() for entry in entries
+                ]
+        return table, None
+
+    def _probe(self, table, transactions):
+        for row in transactions:
+            reference, amount, status, transaction = row
+            entries = table.get(reference) if reference is not None else None
+            if entries is None:
+                self.counts["extra"] += 1
+                yield Discrepancy("extra", reference, transaction=transaction)
+                continue
+            for entry in entries:
+                entry[1] = True
+                for discrepancy in self._compare(entry[0], row):
+                    yield discrepancy
+
+    def _missing(self, table):
+        for reference, entries in table.items():
+            for order_row, matched in entries:
+                if not matched:
+                    self.counts["missing"] += 1
+                    yield Discrepancy("missing", reference, order=order_row[3])
+
+    def _compare(self, order_row, transaction_row):
+        reference, amount, status, order = order_row
+        found = False
+        if amount != transaction_row[1]:
+            found = True
+            self.counts["amount"] += 1
+            yield Discrepancy(
+                "amount",
+                reference,
+                order,
+                transaction_row[3],
+                amount,
+                transaction_row[1],
+            )
+        if self.status is not None and str(status) != str(transaction_row[2]):
+            found = True
+            self.counts["status"] += 1
+            yield Discrepancy(
+                "status",
+                reference,
+                order,
+                transaction_row[3],
+                status,
+                transaction_row[2],
+            )
+        if not found:
+            self.counts["matched"] += 1
+
+    def _partition(self, rows, directory, side, depth):
+        """spread ``rows`` over the partition files of ``side``"""
+        buffers = [[] for _ in range(self.partitions)]
+        for row in rows:
+            index = hash((depth, row[0])) % self.partitions
+            buffers[index].append(row)
+            if len(buffers[index]) >= self.buffer_rows:
+                _dump(buffers[index], self._path(directory, side, index))
+                buffers[index] = []
+        for index, rows in enumerate(buffers):
+            if rows:
+                _dump(rows, self._path(directory, side, index))
+
+    @staticmethod
+    def _path(directory, side, index):
+        return os.path.join(directory, "%s-%03d" % (side, index))
+
+    def _partitioned(self, orders, transactions, directory, depth):
+        self._partition(orders, directory, "orders", depth)
+        self._partition(transactions, directory, "transactions", depth)
+        return self._join(directory, depth)
+
+    def _join(self, directory, depth):
+        for index in range(self.partitions):
+            order_path = self._path(directory, "orders", index)
+            transaction_path = self._path(directory, "transactions", index)
+            # a partition still too large (skewed references) is split
+            # again with another hash, up to max_depth
+            limit = self.memory_rows if depth < self.max_depth else float("inf")
+            orders = _load(order_path)
+            table, read = self._build(orders, limit)
+            if table is None:
+                nested = os.path.join(directory, "%03d" % index)
+                os.mkdir(nested)
+                results = self._partitioned(
+                    itertools.chain(read, orders),
+                    _load(transaction_path),
+                    nested,
+                    depth + 1,
+                )
+                del read
+            else:
+                results = itertools.chain(
+                    self._probe(table, _load(transaction_path)), self._missing(table)
+                )
+            for discrepancy in results:
+                yield discrepancy
+            del table
+            for path in (order_path, transaction_path):
+                if os.path.exists(path):
+                    os.remove(path)
@@ -0,0 +1,107 @@
+# coding: utf-8
+"""Date range sharding for long searches
+
+``query_transactions(..., window=timedelta(days=1))`` (or
+``Config.QUERY_WINDOW``) cuts the range into consecutive windows searched
+concurrently instead of paging through a single huge result. Each new
+window is sized from the page density observed so far to hold about
+``Config.QUERY_WINDOW_PAGES`` pages, and the merged results are deduped by
+``code`` and sorted by ``date``.
+"""
+import datetime
+from collections.abc import Mapping
+
+from .utils import parse_date
+
+MINUTE = datetime.timedelta(minutes=1)
+
+
+def whole_minutes(delta):
+    """``delta`` rounded to whole minutes, at least one
+
+    Search dates are sent with minute precision, so windows are too.
+    """
+    return max(MINUTE, MINUTE * round(delta / MINUTE))
+
+
+class WindowPlanner(object):
+    """Cuts [initial_date, final_date] into windows of adaptive size
+
+    ``observe`` the page count of each searched window and the following
+    windows are resized to hold about ``target_pages`` pages, changing by at
+    most ``growth`` times at once. Consecutive windows share their boundary
+    minute, so a transaction there can come back twice (see merge_records).
+    """
+
+    growth = 4
+
+    def __init__(
+        self,
+        initial_date,
+        final_date,
+        window,
+        target_pages=10,
+        min_window=MINUTE,
+        max_window=None,
+    ):
+        self.cursor = initial_date
+        self.final_date = final_date
+        self.target_pages = target_pages
+        self.min_window = whole_minutes(min_window)
+        self.max_window = max_window or max(final_date - initial_date, MINUTE)
+        self.window = self._clamp(window)
+
+    def _clamp(self, window):
+        return whole_minutes(min(max(window, self.min_window), self.max_window))
+
+    def next_window(self):
+        """the next (start, end) to search, None once the range is covered"""
+        if self.cursor >= self.final_date:
+            return None
+        start = self.cursor
+        end = min(start + self.window, self.final_date)
+        self.cursor = end
+        return start, end
+
+    def observe(self, start, end, total_pages):
+        """resize the next windows after [start, end] had ``total_pages``"""
+        duration = max(end - start, MINUTE)
+        if not total_pages:
+            size = duration * self.growth
+        else:
+            size = duration * self.target_pages / total_pages
+        size = min(max(size, self.window / self.growth), self.window * self.growth)
+        self.window = self._clamp(size)
+
+
+def _timestamp(record, key, attr):
+    value = getattr(record, attr, None)
+    if value is None and isinstance(record, Mapping):
+        value = record.get(key)
+    if isinstance(value, str):
+        value = parse_date(value)
+    return value.timestamp() if value is not None else float("-inf")
+
+
+def merge_records(batches):
+    """records of ``batches`` deduped by ``code`` and sorted by ``date``
+
+    When a code repeats the record with the latest ``lastEventDate`` is
+    kept. Records without a date keep their position relative to each
+    other, ahead of the dated ones.
+    """
+    merged = {}
+    for records in batches:
+        for record in records:
+            code = record.get("code")
+            if code is None:
+                merged[id(record)] = record
+                continue
+            current = merged.get(code)
+            if current is None or _timestamp(
+                record, "lastEventDate", "last_event_date"
+            ) > _timestamp(current, "lastEventDate", "last_event_date"):
+                merged[code] = record
+    return sorted(
+        merged.values(), key=lambda record: _timestamp(record, "date", "date")
+    )
@@ -0,0 +1,237 @@
+# coding: utf-8
+"""Local SQLite copy of PagSeguro transactions
+
+A ``TransactionStore`` set as ``Config.TRANSACTION_STORE`` receives every
+transaction parsed from searches and notifications, so support tools and
+reconciliation jobs can look them up locally instead of calling
+``check_transaction`` or re-running ``query_transactions``::
+
+    store = TransactionStore("transactions.db")
+    pg = PagSeguro(token=token, config={"TRANSACTION_STORE": store})
+    pg.query_transactions(initial_date, final_date)
+    store.get(code), store.find(reference="REF1234", status=3)
+
+Rows are indexed by code, reference, status and last event date. A newer
+``lastEventDate`` replaces the stored row and an older one is ignored, so
+pages and notifications can be written in any order.
+"""
+import sqlite3
+import threading
+from collections.abc import Mapping
+from datetime import timezone
+
+from .codec import dumps, loads
+from .utils import parse_amount, parse_date
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    code TEXT PRIMARY KEY,
+    reference TEXT,
+    status INTEGER,
+    type INTEGER,
+    date INTEGER,
+    last_event_date INTEGER,
+    gross_amount INTEGER,
+    fee_amount INTEGER,
+    net_amount INTEGER,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_reference ON transactions (reference);
+CREATE INDEX IF NOT EXISTS transactions_status
+    ON transactions (status, last_event_date);
+CREATE INDEX IF NOT EXISTS transactions_last_event_date
+    ON transactions (last_event_date);
+"""
+
+COLUMNS = (
+    "code",
+    "reference",
+    "status",
+    "type",
+    "date",
+    "last_event_date",
+    "gross_amount",
+    "fee_amount",
+    "net_amount",
+    "data",
+)
+
+UPSERT = """
+INSERT INTO transactions (%s) VALUES (%s)
+ON CONFLICT (code) DO UPDATE SET %s
+WHERE excluded.last_event_date IS NULL
+    OR transactions.last_event_date IS NULL
+    OR excluded.last_event_date >= transactions.last_event_date
+""" % (
+    ", ".join(COLUMNS),
+    ", ".join("?" * len(COLUMNS)),
+    ", ".join("%s = excluded.%s" % (c, c) for c in COLUMNS[1:]),
+)
+
+
+def timestamp(value):
+    """datetime (or PagSeguro date string) as UTC epoch microseconds"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = parse_date(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000000)
+
+
+def _int(value):
+    return int(value) if value not in (None, "") else None
+
+
+def _amount(value):
+    return parse_amount(value) if value not in (None, "") else None
+
+
+def plain(value):
+    """records (and nested records) as plain dicts"""
+    if isinstance(value, Mapping):
+        return {key: plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [plain(item) for item in value]
+    return value
+
+
+def row(transaction):
+    """column values for a transaction dict or Transaction record"""
+    data = plain(transaction)
+    return (
+        data["code"],
+        data.get("reference"),
+        _int(data.get("status")),
+        _int(data.get("type")),
+        timestamp(data.get("date")),
+        timestamp(data.get("lastEventDate")),
+        _amount(data.get("grossAmount")),
+        _amount(data.get("feeAmount")),
+        _amount(data.get("netAmount")),
+        dumps(data),
+    )
+
+
+class TransactionStore(object):
+    """SQLite backed transactions, indexed by code/reference/status/date
+
+    Lookups return the transaction dicts as PagSeguro sent them, or
+    ``record_class`` instances when a subclass sets it (e.g.
+    ``pagseguro.models.Transaction``). One connection is shared by all
+    threads behind a lock.
+    """
+
+    record_class = None
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        if path != ":memory:":
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def _decode(self, data):
+        data = loads(data)
+        if self.record_class is not None:
+            return self.record_class.from_dict(data)
+        return data
+
+    def upsert(self, transactions):
+        """write ``transactions`` in a single SQLite transaction"""
+        rows = [row(transaction) for transaction in transactions]
+        if not rows:
+            return 0
+        with self._lock:
+            self.connection.execute("BEGIN")
+            try:
+                self.connection.executemany(UPSERT, rows)
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+        return len(rows)
+
+    def get(self, code, default=None):
+        with self._lock:
+            found = self.connection.execute(
+                "SELECT data FROM transactions WHERE code = ?", (code,)
+            ).fetchone()
+        return self._decode(found[0]) if found is not None else default
+
+    def find(self, reference=None, status=None, since=None, until=None, limit=None):
+        """transactions matching every given filter, by last event date
+
+        ``since``/``until`` bound ``lastEventDate`` (inclusive/exclusive).
+        """
+        found = self._select("data", reference, status, since, until, limit)
+        return [self._decode(data) for data, in found]
+
+    def codes(self, reference=None, status=None, since=None, until=None):
+        """set of the codes ``find`` would return"""
+        found = self._select("code", reference, status, since, until)
+        return set(code for code, in found)
+
+    def _select(self, column, reference, status, since, until, limit=None):
+        where, args = [], []
+        if reference is not None:
+            where.append("reference = ?")
+            args.append(reference)
+        if status is not None:
+            where.append("status = ?")
+            args.append(int(status))
+        if since is not None:
+            where.append("last_event_date >= ?")
+            args.append(timestamp(since))
+        if until is not None:
+            where.append("last_event_date < ?")
+            args.append(timestamp(until))
+        sql = "SELECT %s FROM transactions" % column
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY last_event_date, code"
+        if limit is not None:
+            sql += " LIMIT %d" % int(limit)
+        with self._lock:
+            return self.connection.execute(sql, args).fetchall()
+
+    def last_event_date(self):
+        """latest ``lastEventDate`` stored, as UTC epoch microseconds"""
+        with self._lock:
+            return self.connection.execute(
+                "SELECT MAX(last_event_date) FROM transactions"
+            ).fetchone()[0]
+
+    def delete(self, code):
+        with self._lock:
+            self.connection.execute("DELETE FROM transactions WHERE code = ?", (code,))
+
+    def __len__(self):
+        with self._lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM transactions"
+            ).fetchone()[0]
+
+    def __contains__(self, code):
+        with self._lock:
+            return (
+                self.connection.execute(
+                    "SELECT 1 FROM transactions WHERE code = ?", (code,)
+                ).fetchone()
+                is not None
+            )
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,278 @@
+# coding: utf-8
+"""Incremental transaction sync
+
+Instead of searching the whole reconciliation window on every run,
+``TransactionSync`` searches from where the previous run stopped and yields
+only the transactions whose ``lastEventDate`` changed since it delivered
+them::
+
+    sync = TransactionSync(pg, FileCheckpointStore("transactions.sync"),
+                           start=datetime(2024, 1, 1))
+    for transaction in sync:
+        save(transaction)
+
+The checkpoint is saved after each page is delivered, so a run that dies
+mid-pagination resumes at the first page it had not finished instead of
+starting over. The page being delivered when it died is fetched again, so
+handlers should be idempotent (upserts by ``code``).
+
+``AsyncPagSeguro.sync_transactions`` returns an ``AsyncTransactionSync``,
+iterated with ``async for``.
+"""
+import datetime
+import os
+from collections import namedtuple
+
+from .codec import dumps, loads
+from .exceptions import PagSeguroPageError
+from .utils import next_page, parse_date
+
+DEFAULT_OVERLAP = datetime.timedelta(minutes=10)
+
+
+def _aware(value):
+    return value if value.tzinfo is not None else value.astimezone()
+
+
+def _format(value):
+    return value.isoformat() if value is not None else None
+
+
+def _parse(value):
+    return datetime.datetime.fromisoformat(value) if value is not None else None
+
+
+def last_event_date(record):
+    """``lastEventDate`` of a search result record or dict, as a datetime"""
+    value = getattr(record, "last_event_date", None)
+    if value is None and hasattr(record, "get"):
+        value = record.get("lastEventDate")
+    if isinstance(value, str):
+        value = parse_date(value)
+    return value
+
+
+class SyncCheckpoint(
+    namedtuple("SyncCheckpoint", "since until page watermark seen")
+):
+    """Where an incremental sync stopped
+
+    ``since`` is the start of the next (or current) search window and
+    ``until`` the end of the run in progress, None between runs. ``page``
+    counts the pages of that run already delivered. ``watermark`` is the
+    latest ``lastEventDate`` delivered so far and ``seen`` maps the codes
+    delivered inside the window to their ``lastEventDate``, so the overlap
+    between runs is not delivered twice.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, since, until=None, page=0, watermark=None, seen=None):
+        return super(SyncCheckpoint, cls).__new__(
+            cls, since, until, page, watermark, dict(seen or {})
+        )
+
+    @property
+    def running(self):
+        return self.until is not None
+
+    def as_dict(self):
+        return {
+            "since": _format(self.since),
+            "until": _format(self.until),
+            "page": self.page,
+            "watermark": _format(self.watermark),
+            "seen": {code: _format(date) for code, date in self.seen.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            _parse(data["since"]),
+            _parse(data.get("until")),
+            data.get("page", 0),
+            _parse(data.get("watermark")),
+            {code: _parse(date) for code, date in data.get("seen", {}).items()},
+        )
+
+
+class MemoryCheckpointStore(object):
+    """keeps the checkpoint in memory, for tests and one-off scripts"""
+
+    def __init__(self, checkpoint=None):
+        self.checkpoint = checkpoint
+
+    def load(self):
+        return self.checkpoint
+
+    def save(self, checkpoint):
+        self.checkpoint = checkpoint._replace(seen=dict(checkpoint.seen))
+
+
+class FileCheckpointStore(object):
+    """JSON checkpoint file, replaced atomically on each save"""
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                return SyncCheckpoint.from_dict(loads(f.read()))
+        except FileNotFoundError:
+            return None
+
+    def save(self, checkpoint):
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(dumps(checkpoint.as_dict()))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+class TransactionSync(object):
+    """Search only what changed since the previous run, see the module doc
+
+    ``start`` is where the first run begins, later runs start ``overlap``
+    before the end of the previous one so changes PagSeguro indexes late
+    are still found. Windows end at ``clock()`` (``datetime.now`` by
+    default, dates are sent as in ``query_transactions``).
+    """
+
+    consume = "_consume_query_transactions"
+    records_attr = "transactions"
+
+    def __init__(
+        self,
+        client,
+        store,
+        start=None,
+        overlap=DEFAULT_OVERLAP,
+        max_results=None,
+        clock=datetime.datetime.now,
+    ):
+        if isinstance(store, (str, os.PathLike)):
+            store = FileCheckpointStore(store)
+        self.client = client
+        self.store = store
+        self.start = start
+        self.overlap = overlap
+        self.max_results = max_results
+        self.clock = clock
+
+    def checkpoint(self):
+        checkpoint = self.store.load()
+        if checkpoint is None:
+            if self.start is None:
+                raise ValueError("no checkpoint saved yet, a start date is needed")
+            checkpoint = SyncCheckpoint(self.start)
+        return checkpoint
+
+    def run(self):
+        """yield the changed records, saving the checkpoint after each page"""
+        run = _SyncRun(self)
+        consume = getattr(self.client, self.consume)
+        while run.page is not None:
+            search_result = consume(*run.search_args())
+            for record in run.changes(search_result):
+                yield record
+            run.page_done(search_result)
+        run.finish()
+
+    __iter__ = run
+
+
+class _SyncRun(object):
+    """state of one run, shared by TransactionSync and AsyncTransactionSync"""
+
+    def __init__(self, sync):
+        checkpoint = sync.checkpoint()
+        if not checkpoint.running:
+            checkpoint = checkpoint._replace(until=sync.clock(), page=0)
+            sync.store.save(checkpoint)
+        self.sync = sync
+        self.checkpoint = checkpoint
+        self.since = max(checkpoint.until - sync.overlap, checkpoint.since)
+        self.cutoff = _aware(self.since)
+        self.seen = dict(checkpoint.seen)
+        # completed pages are not fetched again, so the checkpoint only
+        # keeps the codes the next window will search again
+        self.recent = {
+            code: changed
+            for code, changed in self.seen.items()
+            if changed is not None and changed >= self.cutoff
+        }
+        self.watermark = checkpoint.watermark
+        self.page = checkpoint.page + 1
+
+    def search_args(self):
+        checkpoint = self.checkpoint
+        return checkpoint.since, checkpoint.until, self.page, self.sync.max_results
+
+    def changes(self, search_result):
+        """the records of ``search_result`` not delivered yet"""
+        if search_result.errors:
+            raise PagSeguroPageError(self.page, search_result.errors)
+        seen = self.seen
+        for record in getattr(search_result, self.sync.records_attr):
+            code = record.get("code")
+            changed = last_event_date(record)
+            if code in seen and seen[code] == changed:
+                continue
+            yield record
+            seen[code] = changed
+            if changed is not None and changed >= self.cutoff:
+                self.recent[code] = changed
+            else:
+                self.recent.pop(code, None)
+            if changed is not None and (
+                self.watermark is None or changed > self.watermark
+            ):
+                self.watermark = changed
+
+    def page_done(self, search_result):
+        self.checkpoint = self.checkpoint._replace(
+            page=self.page, watermark=self.watermark, seen=dict(self.recent)
+        )
+        self.sync.store.save(self.checkpoint)
+        self.page = next_page(search_result)
+
+    def finish(self):
+        self.sync.store.save(
+            SyncCheckpoint(self.since, watermark=self.watermark, seen=self.recent)
+        )
+
+
+class PreApprovalSync(TransactionSync):
+    """TransactionSync over ``query_pre_approvals``"""
+
+    consume = "_consume_query_pre_approvals"
+    records_attr = "pre_approvals"
+
+
+class AsyncTransactionSync(TransactionSync):
+    """TransactionSync for AsyncPagSeguro, iterate it with ``async for``
+
+    The checkpoint store is still called synchronously, once per page.
+    """
+
+    async def run(self):
+        run = _SyncRun(self)
+        consume = getattr(self.client, self.consume)
+        while run.page is not None:
+            search_result = await consume(*run.search_args())
+            for record in run.changes(search_result):
+                yield record
+            run.page_done(search_result)
+        run.finish()
+
+    __iter__ = None
+    __aiter__ = run
+
+
+class AsyncPreApprovalSync(AsyncTransactionSync):
+    """AsyncTransactionSync over ``query_pre_approvals``"""
+
+    consume = PreApprovalSync.consume
+    records_attr = PreApprovalSync.records_attr
@@ -0,0 +1,93 @@
+# coding: utf-8
+import threading
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+class PagSeguroTransport(object):
+    """Pooled keep-alive HTTP transport
+
+    Wraps a single ``requests.Session`` so every call reuses the TCP/TLS
+    connections already opened to the PagSeguro hosts. ``host_pool_sizes``
+    maps a host (``https://api.pagseguro.com``) to its own pool size, every
+    other host uses ``pool_maxsize``. ``requests`` is only imported, and the
+    session built, on first use.
+    """
+
+    def __init__(
+        self, pool_connections=10, pool_maxsize=10, host_pool_sizes=None, timeout=None
+    ):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.host_pool_sizes = dict(host_pool_sizes or {})
+        self.timeout = timeout
+
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._build_session()
+        return self._session
+
+    def _build_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        for scheme in ("https://", "http://"):
+            session.mount(
+                scheme,
+                HTTPAdapter(
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize,
+                ),
+            )
+        for host, size in self.host_pool_sizes.items():
+            session.mount(
+                host.rstrip("/") + "/",
+                HTTPAdapter(pool_connections=1, pool_maxsize=size),
+            )
+        return session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+
+def get_transport(
+    pool_connections=10, pool_maxsize=10, host_pool_sizes=None, timeout=None
+):
+    """return the process wide transport for the given pool settings"""
+    key = (
+        pool_connections,
+        pool_maxsize,
+        tuple(sorted((host_pool_sizes or {}).items())),
+        timeout,
+    )
+    transport = _transports.get(key)
+    if transport is None:
+        with _transports_lock:
+            transport = _transports.get(key)
+            if transport is None:
+                transport = PagSeguroTransport(
+                    pool_connections, pool_maxsize, host_pool_sizes, timeout
+                )
+                _transports[key] = transport
+    return transport
+
+
+def close_transports():
+    """close every shared transport, mostly useful on shutdown and tests"""
+    with _transports_lock:
+        for transport in _transports.values():
+            transport.close()
+        _transports.clear()
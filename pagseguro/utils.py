@@ -1,28 +1,211 @@
 # coding: utf-8
+import functools
+import numbers
 import re
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 
-import arrow
-
+from .cache import LRUCache, MISSING
 from .exceptions import PagSeguroValidationError
 
 
+# "-02:00" -> timezone, PagSeguro only ever sends a handful of offsets
+TZ_OFFSETS = {"": timezone.utc, "Z": timezone.utc, "+00:00": timezone.utc}
+TZ_OFFSETS_SIZE = 64
+
+
+def _tzinfo(offset):
+    tz = TZ_OFFSETS.get(offset)
+    if tz is None:
+        if len(offset) != 6 or offset[0] not in "+-" or offset[3] != ":":
+            raise ValueError("bad utc offset %r" % offset)
+        delta = timedelta(hours=int(offset[1:3]), minutes=int(offset[4:6]))
+        tz = timezone(-delta if offset[0] == "-" else delta)
+        if len(TZ_OFFSETS) < TZ_OFFSETS_SIZE:
+            TZ_OFFSETS[offset] = tz
+    return tz
+
+
+def _parse_timestamp(value):
+    """YYYY-MM-DDTHH:MM:SS[.fff][offset], without offset it is UTC"""
+    if (
+        len(value) < 19
+        or value[4] != "-"
+        or value[7] != "-"
+        or value[10] != "T"
+        or value[13] != ":"
+        or value[16] != ":"
+    ):
+        raise ValueError("not a PagSeguro timestamp %r" % value)
+    end = 19
+    microsecond = 0
+    if len(value) > 19 and value[19] == ".":
+        end = 20
+        while end < len(value) and value[end].isdigit():
+            end += 1
+        if end == 20:
+            raise ValueError("not a PagSeguro timestamp %r" % value)
+        microsecond = int(value[20:end][:6].ljust(6, "0"))
+    return datetime(
+        int(value[0:4]),
+        int(value[5:7]),
+        int(value[8:10]),
+        int(value[11:13]),
+        int(value[14:16]),
+        int(value[17:19]),
+        microsecond,
+        _tzinfo(value[end:]),
+    )
+
+
+def _parse_date_generic(value):
+    import arrow
+
+    return arrow.get(value).datetime
+
+
 def parse_date(date_str):
-    return arrow.get(date_str).datetime
+    """decode a PagSeguro timestamp (2011-02-05T15:46:12.000-02:00)
+
+    Anything but the fixed format PagSeguro sends goes through arrow.
+    """
+    try:
+        return _parse_timestamp(date_str)
+    except (ValueError, TypeError):
+        return _parse_date_generic(date_str)
+
+
+def parse_dates(values):
+    """parse_date over a column of timestamps, None stays None"""
+    parse = _parse_timestamp
+    dates = []
+    append = dates.append
+    for value in values:
+        if value is None:
+            append(None)
+            continue
+        try:
+            append(parse(value))
+        except (ValueError, TypeError):
+            append(_parse_date_generic(value))
+    return dates
+
+
+def format_date(value):
+    """format a datetime the way PagSeguro sends it (2011-02-05T15:46:12.000-02:00)"""
+    offset = value.strftime("%z")
+    if offset:
+        offset = offset[:3] + ":" + offset[3:5]
+    return "%s.%03d%s" % (
+        value.strftime("%Y-%m-%dT%H:%M:%S"),
+        value.microsecond // 1000,
+        offset,
+    )
+
+
+def parse_amount(value):
+    """decode a PagSeguro amount string ("49900.00") to integer cents"""
+    return int((Decimal(value) * 100).to_integral_value())
+
+
+def format_amount(cents):
+    """encode integer cents back to a PagSeguro amount string"""
+    return str(Decimal(cents).scaleb(-2))
+
+
+def first_result(response, key):
+    """first entry of a JSON listing (``plans``, ``customers``...)"""
+    if hasattr(response, "json"):
+        response = response.json()
+    results = response.get(key, [])
+    return results[0] if results else None
+
+
+def next_page(search_result):
+    """page number following ``search_result`` or None on the last one"""
+    current_page = search_result.current_page
+    total_pages = search_result.total_pages
+    if current_page is None or total_pages is None or current_page >= total_pages:
+        return None
+    return current_page + 1
+
+
+def clean_params(params):
+    """drop empty values, keeping booleans"""
+    return {k: v for k, v in params.items() if v or isinstance(v, bool)}
+
+
+def sender_tax_id(sender):
+    """validated sender CNPJ, falling back to the CPF"""
+    return is_valid_cnpj(sender.get("cnpj")) or is_valid_cpf(sender.get("cpf"))
+
+
+def remaining_pages(search_result):
+    """page numbers still to be fetched after ``search_result``"""
+    current_page = search_result.current_page
+    total_pages = search_result.total_pages
+    if current_page is None or total_pages is None:
+        return []
+    return list(range(current_page + 1, total_pages + 1))
+
 
 # Validators
 EMPTY_VALUES = (None, '', [], (), {})
 
 
+EMAIL_USER_REGEX = re.compile(
+    r"(^[-!#$%&'*+/=?^_`{}|~0-9A-Z]+(\.[-!#$%&'*+/=?^_`{}|~0-9A-Z]+)*$"
+    r'|^"([\001-\010\013\014\016-\037!#-\[\]-\177]|\\[\001-\011\013'
+    r"""\014\016-\177])*"$)""", re.IGNORECASE)
+EMAIL_DOMAIN_REGEX = re.compile(
+    r'(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}|'
+    r'[A-Z0-9-]{2,})$|^\[(25[0-5]|2[0-4]\d|[0-1]?\d?\d)(\.(25[0-5]|'
+    r'2[0-4]\d|[0-1]?\d?\d)){3}\]$', re.IGNORECASE)
+EMAIL_DOMAIN_WHITELIST = ['localhost']
+CPF_STRIP_REGEX = re.compile(r"[-.]")
+CNPJ_STRIP_REGEX = re.compile(r"[-/.]")
+
+# Shared by every memoized validator, keyed by (validator name, value)
+VALIDATION_CACHE_SIZE = 4096
+validation_cache = LRUCache(maxsize=VALIDATION_CACHE_SIZE)
+
+
+def memoized_validator(validator):
+    """cache a validator's result, or the validation error it raised"""
+
+    @functools.wraps(validator)
+    def wrapper(value):
+        try:
+            key = (validator.__name__, value)
+            cached = validation_cache.get(key, MISSING)
+        except TypeError:  # unhashable value
+            return validator(value)
+        if cached is not MISSING:
+            valid, result = cached
+            if not valid:
+                raise PagSeguroValidationError(result)
+            return result
+        try:
+            result = validator(value)
+        except PagSeguroValidationError as e:
+            validation_cache.set(key, (False, e.args[0]))
+            raise
+        validation_cache.set(key, (True, result))
+        return result
+
+    return wrapper
+
+
+def validation_cache_info():
+    """hits, misses and size of the shared validation cache"""
+    return validation_cache.info()
+
+
+@memoized_validator
 def is_valid_email(value):
-    user_regex = re.compile(
-        r"(^[-!#$%&'*+/=?^_`{}|~0-9A-Z]+(\.[-!#$%&'*+/=?^_`{}|~0-9A-Z]+)*$"
-        r'|^"([\001-\010\013\014\016-\037!#-\[\]-\177]|\\[\001-\011\013'
-        r"""\014\016-\177])*"$)""", re.IGNORECASE)
-    domain_regex = re.compile(
-        r'(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}|'
-        r'[A-Z0-9-]{2,})$|^\[(25[0-5]|2[0-4]\d|[0-1]?\d?\d)(\.(25[0-5]|'
-        r'2[0-4]\d|[0-1]?\d?\d)){3}\]$', re.IGNORECASE)
-    domain_whitelist = ['localhost']
+    user_regex = EMAIL_USER_REGEX
+    domain_regex = EMAIL_DOMAIN_REGEX
+    domain_whitelist = EMAIL_DOMAIN_WHITELIST
 
     if not value or '@' not in value:
         raise PagSeguroValidationError(u'Email inválido')
@@ -47,26 +230,44 @@ def is_valid_email(value):
     return value
 
 
+CPF_ERROR_MESSAGES = {
+    'invalid': u"CPF Inválido",
+    'max_digits': (u"CPF possui 11 dígitos (somente números) ou 14"
+                   u" (com pontos e hífen)"),
+    'digits_only': (u"Digite um CPF com apenas números ou com ponto e "
+                    u"hífen"),
+}
+
+CNPJ_ERROR_MESSAGES = {
+    'invalid': u"CNPJ Inválido",
+    'max_digits': (u"CNPJ possui 14 dígitos (somente números) ou 14"
+                   u" (com pontos e hífen)"),
+    'digits_only': (
+        u"Digite um CNPJ com apenas números ou com ponto, barra "
+        u"hífen"),
+}
+
+# check digit weights: (first digit, second digit)
+CPF_WEIGHTS = (list(range(10, 1, -1)), list(range(11, 1, -1)))
+CNPJ_WEIGHTS = (list(range(5, 1, -1)) + list(range(9, 1, -1)),
+                list(range(6, 1, -1)) + list(range(9, 1, -1)))
+
+
 def DV_maker(v):
     if v >= 2:
         return 11 - v
     return 0
 
 
+@memoized_validator
 def is_valid_cpf(value):
-    error_messages = {
-        'invalid': u"CPF Inválido",
-        'max_digits': (u"CPF possui 11 dígitos (somente números) ou 14"
-                       u" (com pontos e hífen)"),
-        'digits_only': (u"Digite um CPF com apenas números ou com ponto e "
-                        u"hífen"),
-    }
+    error_messages = CPF_ERROR_MESSAGES
 
     if value in EMPTY_VALUES:
         return u''
     orig_value = value[:]
     if not value.isdigit():
-        value = re.sub("[-\.]", "", value)
+        value = CPF_STRIP_REGEX.sub("", value)
     try:
         int(value)
     except ValueError:
@@ -89,21 +290,15 @@ def is_valid_cpf(value):
     return orig_value
 
 
+@memoized_validator
 def is_valid_cnpj(value):
 
-    error_messages = {
-        'invalid': u"CNPJ Inválido",
-        'max_digits': (u"CNPJ possui 14 dígitos (somente números) ou 14"
-                       u" (com pontos e hífen)"),
-        'digits_only': (
-            u"Digite um CNPJ com apenas números ou com ponto, barra "
-            u"hífen"),
-    }
+    error_messages = CNPJ_ERROR_MESSAGES
 
     if value in EMPTY_VALUES:
         return u''
     if not value.isdigit():
-        value = re.sub("[-/\.]", "", value)
+        value = CNPJ_STRIP_REGEX.sub("", value)
     orig_value = value[:]
     try:
         int(value)
@@ -126,3 +321,92 @@ def is_valid_cnpj(value):
         raise PagSeguroValidationError(error_messages['invalid'])
 
     return orig_value
+
+
+def validate_cpfs(values):
+    """validate a sequence (or array) of CPFs at once
+
+    Returns ``(mask, codes)``: ``mask[i]`` tells whether ``values[i]`` is
+    valid and ``codes[i]`` is None or the ``CPF_ERROR_MESSAGES`` key that
+    ``is_valid_cpf`` would have raised. Both are NumPy arrays when NumPy is
+    installed, lists otherwise. Integers and whole floats are read as
+    zero-padded documents, NaN as an empty value.
+    """
+    return _validate_documents(values, 11, CPF_WEIGHTS, CPF_STRIP_REGEX)
+
+
+def validate_cnpjs(values):
+    """validate a sequence (or array) of CNPJs at once, see validate_cpfs"""
+    return _validate_documents(values, 14, CNPJ_WEIGHTS, CNPJ_STRIP_REGEX)
+
+
+def _validate_documents(values, size, weights, strip_regex):
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    codes = [None] * len(values)
+    rows = []
+    documents = []
+    for i, value in enumerate(values):
+        if isinstance(value, numbers.Integral) and not isinstance(value, bool):
+            # numeric documents (e.g. an int64 array) lost their leading zeros
+            value = "%0*d" % (size, value)
+        elif isinstance(value, numbers.Real):
+            # float arrays (e.g. a pandas column with NaN for missing rows)
+            if value != value:
+                continue
+            if not float(value).is_integer():
+                codes[i] = 'digits_only'
+                continue
+            value = "%0*d" % (size, int(value))
+        elif value is None or (isinstance(value, (str, list, tuple, dict))
+                               and not value):
+            continue
+        value = str(value)
+        if not value.isdigit():
+            value = strip_regex.sub("", value)
+        if not (value.isdigit() and value.isascii()):
+            codes[i] = 'digits_only'
+        elif len(value) != size:
+            codes[i] = 'max_digits'
+        else:
+            rows.append(i)
+            documents.append(value)
+
+    if documents:
+        if numpy is not None:
+            invalid = _invalid_check_digits_numpy(numpy, documents, size, weights)
+        else:
+            invalid = [_invalid_check_digits(document, weights)
+                       for document in documents]
+        for i, is_invalid in zip(rows, invalid):
+            if is_invalid:
+                codes[i] = 'invalid'
+
+    mask = [code is None for code in codes]
+    if numpy is not None:
+        return numpy.array(mask, dtype=bool), numpy.array(codes, dtype=object)
+    return mask, codes
+
+
+def _invalid_check_digits(document, weights):
+    digits = [int(d) for d in document]
+    body = digits[:-2]
+    dv1 = DV_maker(sum(w * d for w, d in zip(weights[0], body)) % 11)
+    dv2 = DV_maker(sum(w * d for w, d in zip(weights[1], body + [dv1])) % 11)
+    return dv1 != digits[-2] or dv2 != digits[-1]
+
+
+def _invalid_check_digits_numpy(numpy, documents, size, weights):
+    digits = numpy.frombuffer("".join(documents).encode("ascii"), dtype=numpy.uint8)
+    digits = digits.reshape(-1, size).astype(numpy.int64) - 48
+    body = digits[:, :-2]
+    first, second = (numpy.array(w, dtype=numpy.int64) for w in weights)
+
+    dv1 = body.dot(first) % 11
+    dv1 = numpy.where(dv1 >= 2, 11 - dv1, 0)
+    dv2 = (body.dot(second[:-1]) + dv1 * second[-1]) % 11
+    dv2 = numpy.where(dv2 >= 2, 11 - dv2, 0)
+    return (dv1 != digits[:, -2]) | (dv2 != digits[:, -1])
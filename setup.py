@@ -22,6 +22,11 @@ setup(
     package_dir={'pagseguro': 'pagseguro'},
     include_package_data=True,
     install_requires=requirements,
+    extras_require={
+        'async': ['aiohttp>=3.7'],
+        'numpy': ['numpy'],
+        'columnar': ['numpy', 'pyarrow'],
+    },
     long_description=readme,
     long_description_content_type='text/markdown',
     license='MIT',
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+web = pytest.importorskip('aiohttp.web')
+
+from pagseguro.aio import AsyncPagSeguro, close_async_transports  # noqa
+
+TOKEN = '123456'
+EMAIL = 'seu@email.com'
+
+TRANSACTION_XML = """<?xml version="1.0" encoding="ISO-8859-1"?>
+<transaction>
+    <code>9E884542-81B3-4419-9A75-BCC6FB495EF1</code>
+    <reference>REF1234</reference>
+    <status>3</status>
+</transaction>"""
+
+
+async def run_against_stub(coro_factory):
+    seen = []
+
+    async def transaction(request):
+        seen.append(request)
+        return web.Response(body=TRANSACTION_XML.encode('iso-8859-1'))
+
+    async def orders(request):
+        seen.append(await request.json())
+        return web.json_response({'id': 'ORDE_1', 'links': []})
+
+    async def plans(request):
+        return web.json_response({'plans': [{'id': 'PLAN_1'}]})
+
+    async def subscriptions(request):
+        seen.append(await request.json())
+        return web.json_response({'id': 'SUBS_1'})
+
+    app = web.Application()
+    app.router.add_get('/transactions/{code}', transaction)
+    app.router.add_post('/orders', orders)
+    app.router.add_get('/plans', plans)
+    app.router.add_post('/subscriptions', subscriptions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base = 'http://127.0.0.1:%s' % port
+    pg = AsyncPagSeguro(token=TOKEN, email=EMAIL, config={
+        'transaction_url': base + '/transactions/%s',
+        'order_url': base + '/orders',
+        'plan_url': base + '/plans',
+        'subscription_url': base + '/subscriptions',
+    })
+    try:
+        return await coro_factory(pg), seen
+    finally:
+        await close_async_transports()
+        await runner.cleanup()
+
+
+def test_check_transaction():
+    async def call(pg):
+        return await pg.check_transaction('9E884542')
+
+    result, seen = asyncio.run(run_against_stub(call))
+    assert result.code == '9E884542-81B3-4419-9A75-BCC6FB495EF1'
+    assert result.status == '3'
+    assert seen[0].headers['Authorization'] == 'Bearer 123456'
+
+
+def test_concurrent_checkouts_share_one_loop():
+    async def call(pg):
+        pg.reference = 'ABC'
+        return await asyncio.gather(*[pg.checkout() for _ in range(20)])
+
+    responses, seen = asyncio.run(run_against_stub(call))
+    assert [r.json()['id'] for r in responses] == ['ORDE_1'] * 20
+    assert seen[0]['reference_id'] == 'ABC'
+
+
+def test_get_plan_json():
+    async def call(pg):
+        return await pg.get_plan(reference_id='gold')
+
+    response, _ = asyncio.run(run_against_stub(call))
+    assert response.ok
+    assert response.json()['plans'][0]['id'] == 'PLAN_1'
+
+
+def test_send_subscription():
+    from pagseguro.cache import lookup_cache
+    from pagseguro.messages import OrderRequest, SubscriptionRequest
+    lookup_cache.clear()
+    order = OrderRequest(payment={
+        'amount': {'value': 1000},
+        'method': {'type': 'CREDIT_CARD', 'card': {'security_code': '123'}}})
+    request = SubscriptionRequest(order, 'SUB_1', plan_reference_id='gold',
+                                  customer_id='CUST_1')
+
+    async def call(pg):
+        return await pg.send_subscription(request)
+
+    response, seen = asyncio.run(run_against_stub(call))
+    assert response['id'] == 'SUBS_1'
+    assert response.json() == {'id': 'SUBS_1'}
+    assert seen[0]['plan'] == {'id': 'PLAN_1'}
+
+
+def test_create_orders():
+    async def call(pg):
+        return await pg.create_orders(
+            [{'reference': str(i)} for i in range(5)], max_concurrency=2)
+
+    results, seen = asyncio.run(run_against_stub(call))
+    assert [r.id for r in results] == ['ORDE_1'] * 5
+    assert sorted(body['reference_id'] for body in seen) == [
+        '0', '1', '2', '3', '4']
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from benchmarks import fixtures, harness
+from benchmarks.run import main, select
+from benchmarks.cases import all_cases
+
+from pagseguro import PagSeguroTransactionSearchResult
+from pagseguro.utils import is_valid_cpf, is_valid_cnpj
+
+
+def test_percentile():
+    samples = list(range(1, 101))
+    assert harness.percentile(samples, 0.5) == 50
+    assert harness.percentile(samples, 0.99) == 99
+    assert harness.percentile([7], 0.9) == 7
+
+
+def test_run_case_and_compare(tmpdir):
+    case = harness.Case('sum', lambda: lambda: sum(range(100)), items=100)
+    result = harness.run_case(case, min_time=0.01, min_rounds=3)
+    assert result['rounds'] >= 3
+    assert result['p50'] <= result['p99']
+    assert result['items_per_sec'] > result['ops_per_sec']
+    assert result['peak_memory'] is not None
+
+    path = str(tmpdir.join('run.json'))
+    harness.save(path, [result])
+    baseline = harness.load(path)
+    slower = dict(result, p50=result['p50'] * 2)
+    rows = harness.compare(baseline, {'results': [slower]}, threshold=0.1)
+    assert rows[0]['regressed']
+    rows = harness.compare(baseline, {'results': [result]}, threshold=0.1)
+    assert not rows[0]['regressed']
+
+
+def test_fixtures():
+    assert all(is_valid_cpf(cpf) for cpf in fixtures.cpfs(50))
+    assert all(is_valid_cnpj(cnpj) for cnpj in fixtures.cnpjs(50))
+    result = PagSeguroTransactionSearchResult(
+        fixtures.transaction_search_xml(3, page=1, total_pages=2))
+    assert len(result.transactions) == 3
+    assert result.total_pages == 2
+
+
+def test_select_and_list(capsys):
+    names = [case.name for case in select(all_cases(), ['validate.cpf'])]
+    assert names == ['validate.cpf', 'validate.cpf_cached']
+    assert main(['--list', '-k', 'config.*']) == 0
+    assert 'config.shared' in capsys.readouterr().out
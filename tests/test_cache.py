@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from pagseguro.cache import LRUCache, TTLCache
+
+
+class FakeTimer(object):
+    now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert 'b' not in cache
+    assert cache.get('b') is None
+    assert cache.info() == {'hits': 1, 'misses': 1, 'size': 2, 'maxsize': 2}
+
+
+def test_ttl_cache_expires_entries():
+    timer = FakeTimer()
+    cache = TTLCache(maxsize=10, ttl=60, timer=timer)
+    cache.set('plan', {'id': 'PLAN_1'})
+    cache.set('short', 1, ttl=5)
+    timer.now = 10
+    assert cache.get('plan') == {'id': 'PLAN_1'}
+    assert cache.get('short') is None
+    timer.now = 61
+    assert cache.get('plan') is None
+    assert cache.info()['hits'] == 1
+    assert len(cache) == 0
+
+
+def test_ttl_cache_invalidate_prefix():
+    cache = TTLCache()
+    cache.set(('plans', 'url', 'token', 'gold'), 1)
+    cache.set(('plans', 'url', 'other', 'gold'), 2)
+    cache.set(('customers', 'url', 'token', 'c1'), 3)
+    cache.invalidate(('plans', 'url', 'token'))
+    assert cache.get(('plans', 'url', 'token', 'gold')) is None
+    assert cache.get(('plans', 'url', 'other', 'gold')) == 2
+    assert cache.get(('customers', 'url', 'token', 'c1')) == 3
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+import responses
+
+from pagseguro import PagSeguro, PagSeguroCheckoutResponse
+from pagseguro.codec import CODECS, JSONCodec, get_codec
+from pagseguro.payload import CheckoutTemplate
+
+TOKEN = '123456'
+EMAIL = 'seu@email.com'
+
+
+def available_codecs():
+    codecs = []
+    for name in CODECS:
+        try:
+            codecs.append(get_codec(name))
+        except ImportError:
+            pass
+    return codecs
+
+
+@pytest.mark.parametrize('codec', available_codecs(), ids=repr)
+def test_codec_roundtrip(codec):
+    data = {'name': u'Revista Ação', 'items': [1, 2.5, None, True]}
+    encoded = codec.dumps(data)
+    assert isinstance(encoded, bytes)
+    assert json.loads(encoded.decode('utf-8')) == data
+    assert codec.loads(encoded) == data
+    assert codec.loads(encoded.decode('utf-8')) == data
+
+
+def test_get_codec():
+    assert get_codec().name == next(c.name for c in available_codecs())
+    assert get_codec('json') is get_codec('json')
+    codec = JSONCodec('custom', json.dumps, json.loads)
+    assert get_codec(codec) is codec
+    with pytest.raises(ValueError):
+        get_codec('yaml')
+
+
+def test_template_uses_configured_codec():
+    pg = PagSeguro(token=TOKEN, config={'json_codec': 'json'})
+    template = CheckoutTemplate.from_client(pg)
+    assert template.dumps is get_codec('json').dumps
+    assert pg.codec is get_codec('json')
+    assert json.loads(template.render(reference='1')) == {'reference_id': '1'}
+
+
+def test_checkout_response_from_bytes():
+    content = b'{"id": "ORDE_1", "links": [{"rel": "PAY", "href": "x"}]}'
+    response = PagSeguroCheckoutResponse(content)
+    assert response.id == 'ORDE_1'
+    assert response.payment_link == 'x'
+
+
+@responses.activate
+def test_json_responses():
+    pg = PagSeguro(token=TOKEN, email=EMAIL)
+    responses.add(responses.GET, pg.config.PLAN_URL,
+                  json={'plans': [{'id': 'PLAN_1'}]},
+                  headers={'X-Request-Id': 'abc'})
+    responses.add(responses.POST, pg.config.PLAN_URL, status=400,
+                  json={'error_messages': [{'code': '40002'}]})
+
+    response = pg.list_plans()
+    assert response.ok and response.status_code == 200
+    assert response.json() is response.json()
+    assert response['plans'][0]['id'] == 'PLAN_1'
+    assert response.headers['X-Request-Id'] == 'abc'
+    assert response.errors is None
+
+    response = pg.create_plan({'reference_id': 'gold'})
+    assert not response.ok
+    assert response.errors == [{'code': '40002'}]
+    assert json.loads(responses.calls[1].request.body) == {
+        'reference_id': 'gold'}
+
+
+@responses.activate
+def test_checkout_returns_json_response():
+    from pagseguro.parsers import PagSeguroJSONResponse
+    pg = PagSeguro(token=TOKEN, email=EMAIL)
+    responses.add(responses.POST, pg.config.ORDER_URL,
+                  json={'id': 'ORDE_1',
+                        'links': [{'rel': 'PAY', 'href': 'x'}]})
+    pg.items = [{'id': '1', 'description': 'a', 'amount': 1, 'quantity': 1}]
+    response = pg.checkout()
+    assert isinstance(response, PagSeguroJSONResponse)
+    assert response.ok and response['id'] == 'ORDE_1'
+    assert PagSeguroCheckoutResponse(response.json()).payment_link == 'x'
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+
+import pytest
+
+from pagseguro import PagSeguro, PagSeguroTransactionSearchResult
+from pagseguro.config import Config
+from pagseguro.fakeserver import (FakePagSeguroAPI, FakePagSeguroServer,
+                                  transaction_search_xml)
+from pagseguro.models import Transaction
+
+numpy = pytest.importorskip('numpy')
+
+from pagseguro import columnar  # noqa: E402
+from pagseguro.columnar import transaction_columns  # noqa: E402
+
+DATES = (datetime.datetime(2011, 1, 1), datetime.datetime(2011, 2, 1))
+
+
+def transactions(count):
+    return PagSeguroTransactionSearchResult(
+        transaction_search_xml(count), Config()).transactions
+
+
+def assert_same(left, right):
+    assert sorted(left) == sorted(right)
+    for name in left:
+        assert left[name].dtype == right[name].dtype, name
+        assert numpy.array_equal(left[name], right[name],
+                                 equal_nan=left[name].dtype != object), name
+
+
+def test_typed_columns():
+    columns = transaction_columns(transactions(3))
+    assert columns['gross_amount'].dtype == numpy.int64
+    assert columns['gross_amount'].tolist() == [10000, 10100, 10200]
+    assert columns['status'].dtype == numpy.int8
+    assert columns['status'].tolist() == [3, 4, 3]
+    assert columns['payment_method'].tolist() == [1, 1, 1]
+    # 15:46:12 at -02:00, in UTC
+    assert columns['date'][0] == numpy.datetime64('2011-02-05T17:46:12', 'us')
+    assert numpy.isnat(columns['escrow_end_date']).all()
+    assert columns['item_count'].tolist() == [-1, -1, -1]
+    assert columns['code'][1] == transactions(3)[1]['code']
+    assert columns['fee_amount'][columns['status'] == 3].sum() == 0
+
+
+def test_missing_and_irregular_values():
+    rows = transactions(3)
+    rows[0]['feeAmount'] = None
+    rows[1]['date'] = '2011-02-05T15:46:12-03:00'
+    rows[2]['lastEventDate'] = '2011-02-05T15:46:12.000+01:30'
+    rows[2]['status'] = ''
+    columns = transaction_columns(rows)
+    assert columns['fee_amount'].tolist() == [0, 0, 0]
+    assert columns['date'][1] == numpy.datetime64('2011-02-05T18:46:12', 'us')
+    assert columns['last_event_date'][2] == \
+        numpy.datetime64('2011-02-05T14:16:12', 'us')
+    assert columns['status'].tolist() == [3, 4, -1]
+
+
+def test_records_and_pages_give_same_columns():
+    rows = transactions(5)
+    rows[0]['feeAmount'] = None
+    expected = transaction_columns(rows)
+    records = [Transaction.from_dict(row) for row in rows]
+    assert_same(transaction_columns(records), expected)
+    assert_same(transaction_columns(rows[:2] + records[2:]), expected)
+    page = PagSeguroTransactionSearchResult(transaction_search_xml(5),
+                                            Config())
+    assert_same(transaction_columns([page]),
+                transaction_columns(page.transactions))
+
+
+def test_empty():
+    columns = transaction_columns([])
+    assert len(columns['gross_amount']) == 0
+    assert columns['date'].dtype == numpy.dtype('datetime64[us]')
+
+
+def test_arrow_table():
+    pyarrow = pytest.importorskip('pyarrow')
+    rows = transactions(4)
+    rows[1]['feeAmount'] = None
+    table = columnar.transaction_table(rows)
+    assert table.num_rows == 4
+    assert table.schema.field('date').type == \
+        pyarrow.timestamp('us', tz='UTC')
+    assert pyarrow.types.is_dictionary(table.schema.field('status').type)
+    assert table.column('fee_amount').null_count == 1
+    assert table.column('gross_amount').to_pylist() == \
+        [10000, 10100, 10200, 10300]
+
+
+def test_write_parquet_in_batches(tmp_path):
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+    path = str(tmp_path / 'transactions.parquet')
+    assert columnar.write_transactions(transactions(25), path,
+                                       batch_size=10) == path
+    table = pyarrow.parquet.read_table(path)
+    assert table.num_rows == 25
+    assert table.column('net_amount').to_pylist() == \
+        [(100 + i) * 100 for i in range(25)]
+
+
+def test_write_npz_without_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar, '_pyarrow', lambda: None)
+    path = columnar.write_transactions(transactions(25),
+                                       str(tmp_path / 'transactions'),
+                                       batch_size=10)
+    assert path.endswith('.npz')
+    with numpy.load(path) as saved:
+        assert saved['gross_amount'].tolist() == \
+            [(100 + i) * 100 for i in range(25)]
+        assert saved['code'][0] == transactions(1)[0]['code']
+    with pytest.raises(ImportError):
+        columnar.transaction_table(transactions(1))
+
+
+def test_client_export(tmp_path):
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+    with FakePagSeguroServer(FakePagSeguroAPI(pages=3, page_size=4)) as server:
+        pg = PagSeguro(token='123456', config=server.config())
+        path = pg.export_transactions(*DATES, str(tmp_path / 'out.parquet'))
+    assert pyarrow.parquet.read_table(path).num_rows == 12
+
+
+@pytest.mark.parametrize('arrow', [True, False])
+def test_async_client_export(tmp_path, monkeypatch, arrow):
+    pytest.importorskip('aiohttp')
+    from pagseguro.aio import AsyncPagSeguro, close_async_transports
+    from pagseguro.fakeserver import AsyncFakePagSeguroServer
+    if arrow:
+        pytest.importorskip('pyarrow')
+    else:
+        monkeypatch.setattr(columnar, '_pyarrow', lambda: None)
+
+    async def run():
+        api = FakePagSeguroAPI(pages=3, page_size=4)
+        async with AsyncFakePagSeguroServer(api) as server:
+            pg = AsyncPagSeguro(token='123456', config=server.config())
+            path = await pg.export_transactions(
+                *DATES, str(tmp_path / 'out.parquet'), batch_size=5)
+        await close_async_transports()
+        return path
+
+    path = asyncio.run(run())
+    if arrow:
+        import pyarrow.parquet
+        table = pyarrow.parquet.read_table(path)
+        assert table.num_rows == 12
+        assert table.column('gross_amount').to_pylist() == \
+            [(100 + i) * 100 for i in range(12)]
+    else:
+        assert path.endswith('.npz')
+        with numpy.load(path) as saved:
+            assert len(saved['code']) == 12
@@ -50,3 +50,107 @@ def test_config_special_methods():
     c.__setitem__('PAYMENT_URL', 'http://google.com')
     assert c.PAYMENT_URL == 'http://google.com'
     assert c['PAYMENT_URL'] == 'http://google.com'
+
+
+def test_shared_config_is_interned_and_frozen():
+    c = Config.shared(sandbox=True)
+    assert Config.shared(sandbox=True) is c
+    assert Config.shared() is not c
+    assert c.ORDER_URL == Config(sandbox=True).ORDER_URL
+    assert Config.shared(host_pool_sizes={'a': 1}) is \
+        Config.shared(host_pool_sizes={'a': 1})
+    with pytest.raises(TypeError):
+        c.PAYMENT_URL = 'http://google.com'
+    with pytest.raises(TypeError):
+        c['PAYMENT_URL'] = 'http://google.com'
+
+
+def test_shared_configs_with_overrides_are_released():
+    import gc
+    from pagseguro.config import FrozenConfig
+
+    class Store(object):
+        pass
+
+    before = len(FrozenConfig._instances)
+    configs = [Config.shared(transaction_store=Store()) for _ in range(50)]
+    assert len(FrozenConfig._instances) == before + 50
+    del configs
+    gc.collect()
+    assert len(FrozenConfig._instances) == before
+    assert Config.shared() is Config.shared()
+
+
+def test_config_url_templates():
+    shared, plain = Config.shared(), Config()
+    for key in ('TRANSACTION_URL', 'NOTIFICATION_URL', 'PAYMENT_URL'):
+        assert shared.url(key, 'ABC') == plain.url(key, 'ABC') == \
+            getattr(plain, key) % 'ABC'
+    assert shared.url('ORDER_URL') == plain.ORDER_URL
+
+
+def test_frozen_config_replace():
+    c = Config.shared()
+    other = c.replace(reference_prefix='REF%s')
+    assert other.REFERENCE_PREFIX == 'REF%s'
+    assert c.REFERENCE_PREFIX == '%s'
+    assert c.replace(reference_prefix='REF%s') is other
+
+
+def test_clients_share_config():
+    from pagseguro import PagSeguro
+    first = PagSeguro(token='123')
+    second = PagSeguro(token='456')
+    assert first.config is second.config
+
+    second.reference_prefix = 'REF'
+    assert second.reference_prefix == 'REF%s'
+    assert first.reference_prefix == '%s'
+
+    custom = Config(payment_url='http://google.com')
+    assert PagSeguro(token='123', config=custom).config is custom
+
+
+def test_unhashable_settings_get_their_own_config():
+    from dataclasses import dataclass
+    from pagseguro import PagSeguro
+
+    @dataclass
+    class Metrics(object):
+        enabled: bool = False
+
+    pg = PagSeguro(token='1', config={'METRICS': Metrics()})
+    assert type(pg.config) is Config
+    assert pg.metrics is pg.config.METRICS
+    assert Config.shared(metrics=Metrics()) is not \
+        Config.shared(metrics=Metrics())
+
+
+def test_frozen_config_dict_settings_are_read_only():
+    c = Config.shared(host_pool_sizes={'a': 1})
+    with pytest.raises(TypeError):
+        c.HOST_POOL_SIZES['b'] = 3
+    with pytest.raises(TypeError):
+        c.HEADERS['Accept'] = 'text/html'
+    assert c.HOST_POOL_SIZES == {'a': 1}
+    assert c.replace(timeout=1).HOST_POOL_SIZES == {'a': 1}
+    assert Config.shared().HOST_POOL_SIZES == {}
+
+
+def test_client_replace_config():
+    from pagseguro import PagSeguro
+    first = PagSeguro(token='123')
+    second = PagSeguro(token='456')
+    transport = second.transport
+    second.replace_config(timeout=5, host_pool_sizes={'a': 2})
+    assert second.config.TIMEOUT == 5
+    assert second.transport is not transport
+    assert second.transport.host_pool_sizes == {'a': 2}
+    assert first.config.TIMEOUT is None
+    assert first.transport is transport
+
+    custom = Config()
+    third = PagSeguro(token='789', config=custom)
+    third.replace_config(timeout=5)
+    assert third.config is custom
+    assert custom.TIMEOUT == third.transport.timeout == 5
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+
+import pytest
+
+from pagseguro import PagSeguro
+from pagseguro.fakeserver import (FakePagSeguroAPI, FakePagSeguroServer,
+                                  TokenBucket, lognormal_latency,
+                                  parse_latency, server_config)
+
+TOKEN = '123456'
+EMAIL = 'seu@email.com'
+DATES = (datetime.datetime(2011, 1, 1), datetime.datetime(2011, 2, 1))
+
+
+@pytest.fixture
+def server():
+    with FakePagSeguroServer(FakePagSeguroAPI(pages=3, page_size=7)) as server:
+        yield server
+
+
+@pytest.fixture
+def pg(server):
+    return PagSeguro(token=TOKEN, email=EMAIL, config=server.config())
+
+
+def test_config_points_every_endpoint_at_server(server):
+    config = server.config()
+    assert all(url.startswith(server.url) for url in config.values())
+    assert config['TRANSACTION_URL'].endswith('/v3/transactions/%s')
+    assert server_config('http://h:1', sandbox=True)['ORDER_URL'] == \
+        'http://h:1/orders'
+
+
+def test_client_against_fake_server(pg, server):
+    transactions = pg.query_transactions(*DATES)
+    assert len(transactions) == 21
+    assert len(set(t['code'] for t in transactions)) == 21
+    assert len(pg.query_pre_approvals(*DATES)) == 21
+    assert pg.check_transaction('ABC').code == 'ABC'
+
+    plan = pg.create_plan({'reference_id': 'gold'})
+    assert plan.status_code == 201
+    assert pg.resolve_plan('gold')['id'] == plan['id']
+    assert pg.delete_plan(plan['id']).status_code == 204
+
+    pg.reference = '42'
+    order = pg.checkout()
+    assert order['reference_id'] == '42'
+    assert server.api.orders[order['id']]['reference_id'] == '42'
+    assert server.api.stats[200] >= 8
+
+
+def test_error_rate_and_rate_limit():
+    api = FakePagSeguroAPI(error_rate=1.0)
+    response = api.handle('GET', '/v3/transactions/ABC')
+    assert response.status == 500
+    assert b'<errors>' in response.body
+    assert api.handle('GET', '/plans').status == 500
+
+    api = FakePagSeguroAPI(rate_limit=2)
+    statuses = [api.handle('GET', '/plans').status for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    limited = api.handle('GET', '/plans')
+    assert limited.headers['Retry-After'] == '1'
+    assert api.stats == {200: 2, 429: 2}
+
+
+def test_token_bucket_refills():
+    now = [0.0]
+    bucket = TokenBucket(10, burst=1, timer=lambda: now[0])
+    assert bucket.take() == 0
+    assert bucket.take() == pytest.approx(0.1)
+    now[0] = 0.1
+    assert bucket.take() == 0
+
+
+def test_latency_distributions():
+    api = FakePagSeguroAPI(latency=parse_latency('fixed:0.25'))
+    assert api.handle('GET', '/plans').delay == 0.25
+    first = FakePagSeguroAPI(latency=lognormal_latency(0.02), seed=1)
+    second = FakePagSeguroAPI(latency=lognormal_latency(0.02), seed=1)
+    delays = [first.handle('GET', '/plans').delay for _ in range(5)]
+    assert delays == [second.handle('GET', '/plans').delay for _ in range(5)]
+    with pytest.raises(ValueError):
+        parse_latency('gamma:1')
+
+
+def test_unknown_route():
+    assert FakePagSeguroAPI().handle('GET', '/nope').status == 404
+
+
+def test_async_server():
+    pytest.importorskip('aiohttp')
+    from pagseguro.aio import AsyncPagSeguro, close_async_transports
+    from pagseguro.fakeserver import AsyncFakePagSeguroServer
+
+    async def run():
+        api = FakePagSeguroAPI(pages=2, page_size=5)
+        async with AsyncFakePagSeguroServer(api) as server:
+            pg = AsyncPagSeguro(token=TOKEN, email=EMAIL,
+                                config=server.config())
+            try:
+                return await pg.query_transactions(*DATES)
+            finally:
+                await close_async_transports()
+
+    assert len(asyncio.run(run())) == 10
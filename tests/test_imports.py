@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import subprocess
+import sys
+
+CHECK = """
+import sys
+import pagseguro
+from pagseguro.utils import is_valid_cpf
+from pagseguro.payload import CheckoutTemplate
+pg = pagseguro.PagSeguro(token='123')
+CheckoutTemplate.from_client(pg).render(reference='1')
+is_valid_cpf('482.268.465-28')
+print(' '.join(m for m in ('requests', 'xmltodict', 'arrow', 'http.server')
+               if m in sys.modules))
+"""
+
+
+def test_import_does_not_load_heavy_dependencies():
+    output = subprocess.check_output([sys.executable, '-c', CHECK])
+    assert output.split() == []
+
+
+def test_dependencies_load_on_first_use(xml):
+    from pagseguro import PagSeguro, PagSeguroTransactionSearchResult
+    from pagseguro.transport import PagSeguroTransport
+
+    transport = PagSeguroTransport()
+    assert transport._session is None
+    assert transport.session is transport.session
+    transport.close()
+
+    result = PagSeguroTransactionSearchResult(xml, PagSeguro(token='1').config)
+    assert result.transactions
+    assert 'xmltodict' in sys.modules
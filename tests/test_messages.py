@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import datetime
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import responses
+
+from pagseguro import PagSeguro, PagSeguroJSONResponse
+from pagseguro.messages import OrderRequest, SearchQuery, SubscriptionRequest
+
+TOKEN = '123456'
+EMAIL = 'seu@email.com'
+
+CARD_PAYMENT = {'amount': {'value': 1000},
+                'method': {'type': 'CREDIT_CARD',
+                           'card': {'security_code': '123'}}}
+
+
+@pytest.fixture
+def pagseguro():
+    return PagSeguro(token=TOKEN, email=EMAIL)
+
+
+def test_requests_are_immutable(items):
+    order = OrderRequest(items=items, reference='1')
+    assert isinstance(order.items, tuple)
+    with pytest.raises(AttributeError):
+        order.reference = '2'
+    assert order._replace(reference='2').reference == '2'
+    assert SearchQuery(1, 2) == (1, 2, None, None)
+
+
+def test_render_order_matches_checkout(pagseguro, sender, items):
+    sender = dict(sender, cpf=None)
+    order = OrderRequest(sender=sender, items=items, payment=CARD_PAYMENT,
+                         reference='1234', params={'extra': 'value'})
+    body = json.loads(pagseguro.render_order(order))
+
+    pagseguro.sender = sender
+    pagseguro.items = items
+    pagseguro.payment = CARD_PAYMENT
+    pagseguro.reference = '1234'
+    pagseguro.build_checkout_params(extra='value')
+    assert body == pagseguro.data
+
+
+@responses.activate
+def test_shared_client_across_threads(pagseguro):
+    def callback(request):
+        body = json.loads(request.body)
+        return (200, {}, json.dumps({'id': 'ORDE_' + body['reference_id'],
+                                     'links': []}))
+
+    responses.add_callback(responses.POST, pagseguro.config.ORDER_URL,
+                           callback=callback)
+    orders = [OrderRequest(reference=str(i)) for i in range(50)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(pagseguro.send_order, orders))
+
+    assert [r.id for r in results] == ['ORDE_%s' % i for i in range(50)]
+    assert pagseguro.data == {}
+    assert pagseguro.reference == ''
+
+
+@responses.activate
+def test_search_transactions_leaves_client_untouched(pagseguro, xml):
+    responses.add(responses.GET, pagseguro.config.QUERY_TRANSACTION_URL,
+                  body=xml)
+    query = SearchQuery(datetime.datetime(2011, 1, 1),
+                        datetime.datetime(2011, 2, 1), max_results=10)
+    transactions = pagseguro.search_transactions(query)
+
+    assert len(transactions) == 2
+    assert 'maxPageResults=10' in responses.calls[0].request.url
+    assert pagseguro.data == {}
+
+
+@responses.activate
+def test_send_subscription(pagseguro, sender):
+    from pagseguro.cache import lookup_cache
+    lookup_cache.clear()
+    responses.add(responses.GET, pagseguro.config.PLAN_URL,
+                  json={'plans': [{'id': 'PLAN_1'}]})
+    responses.add(responses.POST, pagseguro.config.SUBSCRIPTION_URL,
+                  json={'id': 'SUBS_1'})
+    order = OrderRequest(sender=dict(sender, cpf=None), payment=CARD_PAYMENT)
+    request = SubscriptionRequest(order, 'SUB_1', plan_reference_id='gold',
+                                  customer_reference_id='CUST_REF')
+
+    response = pagseguro.send_subscription(request)
+    assert isinstance(response, PagSeguroJSONResponse)
+    assert response['id'] == 'SUBS_1'
+    assert response.json() == {'id': 'SUBS_1'}
+    body = json.loads(responses.calls[1].request.body)
+    assert body['plan'] == {'id': 'PLAN_1'}
+    assert body['reference_id'] == 'SUB_1'
+    assert body['customer']['reference_id'] == 'CUST_REF'
+    assert body['customer']['billing_info'][0]['type'] == 'CREDIT_CARD'
+    assert 'billing_info' not in pagseguro.checkout_template().build(
+        **order.as_kwargs())['customer']
+    assert pagseguro.subscription == {}
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+import urllib.request
+
+import pytest
+
+from pagseguro import PagSeguro
+from pagseguro.config import Config
+from pagseguro.fakeserver import (AsyncFakePagSeguroServer, FakePagSeguroAPI,
+                                  FakePagSeguroServer)
+from pagseguro.metrics import (Metrics, PrometheusMetrics, endpoint_name,
+                               null_metrics)
+from pagseguro.parsers import PagSeguroNotificationResponse
+
+TOKEN = '123456'
+EMAIL = 'seu@email.com'
+DATES = (datetime.datetime(2011, 1, 1), datetime.datetime(2011, 2, 1))
+
+
+@pytest.fixture
+def server():
+    with FakePagSeguroServer(FakePagSeguroAPI(pages=2, page_size=3)) as server:
+        yield server
+
+
+def test_metrics_disabled_by_default():
+    pg = PagSeguro(token=TOKEN)
+    assert pg.metrics is null_metrics
+    assert not pg.metrics.enabled
+
+
+def test_endpoint_names():
+    config = Config()
+    assert endpoint_name(config, config.url('TRANSACTION_URL', 'A')) == \
+        'transaction'
+    assert endpoint_name(config, config.url('NOTIFICATION_URL', 'A')) == \
+        'notification'
+    assert endpoint_name(config, config.QUERY_TRANSACTION_URL) == \
+        'query_transaction'
+    assert endpoint_name(config, config.PLAN_URL + '/PLAN_1') == 'plan'
+    assert endpoint_name(config, 'https://example.com/') == 'other'
+
+
+def test_requests_are_measured(server):
+    metrics = PrometheusMetrics()
+    pg = PagSeguro(token=TOKEN, email=EMAIL,
+                   config=server.config(METRICS=metrics))
+    assert len(pg.query_transactions(*DATES)) == 6
+    pg.check_transaction('ABC')
+    pg.create_plan({'reference_id': 'gold'})
+
+    assert metrics.count('requests_total', endpoint='query_transaction',
+                         status=200) == 2
+    assert metrics.count('requests_total', endpoint='transaction') == 1
+    assert metrics.count('requests_total', endpoint='plan', method='POST',
+                         status=201) == 1
+    latency = metrics.histogram('request_duration_seconds',
+                                endpoint='transaction', method='GET')
+    assert latency.count == 1 and latency.sum > 0
+    sent = metrics.histogram('request_size_bytes', endpoint='plan',
+                             method='POST')
+    assert sent.sum == len(b'{"reference_id":"gold"}')
+    received = metrics.histogram('response_size_bytes',
+                                 endpoint='transaction', method='GET')
+    assert received.sum > 0
+    parsed = metrics.histogram('parse_duration_seconds',
+                               parser='PagSeguroTransactionSearchResult')
+    assert parsed.count == 2
+
+
+def test_failed_requests_are_counted():
+    metrics = PrometheusMetrics()
+    pg = PagSeguro(token=TOKEN, config={
+        'TRANSACTION_URL': 'http://127.0.0.1:1/v3/transactions/%s',
+        'METRICS': metrics,
+    })
+    with pytest.raises(Exception):
+        pg.check_transaction('ABC')
+    assert metrics.count('request_errors_total', endpoint='transaction') == 1
+    assert metrics.count('requests_total') == 0
+
+
+def test_parse_time_recorded_from_config():
+    metrics = PrometheusMetrics()
+    xml = '<transaction><code>A</code></transaction>'
+    response = PagSeguroNotificationResponse(xml, Config(metrics=metrics))
+    assert response.code == 'A'
+    histogram = metrics.histogram('parse_duration_seconds',
+                                  parser='PagSeguroNotificationResponse')
+    assert histogram.count == 1
+
+
+def test_custom_hook():
+    calls = []
+
+    class Recorder(Metrics):
+        enabled = True
+
+        def request(self, endpoint, method, status, seconds, sent=0,
+                    received=0):
+            calls.append((endpoint, method, status))
+
+    with FakePagSeguroServer(FakePagSeguroAPI()) as server:
+        pg = PagSeguro(token=TOKEN, config=server.config(METRICS=Recorder()))
+        pg.check_transaction('ABC')
+    assert calls == [('transaction', 'GET', 200)]
+
+
+def test_prometheus_render():
+    metrics = PrometheusMetrics(latency_buckets=(0.1, 1))
+    metrics.request('order', 'POST', 201, 0.05, 100, 200)
+    metrics.request('order', 'POST', 201, 0.5, 100, 200)
+    text = metrics.render()
+    assert '# TYPE pagseguro_request_duration_seconds histogram' in text
+    assert ('pagseguro_request_duration_seconds_bucket'
+            '{endpoint="order",method="POST",le="0.1"} 1') in text
+    assert ('pagseguro_request_duration_seconds_bucket'
+            '{endpoint="order",method="POST",le="+Inf"} 2') in text
+    assert ('pagseguro_requests_total'
+            '{endpoint="order",method="POST",status="201"} 2') in text
+    assert text.count('# TYPE pagseguro_requests_total counter') == 1
+
+
+def test_prometheus_serve():
+    metrics = PrometheusMetrics()
+    metrics.parse('parser', 0.001)
+    server = metrics.serve(port=0)
+    try:
+        url = 'http://127.0.0.1:%d/metrics' % server.server_address[1]
+        body = urllib.request.urlopen(url).read().decode('utf-8')
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert 'pagseguro_parse_duration_seconds_count{parser="parser"} 1' in body
+
+
+def test_async_requests_are_measured():
+    pytest.importorskip('aiohttp')
+    from pagseguro.aio import AsyncPagSeguro, close_async_transports
+
+    async def run():
+        metrics = PrometheusMetrics()
+        async with AsyncFakePagSeguroServer(FakePagSeguroAPI()) as server:
+            pg = AsyncPagSeguro(token=TOKEN,
+                                config=server.config(METRICS=metrics))
+            await pg.check_transaction('ABC')
+        await close_async_transports()
+        return metrics
+
+    metrics = asyncio.run(run())
+    assert metrics.count('requests_total', endpoint='transaction',
+                         status=200) == 1
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import datetime
+from decimal import Decimal
+
+import pytest
+import xmltodict
+
+from pagseguro.models import Transaction, PreApproval, Charge, Sender
+from pagseguro.parsers import (PagSeguroTransactionSearchResult,
+                               PagSeguroNotificationResponse)
+
+
+class TransactionRecordsResult(PagSeguroTransactionSearchResult):
+    record_class = Transaction
+
+
+class StreamingTransactionRecordsResult(TransactionRecordsResult):
+    engine = 'iterparse'
+
+
+class NotificationRecordResponse(PagSeguroNotificationResponse):
+    record_class = Transaction
+
+
+NOTIFICATION_XML = """<?xml version="1.0" encoding="ISO-8859-1"?>
+<transaction>
+    <date>2011-02-10T16:13:41.000-03:00</date>
+    <code>9E884542-81B3-4419-9A75-BCC6FB495EF1</code>
+    <reference>REF1234</reference>
+    <type>1</type>
+    <status>3</status>
+    <grossAmount>49900.50</grossAmount>
+    <feeAmount>1.99</feeAmount>
+    <sender>
+        <name>José Comprador</name>
+        <email>comprador@uol.com.br</email>
+        <phone><areaCode>11</areaCode><number>56273440</number></phone>
+    </sender>
+    <installmentCount>1</installmentCount>
+</transaction>"""
+
+
+def test_transaction_decodes_fields(xml):
+    raw = xmltodict.parse(xml)['transactionSearchResult']['transactions']
+    transaction = Transaction.from_dict(raw['transaction'][0])
+    assert transaction.gross_amount_cents == 4990000
+    assert transaction.gross_amount == Decimal('49900.00')
+    assert transaction.status == 3
+    assert transaction.date.utcoffset() == datetime.timedelta(hours=-2)
+    assert transaction.payment_method == {'type': '1'}
+    assert not hasattr(transaction, '__dict__')
+
+
+def test_transaction_dict_view_round_trips(xml):
+    raw = xmltodict.parse(xml)['transactionSearchResult']['transactions']
+    transaction = Transaction.from_dict(raw['transaction'][0])
+    assert transaction == raw['transaction'][0]
+    assert transaction['grossAmount'] == '49900.00'
+    assert transaction.get('missing') is None
+    with pytest.raises(KeyError):
+        transaction['escrowEndDate']
+
+
+def test_search_result_record_class(xml):
+    plain = PagSeguroTransactionSearchResult(xml)
+    for parser in (TransactionRecordsResult, StreamingTransactionRecordsResult):
+        result = parser(xml)
+        assert all(isinstance(t, Transaction) for t in result.transactions)
+        assert result.transactions == plain.transactions
+        assert result.transactions[1].net_amount_cents == 2690000
+
+
+def test_notification_record_class():
+    response = NotificationRecordResponse(NOTIFICATION_XML)
+    assert isinstance(response.record, Transaction)
+    assert isinstance(response.record.sender, Sender)
+    assert response.record.sender.name == u'José Comprador'
+    assert response.record.fee_amount == Decimal('1.99')
+    assert response.code == '9E884542-81B3-4419-9A75-BCC6FB495EF1'
+    assert response.status == 3
+    assert response.gross_amount_cents == 4990050
+    assert response.fee_amount == Decimal('1.99')
+    assert response.date.utcoffset() == datetime.timedelta(hours=-3)
+    assert response.sender.name == u'José Comprador'
+    assert response.grossAmount == '49900.50'
+    assert 'code' not in response.__dict__
+    with pytest.raises(AttributeError):
+        response.escrowEndDate
+
+
+def test_pre_approval_and_charge():
+    pre_approval = PreApproval.from_dict({
+        'code': 'C08984179E9EDF3DD4023F87B71DE349',
+        'date': '2011-11-23T13:40:23.000-02:00',
+        'status': 'ACTIVE',
+        'charge': 'auto',
+    })
+    assert pre_approval.date.year == 2011
+    assert pre_approval['date'] == '2011-11-23T13:40:23.000-02:00'
+
+    charge = Charge.from_dict({
+        'id': 'CHAR_1', 'status': 'PAID',
+        'amount': {'value': 1500, 'currency': 'BRL'},
+        'paid_at': '2021-01-01T10:00:00.000-03:00',
+        'unknown': 1,
+    })
+    assert charge.amount_cents == 1500
+    assert charge.currency == 'BRL'
+    assert charge.extra == {'unknown': 1}
+    assert charge.to_dict()['unknown'] == 1
+
+
+def test_lazy_record_decodes_on_first_access(xml, monkeypatch):
+    raw = xmltodict.parse(xml)['transactionSearchResult']['transactions']
+    transaction = Transaction.from_dict(raw['transaction'][0], lazy=True)
+    assert transaction['grossAmount'] == '49900.00'
+    assert transaction == raw['transaction'][0]
+
+    calls = []
+    monkeypatch.setattr(Transaction.fields_by_attr['gross_amount_cents'],
+                        'decode', lambda v: calls.append(v) or 42)
+    assert transaction.gross_amount_cents == 42
+    assert transaction.gross_amount_cents == 42
+    assert calls == ['49900.00']
+    assert transaction.status == 3
+    assert transaction.extra is None
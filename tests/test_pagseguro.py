@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
+import datetime
+
 import pytest
+import responses
 
 from pagseguro import PagSeguro, PagSeguroTransactionSearchResult
 from pagseguro.config import Config
-from pagseguro.exceptions import PagSeguroValidationError
+from pagseguro.exceptions import (PagSeguroValidationError,
+                                  PagSeguroPaginationError)
 from pagseguro.utils import is_valid_email, is_valid_cpf
 
 TOKEN = '123456'
@@ -15,51 +19,6 @@ def pagseguro():
     return PagSeguro(token=TOKEN, email=EMAIL)
 
 
-@pytest.fixture
-def xml():
-    return """
-<transactionSearchResult>
-    <date>2011-02-16T20:14:35.000-02:00</date>
-    <currentPage>1</currentPage>
-    <resultsInThisPage>2</resultsInThisPage>
-    <totalPages>1</totalPages>
-    <transactions>
-        <transaction>
-            <date>2011-02-05T15:46:12.000-02:00</date>
-            <lastEventDate>2011-02-15T17:39:14.000-03:00</lastEventDate>
-            <code>9E884542-81B3-4419-9A75-BCC6FB495EF1</code>
-            <reference>REF1234</reference>
-            <type>1</type>
-            <status>3</status>
-            <paymentMethod>
-                <type>1</type>
-            </paymentMethod>
-            <grossAmount>49900.00</grossAmount>
-            <discountAmount>0.00</discountAmount>
-            <feeAmount>0.00</feeAmount>
-            <netAmount>49900.00</netAmount>
-            <extraAmount>0.00</extraAmount>
-        </transaction>
-        <transaction>
-            <date>2011-02-07T18:57:52.000-02:00</date>
-            <lastEventDate>2011-02-14T21:37:24.000-03:00</lastEventDate>
-            <code>2FB07A22-68FF-4F83-A356-24153A0C05E1</code>
-            <reference>REF5678</reference>
-            <type>3</type>
-            <status>4</status>
-            <paymentMethod>
-                <type>3</type>
-            </paymentMethod>
-            <grossAmount>26900.00</grossAmount>
-            <discountAmount>0.00</discountAmount>
-            <feeAmount>0.00</feeAmount>
-            <netAmount>26900.00</netAmount>
-            <extraAmount>0.00</extraAmount>
-        </transaction>
-    </transactions>
-</transactionSearchResult>"""
-
-
 def test_pagseguro_class(pagseguro):
     assert isinstance(pagseguro, PagSeguro)
 
@@ -177,3 +136,140 @@ def test_parse_xml(xml):
 def test_pagseguro_with_bad_config():
     with pytest.raises(Exception):
         PagSeguro(email=EMAIL, token=TOKEN, config=2)
+
+
+def search_page(page, total_pages, per_page=2):
+    transactions = ''.join(
+        '<transaction><code>P{0}-{1}</code></transaction>'.format(page, i)
+        for i in range(per_page))
+    return ('<transactionSearchResult><currentPage>{0}</currentPage>'
+            '<resultsInThisPage>{1}</resultsInThisPage>'
+            '<totalPages>{2}</totalPages><transactions>{3}</transactions>'
+            '</transactionSearchResult>').format(
+                page, per_page, total_pages, transactions)
+
+
+def add_search_callback(pg, total_pages, failing_pages=()):
+    from urllib.parse import urlparse, parse_qs
+
+    def callback(request):
+        query = parse_qs(urlparse(request.url).query)
+        page = int(query.get('page', ['1'])[0])
+        if page in failing_pages:
+            return (500, {}, '<errors><error><code>500</code></error></errors>')
+        return (200, {}, search_page(page, total_pages))
+
+    responses.add_callback(responses.GET, pg.config.QUERY_TRANSACTION_URL,
+                           callback=callback)
+
+
+@responses.activate
+def test_query_transactions_fans_out_in_page_order(pagseguro):
+    add_search_callback(pagseguro, total_pages=6)
+    results = pagseguro.query_transactions(
+        datetime.datetime(2020, 1, 1), datetime.datetime(2020, 1, 31),
+        max_workers=3)
+    assert [t['code'] for t in results] == [
+        'P{0}-{1}'.format(page, i) for page in range(1, 7) for i in range(2)]
+    assert len(responses.calls) == 6
+    assert 'initialDate' not in pagseguro.data
+
+
+@responses.activate
+def test_query_transactions_keeps_pages_around_a_failure(pagseguro):
+    add_search_callback(pagseguro, total_pages=4, failing_pages=(3,))
+    with pytest.raises(PagSeguroPaginationError) as exc:
+        pagseguro.query_transactions(
+            datetime.datetime(2020, 1, 1), datetime.datetime(2020, 1, 31))
+    assert list(exc.value.failures) == [3]
+    assert [t['code'][:2] for t in exc.value.results] == [
+        'P1', 'P1', 'P2', 'P2', 'P4', 'P4']
+
+
+@responses.activate
+@pytest.mark.parametrize('prefetch', [False, True])
+def test_iter_transactions_streams_pages(pagseguro, prefetch):
+    add_search_callback(pagseguro, total_pages=3)
+    iterator = pagseguro.iter_transactions(
+        datetime.datetime(2020, 1, 1), datetime.datetime(2020, 1, 31),
+        prefetch=prefetch)
+    assert next(iterator)['code'] == 'P1-0'
+    if not prefetch:
+        assert len(responses.calls) == 1
+    assert [t['code'] for t in iterator] == [
+        'P1-1', 'P2-0', 'P2-1', 'P3-0', 'P3-1']
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_create_orders_in_input_order(pagseguro, sender):
+    import json
+    from pagseguro import PagSeguroCheckoutResponse
+
+    def callback(request):
+        body = json.loads(request.body)
+        return (200, {}, json.dumps({
+            'id': 'ORDE_' + body['reference_id'],
+            'links': [{'rel': 'PAY', 'href': 'https://pay/' +
+                       body['reference_id']}]}))
+
+    responses.add_callback(responses.POST, pagseguro.config.ORDER_URL,
+                           callback=callback)
+    orders = [{'reference': str(i), 'sender': dict(sender, cpf=None)}
+              for i in range(20)]
+    orders[5]['sender'] = {'email': 'bad'}
+    results = pagseguro.create_orders(orders, max_concurrency=4)
+
+    assert isinstance(results[5], PagSeguroValidationError)
+    ok = [r for i, r in enumerate(results) if i != 5]
+    assert all(isinstance(r, PagSeguroCheckoutResponse) for r in ok)
+    assert [r.id for r in ok] == [
+        'ORDE_%s' % i for i in range(20) if i != 5]
+    assert results[0].payment_link == 'https://pay/0'
+    assert len(responses.calls) == 19
+    assert pagseguro.data == {}
+
+
+@responses.activate
+@pytest.mark.parametrize('subscription, listed, missing', [
+    ({'plan_reference_id': 'gold', 'customer_id': 'CUST_1'}, 'plans', 'gold'),
+    ({'plan_id': 'PLAN_1', 'customer_reference_id': 'joao',
+      'search_by_reference_id': True}, 'customers', 'joao'),
+])
+def test_build_subscription_lookup_not_found(pagseguro, subscription, listed,
+                                             missing):
+    from pagseguro.cache import lookup_cache
+    lookup_cache.clear()
+    url = (pagseguro.config.PLAN_URL if listed == 'plans'
+           else pagseguro.config.SUBSCRIBER_URL)
+    responses.add(responses.GET, url, json={listed: []})
+    pagseguro.subscription = dict(subscription, reference_id='SUB_1')
+    pagseguro.payment = {'amount': {'value': 1000},
+                         'method': {'type': 'CREDIT_CARD',
+                                    'card': {'security_code': '123'}}}
+    with pytest.raises(PagSeguroValidationError) as error:
+        pagseguro.build_subscription()
+    assert repr(missing) in str(error.value)
+
+
+@responses.activate
+def test_build_subscription_caches_plan_lookup(pagseguro):
+    from pagseguro.cache import lookup_cache
+    lookup_cache.clear()
+    responses.add(responses.GET, pagseguro.config.PLAN_URL,
+                  json={'plans': [{'id': 'PLAN_1'}]})
+    responses.add(responses.POST, pagseguro.config.PLAN_URL, json={})
+    pagseguro.subscription = {'plan_reference_id': 'gold',
+                              'customer_id': 'CUST_1',
+                              'reference_id': 'SUB_1'}
+    pagseguro.payment = {'amount': {'value': 1000},
+                         'method': {'type': 'CREDIT_CARD',
+                                    'card': {'security_code': '123'}}}
+    for _ in range(3):
+        pagseguro.build_subscription()
+        assert pagseguro.data['plan'] == {'id': 'PLAN_1'}
+    assert len(responses.calls) == 1
+
+    pagseguro.create_plan({'reference_id': 'silver'})
+    pagseguro.build_subscription()
+    assert len(responses.calls) == 3
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import io
+
+import pytest
+import xmltodict
+
+from pagseguro.config import Config
+from pagseguro.models import PreApproval, Sender, Transaction
+from pagseguro.parsers import (PagSeguroTransactionSearchResult,
+                               PagSeguroPreApprovalSearch,
+                               PagSeguroPreApproval, iterparse_xml)
+
+
+class StreamingTransactionSearchResult(PagSeguroTransactionSearchResult):
+    engine = 'iterparse'
+
+
+class StreamingPreApprovalSearch(PagSeguroPreApprovalSearch):
+    engine = 'iterparse'
+
+
+PRE_APPROVALS_XML = u"""<?xml version="1.0" encoding="ISO-8859-1"?>
+<preApprovalSearchResult>
+    <date>2011-08-15T11:06:44.000-03:00</date>
+    <currentPage>1</currentPage>
+    <resultsInThisPage>1</resultsInThisPage>
+    <totalPages>1</totalPages>
+    <preApprovals>
+        <preApproval>
+            <name>Assinatura Revista Ação</name>
+            <code>C08984179E9EDF3DD4023F87B71DE349</code>
+            <date>2011-11-23T13:40:23.000-02:00</date>
+            <status>CANCELLED</status>
+            <charge type="auto">AUTO</charge>
+        </preApproval>
+    </preApprovals>
+</preApprovalSearchResult>"""
+
+
+def test_iterparse_matches_xmltodict(xml):
+    expected = xmltodict.parse(xml, encoding='iso-8859-1')
+    assert iterparse_xml(xml) == expected
+    assert iterparse_xml(xml.encode('iso-8859-1'), chunk_size=7) == expected
+    assert iterparse_xml(io.BytesIO(xml.encode('iso-8859-1'))) == expected
+
+
+def test_iterparse_streams_records(xml):
+    records = []
+    parsed = iterparse_xml(
+        xml, ('transactionSearchResult', 'transactions', 'transaction'),
+        records.append)
+    assert parsed['transactionSearchResult']['transactions'] is None
+    expected = xmltodict.parse(xml)['transactionSearchResult']
+    assert records == expected['transactions']['transaction']
+
+
+@pytest.mark.parametrize('content', [
+    PRE_APPROVALS_XML, PRE_APPROVALS_XML.encode('iso-8859-1')])
+def test_streaming_engine_same_output(content):
+    tree = PagSeguroPreApprovalSearch(content)
+    streamed = StreamingPreApprovalSearch(content)
+    assert streamed.pre_approvals == tree.pre_approvals
+    assert streamed.pre_approvals[0]['name'] == u'Assinatura Revista Ação'
+    assert streamed.pre_approvals[0]['charge'] == {'@type': 'auto',
+                                                   '#text': 'AUTO'}
+    assert (streamed.current_page, streamed.total_pages) == (1, 1)
+
+
+def test_streaming_transaction_search(xml):
+    tree = PagSeguroTransactionSearchResult(xml)
+    streamed = StreamingTransactionSearchResult(xml)
+    assert streamed.transactions == tree.transactions
+    assert streamed.results_in_page == 2
+    assert PagSeguroTransactionSearchResult.transactions == []
+
+
+def test_streaming_engine_errors():
+    content = '<errors><error><code>11004</code></error></errors>'
+    result = StreamingTransactionSearchResult(content)
+    assert result.errors == {'code': '11004'}
+    assert result.transactions == []
+
+
+class LazyPreApproval(PagSeguroPreApproval):
+    lazy = True
+
+
+def test_lazy_pre_approval_date():
+    content = ('<preApproval><code>C0898</code><status>ACTIVE</status>'
+               '<date>2011-11-23T13:40:23.000-02:00</date></preApproval>')
+    result = LazyPreApproval(content)
+    assert result.status == 'ACTIVE'
+    assert 'date' not in result.__dict__
+
+    eager = PagSeguroPreApproval(content)
+    assert result.date == eager.date
+    assert result.__dict__['date'] is result.date
+    assert result.date.year == 2011
+
+
+def test_lazy_option_and_config(xml):
+    plain = PagSeguroTransactionSearchResult(xml)
+    for result in (PagSeguroTransactionSearchResult(xml, lazy=True),
+                   PagSeguroTransactionSearchResult(
+                       xml, Config(lazy_parsing=True))):
+        assert result.lazy
+        transaction = result.transactions[0]
+        assert isinstance(transaction, Transaction)
+        assert transaction.status == 3
+        assert transaction.date.year == 2011
+        assert result.transactions == plain.transactions
+    assert not PagSeguroTransactionSearchResult(xml, lazy=False).lazy
+    assert not plain.lazy
+
+    pre_approvals = PagSeguroPreApprovalSearch(PRE_APPROVALS_XML, lazy=True)
+    assert isinstance(pre_approvals.pre_approvals[0], PreApproval)
+    assert pre_approvals.pre_approvals[0].date.year == 2011
+
+    result = PagSeguroPreApproval(
+        '<preApproval><date>2011-11-23T13:40:23.000-02:00</date>'
+        '</preApproval>', Config(lazy_parsing=True))
+    assert 'date' not in result.__dict__
+    assert result.date.year == 2011
+
+
+def test_lazy_nested_sender():
+    transaction = Transaction.from_dict({
+        'code': '1', 'sender': {'name': u'José', 'email': 'a@b.c'}},
+        lazy=True)
+    sender = transaction.sender
+    assert isinstance(sender, Sender)
+    assert sender.raw == {'name': u'José', 'email': 'a@b.c'}
+    assert sender.name == u'José'
+    assert transaction['sender'] == {'name': u'José', 'email': 'a@b.c'}
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from pagseguro import PagSeguro
+from pagseguro.payload import CheckoutTemplate
+
+TOKEN = '123456'
+EMAIL = 'seu@email.com'
+
+
+@pytest.fixture
+def client():
+    pg = PagSeguro(token=TOKEN, email=EMAIL, data={'base': 'value'})
+    pg.redirect_url = '/redirecionando/'
+    pg.notification_url = '/notificando/'
+    pg.extra_amount = 12.50
+    return pg
+
+
+@pytest.fixture
+def order(sender, shipping, items):
+    sender = dict(sender, cpf='482.268.465-28')
+    return dict(sender=sender, shipping=shipping, items=items,
+                payment={'amount': {'value': 1000, 'currency': 'BRL'},
+                         'method': {'type': 'BOLETO'}},
+                reference='1234')
+
+
+def build_with_client(client, order):
+    client.sender = order['sender']
+    client.shipping = order['shipping']
+    client.items = order['items']
+    client.payment = order['payment']
+    client.reference = order['reference']
+    client.build_checkout_params()
+    return client.data
+
+
+def test_template_build_matches_build_checkout_params(client, order):
+    template = CheckoutTemplate.from_client(client, data={'base': 'value'})
+    payload = template.build(**order)
+    assert payload == build_with_client(client, order)
+    holder = payload['charges'][0]['payment_method']['holder']
+    assert holder['tax_id'] == '482.268.465-28'
+    assert holder['address'] == payload['shipping']['address']
+    assert 'holder' not in order['payment']['method']
+
+
+def test_template_render_is_json_of_build(client, order):
+    template = CheckoutTemplate.from_client(client, data={'base': 'value'})
+    assert json.loads(template.render(**order)) == template.build(**order)
+    assert json.loads(template.render()) == template.build()
+    assert json.loads(template.render(base='override', **order)) == \
+        template.build(base='override', **order)
+
+
+def test_client_reuses_compiled_template(client):
+    template = client.checkout_template()
+    assert client.checkout_template() is template
+    client.redirect_url = '/outro/'
+    assert client.checkout_template() is not template
+    assert client.checkout_template().static_fields['redirectURL'] == '/outro/'
+
+
+def test_template_honours_client_config(order):
+    pg = PagSeguro(token=TOKEN, config={'use_shipping': False})
+    payload = pg.checkout_template().build(**order)
+    assert 'shipping' not in payload
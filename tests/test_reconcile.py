@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+import os
+from decimal import Decimal
+
+import pytest
+
+from pagseguro import PagSeguro
+from pagseguro.config import Config
+from pagseguro.fakeserver import (FakePagSeguroAPI, FakePagSeguroServer,
+                                  transaction_code)
+from pagseguro.models import Transaction
+from pagseguro.reconcile import Reconciler, cents
+
+DATES = (datetime.datetime(2011, 1, 1), datetime.datetime(2011, 2, 1))
+
+
+def transaction(reference, amount='10.00', status='3', code=None):
+    return {'code': code or 'CODE-%s' % reference, 'reference': reference,
+            'grossAmount': amount, 'status': status}
+
+
+def order(reference, amount=1000, status='paid'):
+    return {'reference_id': reference, 'amount': amount, 'status': status}
+
+
+def kinds(discrepancies):
+    return sorted((d.kind, d.reference or '') for d in discrepancies)
+
+
+def test_cents():
+    assert cents(1000) == 1000
+    assert cents('10.00') == 1000
+    assert cents(Decimal('10.5')) == 1050
+    assert cents(None) is None
+
+
+def test_reports_every_kind():
+    reconciler = Reconciler(status_map={3: 'paid', 7: 'cancelled'})
+    orders = [order('1'), order('2', 2000), order('3'), order('4')]
+    transactions = [transaction('1'), transaction('2'),
+                    transaction('3', status='7'), transaction('5'),
+                    transaction(None)]
+    found = list(reconciler.run(orders, transactions))
+    assert kinds(found) == [('amount', '2'), ('extra', ''), ('extra', '5'),
+                            ('missing', '4'), ('status', '3')]
+    amount = [d for d in found if d.kind == 'amount'][0]
+    assert (amount.expected, amount.actual) == (2000, 1000)
+    assert amount.order['reference_id'] == '2'
+    assert amount.transaction['code'] == 'CODE-2'
+    assert reconciler.counts['matched'] == 1
+    assert reconciler.counts['orders'] == 4
+    assert reconciler.counts['transactions'] == 5
+    assert not reconciler.counts['spilled']
+
+
+def test_reference_prefix_and_cursor_rows():
+    config = Config(reference_prefix='LOJA-%s')
+    reconciler = Reconciler(config, order_reference=0, order_amount=1,
+                            order_status=False)
+    rows = [('1', Decimal('10.00')), ('2', Decimal('20.00'))]
+    transactions = [transaction('LOJA-1'), Transaction.from_dict(
+        transaction('LOJA-2', '20.00'))]
+    assert list(reconciler.run(rows, transactions)) == []
+    assert reconciler.counts['matched'] == 2
+
+
+def test_spills_to_disk_with_same_results(tmp_path):
+    orders = [order(str(i), 1000 + (i % 7 == 0)) for i in range(2000)]
+    transactions = [transaction(str(i)) for i in range(100, 2100)]
+    expected = kinds(Reconciler().run(orders, transactions))
+
+    reconciler = Reconciler(memory_rows=50, tmpdir=str(tmp_path))
+    reconciler.partitions = 8
+    spilled = list(reconciler.run(iter(orders), iter(transactions)))
+    assert kinds(spilled) == expected
+    assert reconciler.counts['spilled']
+    assert len([d for d in spilled if d.kind == 'missing']) == 100
+    assert len([d for d in spilled if d.kind == 'extra']) == 100
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_skewed_partitions_are_split_again(tmp_path):
+    # every order in one partition at the first level
+    orders = [order('same', 1000) for _ in range(30)] + \
+        [order(str(i)) for i in range(30)]
+    transactions = [transaction('same')] + [transaction(str(i))
+                                            for i in range(30)]
+    reconciler = Reconciler(memory_rows=10, tmpdir=str(tmp_path),
+                            order_status=False)
+    reconciler.partitions = 4
+    found = list(reconciler.run(orders, transactions))
+    assert found == []
+    assert reconciler.counts['matched'] == 60
+
+
+def test_client_reconcile_against_fake_server():
+    with FakePagSeguroServer(FakePagSeguroAPI(pages=2, page_size=5)) as server:
+        pg = PagSeguro(token='123456', config=server.config())
+        # the fake transaction i has reference REFi and amount 100 + i
+        orders = [{'reference_id': 'REF%d' % i, 'amount': (100 + i) * 100}
+                  for i in range(1, 11)]
+        found = list(pg.reconcile(orders, *DATES, order_status=False))
+    assert kinds(found) == [('extra', 'REF0'), ('missing', 'REF10')]
+    extra, = [d for d in found if d.kind == 'extra']
+    assert extra.transaction['code'] == transaction_code(0)
+
+
+@pytest.mark.parametrize('status_map', [None, {3: '3'}])
+def test_status_compared_as_text(status_map):
+    reconciler = Reconciler(status_map=status_map)
+    assert list(reconciler.run([order('1', status=3)],
+                               [transaction('1')])) == []
+
+
+@pytest.mark.parametrize('memory_rows', [None, 3])
+def test_async_reconcile_against_fake_server(memory_rows, tmp_path):
+    pytest.importorskip('aiohttp')
+    from pagseguro.aio import AsyncPagSeguro, close_async_transports
+    from pagseguro.fakeserver import AsyncFakePagSeguroServer
+    orders = [{'reference_id': 'REF%d' % i, 'amount': (100 + i) * 100}
+              for i in range(1, 11)]
+
+    async def run():
+        api = FakePagSeguroAPI(pages=2, page_size=5)
+        async with AsyncFakePagSeguroServer(api) as server:
+            pg = AsyncPagSeguro(token='123456', config=server.config())
+            found = [d async for d in pg.reconcile(
+                orders, *DATES, order_status=False, memory_rows=memory_rows,
+                tmpdir=str(tmp_path))]
+        await close_async_transports()
+        return found
+
+    found = asyncio.run(run())
+    assert kinds(found) == [('extra', 'REF0'), ('missing', 'REF10')]
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_feed_in_batches_matches_run(tmp_path):
+    orders = [order(str(i), 1000 + (i % 7 == 0)) for i in range(200)]
+    transactions = [transaction(str(i)) for i in range(10, 210)]
+    expected = kinds(Reconciler().run(orders, transactions))
+
+    reconciler = Reconciler(memory_rows=50, tmpdir=str(tmp_path))
+    reconciler.begin(iter(orders))
+    found = []
+    for start in range(0, len(transactions), 30):
+        found.extend(reconciler.feed(transactions[start:start + 30]))
+    found.extend(reconciler.end())
+    assert kinds(found) == expected
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+
+import pytest
+
+from pagseguro import PagSeguro
+from pagseguro.exceptions import PagSeguroPaginationError
+from pagseguro.fakeserver import (EPOCH, FakePagSeguroAPI,
+                                  FakePagSeguroServer, transaction_code)
+from pagseguro.metrics import PrometheusMetrics
+from pagseguro.shards import WindowPlanner, merge_records, whole_minutes
+
+TOKEN = '123456'
+DAY = datetime.timedelta(days=1)
+HOUR = datetime.timedelta(hours=1)
+
+
+def test_whole_minutes():
+    assert whole_minutes(datetime.timedelta(seconds=1)) == \
+        datetime.timedelta(minutes=1)
+    assert whole_minutes(datetime.timedelta(seconds=151)) == \
+        datetime.timedelta(minutes=3)
+
+
+def test_planner_covers_range():
+    planner = WindowPlanner(EPOCH, EPOCH + 10 * DAY, 3 * DAY)
+    windows = []
+    while True:
+        window = planner.next_window()
+        if window is None:
+            break
+        windows.append(window)
+    assert windows[0] == (EPOCH, EPOCH + 3 * DAY)
+    assert windows[-1][1] == EPOCH + 10 * DAY
+    assert all(a[1] == b[0] for a, b in zip(windows, windows[1:]))
+
+
+def test_planner_adapts_to_page_density():
+    planner = WindowPlanner(EPOCH, EPOCH + 365 * DAY, DAY, target_pages=2)
+    start, end = planner.next_window()
+    planner.observe(start, end, 8)
+    assert planner.window == 6 * HOUR
+    planner.observe(start, end, 2)
+    assert planner.window == DAY
+    # at most ``growth`` times per observation
+    planner.observe(start, end, 0)
+    assert planner.window == 4 * DAY
+    planner.observe(start, end, 1000)
+    assert planner.window == DAY
+
+
+def test_merge_records_dedupes_by_code_and_sorts_by_date():
+    first = [
+        {'code': 'B', 'date': '2011-01-02T00:00:00.000-03:00',
+         'lastEventDate': '2011-01-02T00:00:00.000-03:00', 'status': '1'},
+        {'code': 'A', 'date': '2011-01-01T00:00:00.000-03:00'},
+    ]
+    second = [
+        {'code': 'B', 'date': '2011-01-02T00:00:00.000-03:00',
+         'lastEventDate': '2011-01-05T00:00:00.000-03:00', 'status': '3'},
+        {'code': 'C', 'date': '2011-01-03T00:00:00.000-03:00'},
+    ]
+    merged = merge_records([first, second])
+    assert [t['code'] for t in merged] == ['A', 'B', 'C']
+    assert merged[1]['status'] == '3'
+
+
+@pytest.fixture
+def server():
+    api = FakePagSeguroAPI(per_hour=60, page_size=50)
+    with FakePagSeguroServer(api) as server:
+        yield server
+
+
+def test_windows_against_dated_server(server):
+    metrics = PrometheusMetrics()
+    pg = PagSeguro(token=TOKEN, config=server.config(METRICS=metrics))
+    final = EPOCH + 3 * DAY
+    windowed = pg.query_transactions(EPOCH, final, window=DAY)
+    # one transaction a minute, both ends inclusive
+    assert len(windowed) == 3 * 24 * 60 + 1
+    assert [t['code'] for t in windowed] == \
+        [transaction_code(i) for i in range(len(windowed))]
+    assert windowed == pg.query_transactions(EPOCH, final)
+    # the first day had 29 pages of 50, later windows were resized
+    assert metrics.count('requests_total', endpoint='query_transaction') < 200
+
+
+def test_window_from_config(server):
+    pg = PagSeguro(token=TOKEN, config=server.config(QUERY_WINDOW=HOUR))
+    assert len(pg.query_transactions(EPOCH, EPOCH + 5 * HOUR)) == 5 * 60 + 1
+    # an explicit page is a plain paged search starting there
+    assert len(pg.query_transactions(EPOCH, EPOCH + 5 * HOUR, page=2)) == \
+        5 * 60 + 1 - 50
+
+
+def test_window_failures_keep_results():
+    api = FakePagSeguroAPI(per_hour=60, page_size=1000, error_rate=0.5,
+                           seed=3)
+    with FakePagSeguroServer(api) as server:
+        pg = PagSeguro(token=TOKEN, config=server.config())
+        with pytest.raises(PagSeguroPaginationError) as error:
+            pg.query_transactions(EPOCH, EPOCH + DAY, window=HOUR)
+    assert error.value.failures
+    assert 0 < len(error.value.results) < 24 * 60
+
+
+def test_async_windows():
+    pytest.importorskip('aiohttp')
+    from pagseguro.aio import AsyncPagSeguro, close_async_transports
+    from pagseguro.fakeserver import AsyncFakePagSeguroServer
+
+    async def run():
+        api = FakePagSeguroAPI(per_hour=60, page_size=100)
+        async with AsyncFakePagSeguroServer(api) as server:
+            pg = AsyncPagSeguro(token=TOKEN, config=server.config())
+            results = await pg.query_transactions(EPOCH, EPOCH + DAY,
+                                                  window=6 * HOUR)
+        await close_async_transports()
+        return results
+
+    assert len(asyncio.run(run())) == 24 * 60 + 1
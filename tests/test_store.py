@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+import xmltodict
+
+from pagseguro import PagSeguro
+from pagseguro.config import Config
+from pagseguro.fakeserver import (XML_HEADER, FakePagSeguroAPI,
+                                  FakePagSeguroServer, transaction_code,
+                                  transaction_search_xml, transaction_xml)
+from pagseguro.models import Transaction
+from pagseguro.parsers import (PagSeguroNotificationResponse,
+                               PagSeguroTransactionSearchResult)
+from pagseguro.store import TransactionStore
+
+BRT = datetime.timezone(datetime.timedelta(hours=-3))
+
+
+class RecordStore(TransactionStore):
+    record_class = Transaction
+
+
+def transactions(count):
+    raw = xmltodict.parse(transaction_search_xml(count))
+    return raw['transactionSearchResult']['transactions']['transaction']
+
+
+def test_upsert_and_lookups():
+    store = TransactionStore()
+    assert store.upsert(transactions(10)) == 10
+    assert len(store) == 10
+    code = transaction_code(3)
+    assert code in store
+    assert store.get(code)['reference'] == 'REF3'
+    assert store.get('missing') is None
+    assert [t['code'] for t in store.find(reference='REF3')] == [code]
+    assert len(store.find(status=3)) == 5
+    assert store.codes(status='4') == set(transaction_code(i)
+                                          for i in range(1, 10, 2))
+    assert len(store.find(limit=2)) == 2
+
+
+def test_date_filters():
+    store = TransactionStore()
+    store.upsert(transactions(2))
+    changed = datetime.datetime(2011, 2, 15, 17, 39, 14, tzinfo=BRT)
+    assert len(store.find(since=changed)) == 2
+    assert store.find(until=changed) == []
+    assert store.last_event_date() == int(changed.timestamp() * 1000000)
+
+
+def test_older_events_do_not_replace_newer():
+    store = TransactionStore()
+    newer = transactions(2)[0]
+    older = dict(newer, status='1',
+                 lastEventDate='2011-02-10T10:00:00.000-03:00')
+    store.upsert([newer])
+    store.upsert([older])
+    assert store.get(newer['code'])['status'] == '3'
+    store.upsert([dict(newer, status='7',
+                       lastEventDate='2011-03-01T10:00:00.000-03:00')])
+    assert store.get(newer['code'])['status'] == '7'
+    assert len(store) == 1
+
+
+def test_records_in_and_out(tmp_path):
+    records = [Transaction.from_dict(t) for t in transactions(3)]
+    with RecordStore(str(tmp_path / 'transactions.db')) as store:
+        store.upsert(records)
+        found = store.get(records[1].code)
+        assert isinstance(found, Transaction)
+        assert found.gross_amount_cents == records[1].gross_amount_cents
+    with RecordStore(str(tmp_path / 'transactions.db')) as store:
+        assert len(store) == 3
+
+
+def test_parsers_write_to_configured_store():
+    store = TransactionStore()
+    config = Config(transaction_store=store)
+    PagSeguroTransactionSearchResult(transaction_search_xml(4), config)
+    PagSeguroNotificationResponse(
+        XML_HEADER + transaction_xml(code='NOTIFIED'), config)
+    assert len(store) == 5
+    assert 'NOTIFIED' in store
+    # without a store nothing is written anywhere
+    PagSeguroTransactionSearchResult(transaction_search_xml(4))
+
+
+def test_client_queries_fill_store():
+    store = TransactionStore()
+    with FakePagSeguroServer(FakePagSeguroAPI(pages=3, page_size=5)) as server:
+        pg = PagSeguro(token='123456',
+                       config=server.config(TRANSACTION_STORE=store))
+        pg.query_transactions(datetime.datetime(2011, 1, 1),
+                              datetime.datetime(2011, 2, 1))
+    assert len(store) == 15
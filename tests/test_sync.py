@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+
+import pytest
+
+from pagseguro import PagSeguro
+from pagseguro.fakeserver import FakePagSeguroAPI, FakePagSeguroServer
+from pagseguro.metrics import PrometheusMetrics
+from pagseguro.sync import (FileCheckpointStore, MemoryCheckpointStore,
+                            SyncCheckpoint, TransactionSync)
+
+TOKEN = '123456'
+BRT = datetime.timezone(datetime.timedelta(hours=-3))
+START = datetime.datetime(2011, 2, 1, tzinfo=BRT)
+NOW = datetime.datetime(2011, 2, 15, 18, 0, tzinfo=BRT)
+
+
+class SearchResult(object):
+    errors = None
+
+    def __init__(self, transactions, page, total_pages):
+        self.transactions = transactions
+        self.current_page = page
+        self.total_pages = total_pages
+
+
+class StubClient(object):
+    """serves ``pages`` (lists of transaction dicts) and records the calls"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+
+    def _consume_query_transactions(self, initial_date, final_date, page=None,
+                                    max_results=None):
+        self.calls.append((initial_date, final_date, page))
+        return SearchResult(self.pages[page - 1], page, len(self.pages))
+
+
+def transaction(code, minute):
+    return {'code': code,
+            'lastEventDate': '2011-02-15T17:%02d:00.000-03:00' % minute}
+
+
+@pytest.fixture
+def server():
+    api = FakePagSeguroAPI(pages=3, page_size=4)
+    with FakePagSeguroServer(api) as server:
+        yield server
+
+
+def test_second_run_only_yields_changes():
+    client = StubClient([[transaction('A', 1), transaction('B', 2)],
+                         [transaction('C', 55)]])
+    store = MemoryCheckpointStore()
+    sync = TransactionSync(client, store, start=START, clock=lambda: NOW)
+    assert [t['code'] for t in sync] == ['A', 'B', 'C']
+
+    checkpoint = store.load()
+    assert not checkpoint.running
+    assert checkpoint.since == NOW - datetime.timedelta(minutes=10)
+    assert checkpoint.watermark.minute == 55
+    # only C falls inside the overlap with the next window
+    assert list(checkpoint.seen) == ['C']
+
+    client.pages = [[transaction('C', 55), transaction('D', 56)],
+                    [transaction('C', 58)]]
+    client.calls = []
+    later = NOW + datetime.timedelta(hours=1)
+    sync.clock = lambda: later
+    assert [t['code'] for t in sync] == ['D', 'C']
+    assert client.calls[0] == (checkpoint.since, later, 1)
+
+
+def test_resume_skips_completed_pages():
+    client = StubClient([[transaction('A', 1), transaction('B', 2)],
+                         [transaction('C', 3), transaction('D', 4)],
+                         [transaction('E', 5)]])
+    store = MemoryCheckpointStore()
+    sync = TransactionSync(client, store, start=START, clock=lambda: NOW)
+    delivered = []
+    with pytest.raises(RuntimeError):
+        for t in sync:
+            delivered.append(t['code'])
+            if t['code'] == 'C':
+                raise RuntimeError('crash')
+    assert store.load().page == 1 and store.load().running
+
+    client.calls = []
+    resumed = [t['code'] for t in sync]
+    assert resumed == ['C', 'D', 'E']
+    assert [page for _, _, page in client.calls] == [2, 3]
+    assert client.calls[0][1] == NOW
+
+
+def test_large_first_run_keeps_checkpoint_small():
+    # 200 pages changed long before the overlap, then one inside it
+    pages = [[transaction('P%d-%d' % (page, i), 1) for i in range(50)]
+             for page in range(200)]
+    pages.append([transaction('LAST', 55)])
+    saved = []
+
+    class RecordingStore(MemoryCheckpointStore):
+        def save(self, checkpoint):
+            saved.append(len(checkpoint.seen))
+            super(RecordingStore, self).save(checkpoint)
+
+    store = RecordingStore()
+    sync = TransactionSync(StubClient(pages), store, start=START,
+                           clock=lambda: NOW)
+    assert len(list(sync)) == 200 * 50 + 1
+    assert max(saved) == 1
+    assert list(store.load().seen) == ['LAST']
+
+
+def test_start_required_without_checkpoint():
+    with pytest.raises(ValueError):
+        list(TransactionSync(StubClient([[]]), MemoryCheckpointStore()))
+
+
+def test_file_checkpoint_round_trip(tmp_path):
+    store = FileCheckpointStore(tmp_path / 'sync.json')
+    assert store.load() is None
+    checkpoint = SyncCheckpoint(START, NOW, 3, NOW, {'A': NOW, 'B': None})
+    store.save(checkpoint)
+    assert store.load() == checkpoint
+    assert not (tmp_path / 'sync.json.tmp').exists()
+
+
+def test_sync_against_fake_server(server, tmp_path):
+    metrics = PrometheusMetrics()
+    pg = PagSeguro(token=TOKEN, config=server.config(METRICS=metrics))
+    path = str(tmp_path / 'sync.json')
+    # the fake transactions changed at 17:39, inside the next window
+    now = datetime.datetime(2011, 2, 15, 17, 45, tzinfo=BRT)
+
+    codes = [t['code'] for t in pg.sync_transactions(
+        path, start=START, clock=lambda: now)]
+    assert len(codes) == len(set(codes)) == 12
+    assert metrics.count('requests_total', endpoint='query_transaction') == 3
+
+    # the fake server returns the same transactions, nothing changed
+    assert list(pg.sync_transactions(path, clock=lambda: now)) == []
+
+
+def test_async_sync_against_fake_server(tmp_path):
+    pytest.importorskip('aiohttp')
+    from pagseguro.aio import AsyncPagSeguro, close_async_transports
+    from pagseguro.fakeserver import AsyncFakePagSeguroServer
+    now = datetime.datetime(2011, 2, 15, 17, 45, tzinfo=BRT)
+    path = str(tmp_path / 'sync.json')
+
+    async def run():
+        api = FakePagSeguroAPI(pages=3, page_size=4)
+        async with AsyncFakePagSeguroServer(api) as server:
+            pg = AsyncPagSeguro(token=TOKEN, config=server.config())
+            first = [t['code'] async for t in pg.sync_transactions(
+                path, start=START, clock=lambda: now)]
+            second = [t async for t in pg.sync_transactions(
+                path, clock=lambda: now)]
+            pre_approvals = [p async for p in pg.sync_pre_approvals(
+                str(tmp_path / 'pre.json'), start=START, clock=lambda: now)]
+        await close_async_transports()
+        return first, second, pre_approvals
+
+    first, second, pre_approvals = asyncio.run(run())
+    assert len(first) == len(set(first)) == 12
+    assert second == []
+    assert len(pre_approvals) == 12
+    assert not FileCheckpointStore(path).load().running
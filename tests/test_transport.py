@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import pytest
+import responses
+
+from pagseguro import PagSeguro
+from pagseguro.transport import get_transport, close_transports
+
+TOKEN = '123456'
+EMAIL = 'seu@email.com'
+
+
+@pytest.fixture(autouse=True)
+def fresh_transports():
+    close_transports()
+    yield
+    close_transports()
+
+
+def test_transport_is_shared_between_clients():
+    pg1 = PagSeguro(token=TOKEN, email=EMAIL)
+    pg2 = PagSeguro(token='other', email=EMAIL)
+    assert pg1.transport is pg2.transport
+
+
+def test_transport_per_pool_settings():
+    pg1 = PagSeguro(token=TOKEN, email=EMAIL)
+    pg2 = PagSeguro(token=TOKEN, email=EMAIL, config={'pool_maxsize': 50})
+    assert pg1.transport is not pg2.transport
+    assert pg2.transport.pool_maxsize == 50
+
+
+def test_transport_host_pool_sizes():
+    host = 'https://api.pagseguro.com'
+    transport = get_transport(host_pool_sizes={host: 32})
+    adapter = transport.session.get_adapter(host + '/orders')
+    assert adapter._pool_maxsize == 32
+    other = transport.session.get_adapter('https://example.com/')
+    assert other._pool_maxsize == 10
+
+
+@responses.activate
+def test_requests_go_through_transport():
+    pg = PagSeguro(token=TOKEN, email=EMAIL)
+    responses.add(responses.GET, pg.config.PLAN_URL, json={'plans': []})
+    responses.add(responses.POST, pg.config.ORDER_URL, json={'id': 'ORDE_1'})
+
+    assert pg.list_plans().json() == {'plans': []}
+    assert pg.post(pg.config.ORDER_URL, data={'a': 1}).json()['id'] == 'ORDE_1'
+    assert len(responses.calls) == 2
+    assert responses.calls[0].request.headers['Authorization'] == 'Bearer 123456'
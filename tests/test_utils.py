@@ -2,7 +2,9 @@
 import datetime
 
 from pagseguro.utils import (is_valid_cpf, is_valid_cnpj, is_valid_email,
-                             parse_date)
+                             parse_date, parse_dates, validate_cpfs, validate_cnpjs,
+                             CPF_ERROR_MESSAGES, CNPJ_ERROR_MESSAGES,
+                             validation_cache, validation_cache_info)
 from pagseguro.exceptions import PagSeguroValidationError
 
 import pytest
@@ -36,6 +38,30 @@ def test_parse_date():
                                                      tzinfo=tzutc())
 
 
+@pytest.mark.parametrize('date_str', [
+    '2011-02-05T15:46:12.000-02:00',
+    '2011-02-05T15:46:12-03:00',
+    '2011-02-05T15:46:12Z',
+    '2011-02-05T15:46:12.123456+05:30',
+    '2011-02-05',
+])
+def test_parse_date_matches_arrow(date_str):
+    import arrow
+    expected = arrow.get(date_str).datetime
+    parsed = parse_date(date_str)
+    assert parsed == expected
+    assert parsed.utcoffset() == expected.utcoffset()
+
+
+def test_parse_dates_column():
+    column = ['2011-02-05T15:46:12.000-02:00', None, '2011-02-05']
+    dates = parse_dates(column)
+    assert dates[1] is None
+    assert dates == [parse_date(column[0]), None, parse_date(column[2])]
+    assert dates[0].utcoffset() == datetime.timedelta(hours=-2)
+    assert dates[0].tzinfo is parse_dates(column[:1])[0].tzinfo
+
+
 def test_is_valid_cpf():
     valid = '041.684.826-50'
     valid2 = '04168482650'
@@ -75,3 +101,89 @@ def test_is_valid_cnpj():
 
     assert is_valid_cnpj(valid) == '31331052000174'
     assert is_valid_cnpj(valid2) == '72168117000190'
+
+
+def scalar_codes(validator, messages, values):
+    codes = []
+    for value in values:
+        try:
+            validator(value)
+            codes.append(None)
+        except PagSeguroValidationError as e:
+            codes.append([k for k, v in messages.items() if v == str(e)][0])
+    return codes
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def batch_backend(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        import builtins
+        real_import = builtins.__import__
+
+        def no_numpy(name, *args, **kwargs):
+            if name == 'numpy':
+                raise ImportError(name)
+            return real_import(name, *args, **kwargs)
+        monkeypatch.setattr(builtins, '__import__', no_numpy)
+    return request.param
+
+
+def test_validate_cpfs_matches_is_valid_cpf(batch_backend):
+    values = ['041.684.826-50', '04168482650', 'bla///', '11111111111111',
+              '040.684.826-50', '482.268.465-28', None, '', '123.456.267-45']
+    values += ['%011d' % (i * 7919) for i in range(200)]
+    mask, codes = validate_cpfs(values)
+    expected = scalar_codes(is_valid_cpf, CPF_ERROR_MESSAGES, values)
+    assert list(codes) == expected
+    assert list(mask) == [code is None for code in expected]
+
+
+def test_validate_numeric_arrays():
+    numpy = pytest.importorskip('numpy')
+    mask, codes = validate_cpfs(numpy.array([4168482650, 1, 4068482650]))
+    assert list(mask) == [True, False, False]
+    assert list(codes) == [None, 'invalid', 'invalid']
+    mask, codes = validate_cnpjs(numpy.array([31331052000174, 31331052000175]))
+    assert list(mask) == [True, False]
+
+
+def test_validate_float_arrays():
+    numpy = pytest.importorskip('numpy')
+    mask, codes = validate_cpfs(
+        numpy.array([4168482650.0, numpy.nan, 4168482650.5, 4068482650.0]))
+    assert list(mask) == [True, True, False, False]
+    assert list(codes) == [None, None, 'digits_only', 'invalid']
+    mask, codes = validate_cnpjs([31331052000174.0, float('nan')])
+    assert list(mask) == [True, True]
+
+
+def test_validate_cnpjs_matches_is_valid_cnpj(batch_backend):
+    values = ['31331052000174', '72.168.117/0001-90', '///', '1111111',
+              '31331052000175', None]
+    values += ['%014d' % (i * 104729) for i in range(200)]
+    mask, codes = validate_cnpjs(values)
+    expected = scalar_codes(is_valid_cnpj, CNPJ_ERROR_MESSAGES, values)
+    assert list(codes) == expected
+    assert sum(mask) == expected.count(None)
+
+
+def test_validation_cache_counts_and_replays_errors():
+    validation_cache.clear()
+    assert is_valid_cpf('041.684.826-50') == '041.684.826-50'
+    assert is_valid_cpf('041.684.826-50') == '041.684.826-50'
+    for _ in range(2):
+        with pytest.raises(PagSeguroValidationError) as exc:
+            is_valid_cnpj('31331052000175')
+        assert str(exc.value) == CNPJ_ERROR_MESSAGES['invalid']
+    info = validation_cache_info()
+    assert (info['hits'], info['misses'], info['size']) == (2, 2, 2)
+
+
+def test_validation_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(validation_cache, 'maxsize', 3)
+    validation_cache.clear()
+    for i in range(10):
+        is_valid_email('user%s@email.com' % i)
+    assert validation_cache_info()['size'] == 3